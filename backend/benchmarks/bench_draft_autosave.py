@@ -0,0 +1,91 @@
+"""
+Draft autosave write volume benchmark
+Simulates users typing long answers with autosave, and compares full draft
+saves (POST /forms/{id}/draft) with delta saves (PATCH /forms/{id}/draft):
+request bytes, bytes of update sent to MongoDB, and database round trips.
+
+No database is needed, the sizes are those of the JSON bodies and BSON
+update documents the two endpoints produce.
+
+Run from the backend directory:
+    python -m benchmarks.bench_draft_autosave [--users 300] [--saves 120] [--questions 8]
+"""
+import argparse
+import json
+import random
+from datetime import datetime
+
+import bson
+
+def simulate(saves: int, questions: int, noop_ratio: float, rng: random.Random) -> list:
+    """Successive draft states of one user; some autosaves fire without any change"""
+    responses = {}
+    states = []
+    for _ in range(saves):
+        if responses and rng.random() < noop_ratio:
+            states.append(dict(responses))
+            continue
+        key = f"q{rng.randrange(questions)}"
+        responses[key] = responses.get(key, "") + "".join(rng.choice("abcdefgh ") for _ in range(40))
+        states.append(dict(responses))
+    return states
+
+def full_save(state: dict, now: datetime):
+    body = {"form_id": "bench", "responses": state}
+    update = {"$set": {"form_id": "bench", "user_id": "u" * 24, "responses": state, "last_saved": now}, "$inc": {"revision": 1}}
+    return len(json.dumps(body)), len(bson.encode(update)), 2  # Submission check + upsert
+
+def delta_save(previous: dict, state: dict, revision: int, now: datetime):
+    changed = {key: value for key, value in state.items() if previous.get(key) != value}
+    cleared = [key for key in previous if key not in state]
+    if not changed and not cleared:
+        return 0, 0, 0  # Not sent at all
+    body = {"base_revision": revision, "set": changed, "unset": cleared}
+    update = {"$set": {**{f"responses.{key}": value for key, value in changed.items()}, "last_saved": now}, "$inc": {"revision": 1}}
+    if cleared:
+        update["$unset"] = {f"responses.{key}": "" for key in cleared}
+    round_trips = 2 if revision == 0 else 1  # Only a new draft checks for an existing submission
+    return len(json.dumps(body)), len(bson.encode(update)), round_trips
+
+def run(users: int, saves: int, questions: int, noop_ratio: float):
+    rng = random.Random(42)
+    now = datetime.now()
+    totals = {"full": [0, 0, 0, 0], "delta": [0, 0, 0, 0]}  # requests, request bytes, update bytes, round trips
+
+    for _ in range(users):
+        previous, revision = {}, 0
+        for state in simulate(saves, questions, noop_ratio, rng):
+            request_bytes, update_bytes, round_trips = full_save(state, now)
+            full = totals["full"]
+            full[0] += 1
+            full[1] += request_bytes
+            full[2] += update_bytes
+            full[3] += round_trips
+
+            request_bytes, update_bytes, round_trips = delta_save(previous, state, revision, now)
+            if round_trips:
+                delta = totals["delta"]
+                delta[0] += 1
+                delta[1] += request_bytes
+                delta[2] += update_bytes
+                delta[3] += round_trips
+                revision += 1
+            previous = state
+
+    print(f"{users} users x {saves} autosaves, {questions} questions, {noop_ratio:.0%} unchanged saves")
+    for name, (requests, request_bytes, update_bytes, round_trips) in totals.items():
+        print(
+            f"{name:6} {requests:8d} requests  {request_bytes / 1e6:8.2f} MB sent  "
+            f"{update_bytes / 1e6:8.2f} MB of updates  {round_trips:8d} round trips"
+        )
+    full, delta = totals["full"], totals["delta"]
+    print(f"delta writes {delta[2] / full[2]:.1%} of the bytes with {delta[3] / full[3]:.1%} of the round trips")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--saves", type=int, default=120)
+    parser.add_argument("--questions", type=int, default=8)
+    parser.add_argument("--noop-ratio", type=float, default=0.2, help="Share of autosaves without any change")
+    args = parser.parse_args()
+    run(args.users, args.saves, args.questions, args.noop_ratio)
@@ -0,0 +1,127 @@
+"""
+Form entry export benchmark
+Streams synthetic entries through the CSV and NDJSON exporters and compares
+time and peak memory with building the whole admin leaderboard list in memory,
+the only way to get all entries out before the export endpoint.
+
+By default entries are generated on the fly. With --mongo they are inserted
+into a scratch form (point MONGODB_URL at a scratch database) and read back
+through the same batched cursor the endpoint uses.
+
+Run from the backend directory:
+    python -m benchmarks.bench_export [--entries 100000] [--mongo]
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from datetime import datetime
+
+from bson import ObjectId
+from config.database import connect_to_mongo, close_mongo_connection, get_database
+from config.settings import settings
+from routes.leaderboard import LeaderboardEntry
+from services.export_service import EntryExporter
+
+FORM_ID = "bench-export"
+FORM = {
+    "id": FORM_ID,
+    "name": "Bench Export",
+    "type": "team",
+    "_version": "1",
+    "questions": [
+        {"question_key": f"q{i}", "question_text": f"Question {i}", "question_type": "long"}
+        for i in range(8)
+    ]
+}
+
+def make_entry(i: int) -> dict:
+    responses = {f"q{j}": f"Answer {j} from participant {i}, " + "lorem ipsum " * 10 for j in range(8)}
+    responses.update({"team_member_3_name": f"Member {i}", "team_member_3_roll": str(12000 + i)})
+    return {
+        "_id": ObjectId(),
+        "form_id": FORM_ID,
+        "user_id": str(i),
+        "user_email": f"bench-{i}@example.com",
+        "user_name": f"Bench {i}",
+        "responses": responses,
+        "submitted_at": datetime.now(),
+        "score": i % 100
+    }
+
+async def generated(entries: int):
+    for i in range(entries):
+        yield make_entry(i)
+
+async def seed(db, entries: int):
+    await db.form_entries.delete_many({"form_id": FORM_ID})
+    batch = []
+    for i in range(entries):
+        batch.append(make_entry(i))
+        if len(batch) == 1000:
+            await db.form_entries.insert_many(batch)
+            batch = []
+    if batch:
+        await db.form_entries.insert_many(batch)
+
+async def streamed(source, exporter_method) -> int:
+    size = 0
+    async for chunk in exporter_method(source):
+        size += len(chunk.encode())
+    return size
+
+async def in_memory(source) -> int:
+    """What get_admin_leaderboard does: every entry as a pydantic object in one list"""
+    entries = []
+    async for entry in source:
+        entries.append(LeaderboardEntry(
+            id=str(entry["_id"]),
+            user_name=entry.get("user_name"),
+            user_email=entry["user_email"],
+            responses=entry["responses"],
+            submitted_at=entry["submitted_at"].isoformat(),
+            score=entry.get("score")
+        ))
+    return sum(len(entry.model_dump_json()) for entry in entries)
+
+async def measure(name: str, make_source, consume):
+    started = time.perf_counter()
+    size = await consume(make_source())
+    elapsed = time.perf_counter() - started
+
+    # Second pass for memory, tracemalloc slows everything down too much to time it
+    tracemalloc.start()
+    await consume(make_source())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:10} {elapsed:7.2f} s   {size / 1e6:8.1f} MB output   peak memory {peak / 1e6:8.1f} MB")
+
+async def run(entries: int, use_mongo: bool):
+    exporter = EntryExporter(FORM, settings.EXPORT_BATCH_SIZE)
+    make_source = lambda: generated(entries)
+
+    if use_mongo:
+        await connect_to_mongo()
+        db = await get_database()
+        await seed(db, entries)
+        make_source = lambda: db.form_entries.find(
+            {"form_id": FORM_ID},
+            {"responses": 1, "user_name": 1, "user_email": 1, "score": 1, "submitted_at": 1}
+        ).sort("_id", 1).batch_size(settings.EXPORT_BATCH_SIZE)
+
+    print(f"{entries} entries{' from MongoDB' if use_mongo else ''}")
+    try:
+        await measure("csv", make_source, lambda source: streamed(source, exporter.csv))
+        await measure("ndjson", make_source, lambda source: streamed(source, exporter.ndjson))
+        await measure("in-memory", make_source, in_memory)
+    finally:
+        if use_mongo:
+            await db.form_entries.delete_many({"form_id": FORM_ID})
+            await close_mongo_connection()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--mongo", action="store_true", help="Read the entries back from MongoDB")
+    args = parser.parse_args()
+    asyncio.run(run(args.entries, args.mongo))
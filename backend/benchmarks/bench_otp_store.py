@@ -0,0 +1,48 @@
+"""
+OTP verification latency for each OTP store backend
+Each cycle stores an OTP, rejects a wrong code and consumes the right one.
+
+The Mongo backend needs a MongoDB instance (use a scratch database).
+
+Run from the backend directory:
+    python -m benchmarks.bench_otp_store [--mongo] [--cycles 1000]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from config.database import connect_to_mongo, close_mongo_connection
+from services.otp_store import InMemoryOTPStore, MongoOTPStore
+
+async def measure(store, cycles: int) -> list:
+    timings = []
+    for i in range(cycles):
+        email = f"bench-{i}@example.com"
+        await store.store(email, "123456", 600)
+        started = time.perf_counter()
+        assert not await store.consume(email, "654321")
+        assert await store.consume(email, "123456")
+        timings.append((time.perf_counter() - started) * 1_000_000 / 2)
+    return timings
+
+def report(name: str, timings: list):
+    p99 = statistics.quantiles(timings, n=100)[-1]
+    print(f"{name:8} median {statistics.median(timings):9.1f} us/verify   p99 {p99:9.1f} us/verify")
+
+async def run(cycles: int, use_mongo: bool):
+    report("memory", await measure(InMemoryOTPStore(), cycles))
+
+    if use_mongo:
+        await connect_to_mongo()
+        try:
+            report("mongo", await measure(MongoOTPStore(), cycles))
+        finally:
+            await close_mongo_connection()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cycles", type=int, default=1000)
+    parser.add_argument("--mongo", action="store_true", help="Also benchmark the Mongo backend")
+    args = parser.parse_args()
+    asyncio.run(run(args.cycles, args.mongo))
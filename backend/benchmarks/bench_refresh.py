@@ -0,0 +1,63 @@
+"""
+Refresh throughput benchmark
+Times the CPU side of /api/auth/refresh (verify, revocation check, issuing
+two new tokens) with a large in-memory revocation mirror. With --mongo the
+same loop also does the find_one a database-backed revocation check would need.
+
+Run from the backend directory:
+    python -m benchmarks.bench_refresh [--mongo]
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from config.database import connect_to_mongo, close_mongo_connection, get_database
+from services.auth_service import create_access_token, create_refresh_token, verify_token
+from services.token_revocation_service import TokenRevocationStore
+
+REVOKED = 100_000
+
+async def run(iterations: int, use_mongo: bool):
+    store = TokenRevocationStore()
+    expires_at = time.time() + 3600
+    for _ in range(REVOKED):
+        store._revoked[uuid.uuid4().hex] = expires_at
+
+    # Every iteration refreshes a different token, so the token cache never hits
+    tokens = [
+        create_refresh_token(data={"sub": "bench@example.com", "user_id": "0" * 24})
+        for _ in range(iterations)
+    ]
+
+    db = None
+    if use_mongo:
+        await connect_to_mongo()
+        db = await get_database()
+
+    started = time.perf_counter()
+    for token in tokens:
+        token_data = verify_token(token, "refresh")
+        if db is not None:
+            await db.revoked_tokens.find_one({"_id": token_data.jti})
+        elif store.is_revoked(token_data.jti):
+            raise RuntimeError("Token unexpectedly revoked")
+        create_access_token(data={"sub": token_data.email, "user_id": token_data.user_id})
+        create_refresh_token(data={"sub": token_data.email, "user_id": token_data.user_id})
+    elapsed = time.perf_counter() - started
+
+    if use_mongo:
+        await close_mongo_connection()
+
+    check = "Mongo find_one" if use_mongo else f"in-memory ({REVOKED} revoked)"
+    print(f"Revocation check:  {check}")
+    print(f"Refreshes:         {iterations}")
+    print(f"Throughput:        {iterations / elapsed:10.0f} refreshes/s")
+    print(f"Latency:           {elapsed / iterations * 1_000_000:10.1f} us/refresh")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--mongo", action="store_true", help="Check revocation with a Mongo lookup instead")
+    args = parser.parse_args()
+    asyncio.run(run(args.iterations, args.mongo))
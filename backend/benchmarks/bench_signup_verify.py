@@ -0,0 +1,97 @@
+"""
+Signup verification latency benchmark
+Compares the old six-call sequential signup/verify chain with the current
+two-round-trip path (OTP consume + pending user claim, then insert).
+
+Needs a MongoDB instance; point MONGODB_URL at a scratch database since
+the benchmark writes (and removes) bench-*@example.com users.
+
+Run from the backend directory:
+    python -m benchmarks.bench_signup_verify [--iterations 200]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytz
+from config.database import connect_to_mongo, close_mongo_connection, get_database
+from services.otp_service import verify_otp, claim_pending_user
+from services.otp_store import hash_otp
+
+OTP = "123456"
+
+async def seed(db, email: str):
+    now = datetime.now(tz = pytz.timezone('Asia/Kolkata'))
+    await db.pending_users.insert_one({
+        "email": email,
+        "full_name": "Bench User",
+        "hashed_password": "x",
+        "created_at": now
+    })
+    # Plain code for the legacy chain, keyed hash for the current OTP store
+    await db.otps.insert_one({
+        "_id": email,
+        "email": email,
+        "otp": OTP,
+        "otp_hash": hash_otp(email, OTP),
+        "expires_at": now + timedelta(minutes=10),
+        "created_at": now
+    })
+
+def user_doc(pending_user: dict) -> dict:
+    return {
+        "email": pending_user["email"],
+        "full_name": pending_user.get("full_name"),
+        "hashed_password": pending_user["hashed_password"],
+        "is_active": True,
+        "is_verified": True,
+        "created_at": datetime.now(tz = pytz.timezone('Asia/Kolkata')),
+        "updated_at": datetime.now(tz = pytz.timezone('Asia/Kolkata'))
+    }
+
+async def legacy_verify(db, email: str):
+    """The previous chain: find + delete OTP, find pending, find user, insert, delete pending"""
+    record = await db.otps.find_one({"email": email, "otp": OTP})
+    assert record
+    await db.otps.delete_one({"email": email})
+    pending_user = await db.pending_users.find_one({"email": email})
+    assert not await db.users.find_one({"email": email})
+    await db.users.insert_one(user_doc(pending_user))
+    await db.pending_users.delete_one({"email": email})
+
+async def current_verify(db, email: str):
+    """Same steps as routes.auth.signup_verify"""
+    is_valid, pending_user = await asyncio.gather(verify_otp(email, OTP), claim_pending_user(email))
+    assert is_valid and pending_user
+    await db.users.insert_one(user_doc(pending_user))
+
+async def measure(db, verify, iterations: int) -> list:
+    timings = []
+    for _ in range(iterations):
+        email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+        await seed(db, email)
+        started = time.perf_counter()
+        await verify(db, email)
+        timings.append((time.perf_counter() - started) * 1000)
+        await db.users.delete_one({"email": email})
+    return timings
+
+async def run(iterations: int):
+    await connect_to_mongo()
+    db = await get_database()
+    try:
+        for name, verify in [("legacy", legacy_verify), ("current", current_verify)]:
+            timings = await measure(db, verify, iterations)
+            p95 = statistics.quantiles(timings, n=20)[-1]
+            print(f"{name:8} median {statistics.median(timings):7.2f} ms   p95 {p95:7.2f} ms")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.iterations))
@@ -0,0 +1,130 @@
+"""
+Form submission throughput benchmark
+Compares the old submit path (duplicate find_one, insert, then a sequential
+draft delete) with routes.forms.submit_form (optimistic insert guarded by the
+unique index, draft delete as a background task).
+
+Needs a MongoDB instance; point MONGODB_URL at a scratch database since the
+benchmark writes (and removes) a bench-submit form with its entries and drafts.
+
+Run from the backend directory:
+    python -m benchmarks.bench_submit_form [--submissions 2000] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import pytz
+from bson import ObjectId
+from fastapi import BackgroundTasks, HTTPException
+from config.database import connect_to_mongo, close_mongo_connection, get_database
+from models.form_entry import FormEntryCreate
+from models.user import UserInDB
+from routes.forms import submit_form
+
+FORM_ID = "bench-submit"
+
+def make_user(i: int) -> UserInDB:
+    return UserInDB(_id=ObjectId(), email=f"bench-{i}@example.com", full_name=f"Bench {i}")
+
+def make_submission(user: UserInDB) -> FormEntryCreate:
+    return FormEntryCreate(form_id=FORM_ID, user_id=str(user.id), responses={"q1": "answer"})
+
+async def seed(db):
+    now = datetime.now(tz = pytz.timezone('Asia/Kolkata')).replace(tzinfo=None)
+    await db.forms.replace_one(
+        {"id": FORM_ID},
+        {
+            "id": FORM_ID,
+            "name": "Bench Submit",
+            "type": "solo",
+            "opening_time": now - timedelta(days=1),
+            "closing_time": now + timedelta(days=1),
+            "questions": [{"question_key": "q1", "question_text": "Question 1", "question_type": "short"}]
+        },
+        upsert=True
+    )
+
+async def cleanup(db):
+    await db.form_entries.delete_many({"form_id": FORM_ID})
+    await db.form_drafts.delete_many({"form_id": FORM_ID})
+
+async def legacy_submit(db, user: UserInDB, submission: FormEntryCreate):
+    """The previous data path: duplicate check, insert, then delete the draft before responding"""
+    if await db.form_entries.find_one({"form_id": FORM_ID, "user_id": str(user.id)}):
+        raise HTTPException(status_code=409)
+    now = datetime.now(tz = pytz.timezone('Asia/Kolkata'))
+    await db.form_entries.insert_one({
+        "form_id": FORM_ID,
+        "user_id": str(user.id),
+        "user_email": user.email,
+        "user_name": user.full_name,
+        "responses": submission.responses,
+        "submitted_at": now
+    })
+    await db.form_drafts.delete_one({"form_id": FORM_ID, "user_id": str(user.id)})
+
+async def current_submit(db, user: UserInDB, submission: FormEntryCreate, background: list):
+    tasks = BackgroundTasks()
+    await submit_form(FORM_ID, submission, tasks, current_user=user)
+    # Starlette runs these after the response; here they only count towards the total time
+    background.append(asyncio.create_task(tasks()))
+
+async def measure(db, name: str, submissions: int, concurrency: int):
+    await cleanup(db)
+    users = [make_user(i) for i in range(submissions)]
+    latencies = []
+    background = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(user: UserInDB):
+        submission = make_submission(user)
+        async with semaphore:
+            started = time.perf_counter()
+            if name == "legacy":
+                await legacy_submit(db, user, submission)
+            else:
+                await current_submit(db, user, submission, background)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(user) for user in users))
+    await asyncio.gather(*background)
+    elapsed = time.perf_counter() - started
+
+    # Duplicates must still be rejected
+    try:
+        if name == "legacy":
+            await legacy_submit(db, users[0], make_submission(users[0]))
+        else:
+            await current_submit(db, users[0], make_submission(users[0]), [])
+        raise AssertionError("duplicate submission was accepted")
+    except HTTPException as e:
+        assert e.status_code == 409
+
+    p95 = statistics.quantiles(latencies, n=20)[-1]
+    print(
+        f"{name:8} {submissions / elapsed:8.0f} submissions/s   "
+        f"median {statistics.median(latencies):7.2f} ms   p95 {p95:7.2f} ms"
+    )
+
+async def run(submissions: int, concurrency: int):
+    await connect_to_mongo()
+    db = await get_database()
+    try:
+        await seed(db)
+        for name in ("legacy", "current"):
+            await measure(db, name, submissions, concurrency)
+    finally:
+        await cleanup(db)
+        await db.forms.delete_one({"id": FORM_ID})
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--submissions", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.submissions, args.concurrency))
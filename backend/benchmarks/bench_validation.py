@@ -0,0 +1,79 @@
+"""
+Form response validation benchmark
+Validates submissions to a large synthetic form three ways: the inline
+required-key check submit_form used to do (presence only), compiling a
+validator on every request, and the per-version cached validator.
+
+The inline check does far less work (no blank, length or option checks), so
+it is a floor rather than a like-for-like baseline: the cache is what keeps
+the full checks from costing a compile per request.
+
+Run from the backend directory:
+    python -m benchmarks.bench_validation [--questions 500] [--requests 5000] [--repeat 5]
+"""
+import argparse
+import statistics
+import time
+
+from services.form_registry import freeze
+from services.form_validator import FormValidator, form_validators
+
+def make_form(questions: int):
+    return freeze({
+        "id": "bench-validation",
+        "type": "team",
+        "_version": "1",
+        "questions": [
+            {"question_key": f"q{i}", "question_text": f"Question {i}", "question_type": "radio",
+             "options": [f"Option {j}" for j in range(5)]}
+            if i % 4 == 0 else
+            {"question_key": f"q{i}", "question_text": f"Question {i}", "question_type": "short" if i % 2 else "long"}
+            for i in range(questions)
+        ]
+    })
+
+def make_responses(questions: int) -> dict:
+    responses = {f"q{i}": "Option 3" if i % 4 == 0 else f"Answer to question {i}" for i in range(questions)}
+    responses.update({"team_member_2_name": "Member", "team_member_2_roll": "12345", "team_member_2_phone": "9999999999"})
+    return responses
+
+def inline(form, responses):
+    """What submit_form did before: rebuild the required set, check presence only"""
+    required_questions = {q["question_key"] for q in form["questions"]}
+    return required_questions - set(responses.keys())
+
+def uncached(form, responses):
+    validator = FormValidator(form)
+    return validator.check_submission(validator.known(responses))
+
+def compiled(form, responses):
+    validator = form_validators.get(form)
+    return validator.check_submission(validator.known(responses))
+
+def measure(name: str, check, form, responses, requests: int, repeat: int):
+    """Median over repeat runs of requests calls each"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(requests):
+            check(form, responses)
+        timings.append((time.perf_counter() - started) / requests * 1e6)
+    print(f"{name:10} {statistics.median(timings):9.1f} us/request (min {min(timings):.1f}, max {max(timings):.1f})")
+
+def run(questions: int, requests: int, repeat: int):
+    form = make_form(questions)
+    responses = make_responses(questions)
+    assert compiled(form, responses) is None
+
+    print(f"{questions} questions, {requests} requests, median of {repeat} runs")
+    measure("inline", inline, form, responses, requests, repeat)
+    measure("uncached", uncached, form, responses, requests, repeat)
+    measure("compiled", compiled, form, responses, requests, repeat)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.questions, args.requests, args.repeat)
@@ -0,0 +1,36 @@
+"""
+Microbenchmark for JWT verification
+Compares a full jose decode against a token cache hit in verify_token
+
+Run from the backend directory:
+    python -m benchmarks.bench_verify_token
+"""
+import timeit
+from jose import jwt
+from config.settings import settings
+from services.auth_service import create_access_token, verify_token, token_cache
+
+ITERATIONS = 20000
+
+def full_decode(token: str):
+    jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+
+def main():
+    token = create_access_token(data={"sub": "bench@example.com", "user_id": "0" * 24})
+
+    token_cache.clear()
+    verify_token(token, "access")  # Warm the cache
+
+    decode_seconds = timeit.timeit(lambda: full_decode(token), number=ITERATIONS)
+    cached_seconds = timeit.timeit(lambda: verify_token(token, "access"), number=ITERATIONS)
+
+    decode_us = decode_seconds / ITERATIONS * 1_000_000
+    cached_us = cached_seconds / ITERATIONS * 1_000_000
+
+    print(f"Iterations:        {ITERATIONS}")
+    print(f"jose decode:       {decode_us:8.2f} us/request")
+    print(f"verify_token hit:  {cached_us:8.2f} us/request")
+    print(f"Saving:            {decode_us - cached_us:8.2f} us/request ({decode_us / cached_us:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Local stand-in for Google's tokeninfo, userinfo and certs (JWKS) endpoints
+Every access token is accepted, each response is delayed by --latency milliseconds
+
+Run from the backend directory:
+    python -m benchmarks.stub_google_oauth --port 8001 --latency 150
+
+Then point the backend at it (e.g. in .env):
+    GOOGLE_TOKENINFO_URL=http://127.0.0.1:8001/oauth2/v3/tokeninfo
+    GOOGLE_USERINFO_URL=http://127.0.0.1:8001/oauth2/v2/userinfo
+    GOOGLE_JWKS_URL=http://127.0.0.1:8001/oauth2/v3/certs
+
+With --bench the script instead starts the stub in-process and times
+GoogleAuthService.verify_access_token for cold and cached tokens.
+"""
+import argparse
+import asyncio
+import hashlib
+import time
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Response
+from config.settings import settings
+
+def create_app(latency_ms: float, expires_in: int = 3600, jwks: Optional[dict] = None) -> FastAPI:
+    """jwks is served as is by the certs endpoint, edit it to rotate keys"""
+    app = FastAPI(title="Stub Google OAuth")
+    jwks = jwks if jwks is not None else {"keys": []}
+
+    def identity(access_token: str) -> dict:
+        if access_token.startswith("invalid"):
+            raise HTTPException(status_code=400, detail="invalid_token")
+        user = hashlib.sha256(access_token.encode()).hexdigest()[:12]
+        return {"sub": user, "email": f"{user}@example.com"}
+
+    @app.get("/oauth2/v3/tokeninfo")
+    async def tokeninfo(access_token: str):
+        await asyncio.sleep(latency_ms / 1000)
+        data = identity(access_token)
+        return {
+            **data,
+            "aud": settings.GOOGLE_CLIENT_ID,
+            "exp": str(int(time.time()) + expires_in),
+            "expires_in": str(expires_in),
+        }
+
+    @app.get("/oauth2/v2/userinfo")
+    async def userinfo(access_token: str):
+        await asyncio.sleep(latency_ms / 1000)
+        data = identity(access_token)
+        return {"id": data["sub"], "name": f"User {data['sub']}", "picture": None}
+
+    @app.get("/oauth2/v3/certs")
+    async def certs(response: Response):
+        await asyncio.sleep(latency_ms / 1000)
+        response.headers["Cache-Control"] = f"public, max-age={expires_in}"
+        return jwks
+
+    return app
+
+async def bench(port: int, latency_ms: float, requests: int):
+    config = uvicorn.Config(create_app(latency_ms), port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    settings.GOOGLE_TOKENINFO_URL = f"http://127.0.0.1:{port}/oauth2/v3/tokeninfo"
+    settings.GOOGLE_USERINFO_URL = f"http://127.0.0.1:{port}/oauth2/v2/userinfo"
+    from services.google_auth_service import GoogleAuthService
+    service = GoogleAuthService()
+    await service.start()
+
+    try:
+        started = time.perf_counter()
+        for i in range(requests):
+            await service.verify_access_token(f"token-{i}")
+        cold_ms = (time.perf_counter() - started) / requests * 1000
+
+        started = time.perf_counter()
+        for i in range(requests):
+            await service.verify_access_token(f"token-{i}")
+        cached_ms = (time.perf_counter() - started) / requests * 1000
+
+        print(f"Stub latency:     {latency_ms:.0f} ms per endpoint")
+        print(f"Cold verify:      {cold_ms:8.2f} ms/request")
+        print(f"Cached verify:    {cached_ms:8.2f} ms/request")
+    finally:
+        await service.close()
+        server.should_exit = True
+        await server_task
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=100, help="Delay per response in milliseconds")
+    parser.add_argument("--bench", action="store_true", help="Benchmark GoogleAuthService against the stub")
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.bench:
+        asyncio.run(bench(args.port, args.latency, args.requests))
+    else:
+        uvicorn.run(create_app(args.latency), port=args.port)
@@ -0,0 +1,170 @@
+"""
+Local fake of the Google Sheets v4 API, enough for GoogleSheetsService
+Spreadsheets live in memory, every response is delayed by --latency milliseconds
+
+Run from the backend directory:
+    python -m benchmarks.stub_sheets_server --port 8002 --latency 300
+
+Then point the backend at it (e.g. in .env):
+    SHEETS_API_ENDPOINT=http://127.0.0.1:8002/
+
+With --bench the script instead starts the stub in a background thread and
+measures how long the event loop stalls while Sheets requests are in flight,
+once with blocking .execute() calls on the loop and once through
+GoogleSheetsService's thread pool.
+"""
+import argparse
+import asyncio
+import re
+import threading
+import time
+from collections import defaultdict
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+
+def column_index(letters: str) -> int:
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index - 1
+
+def select(rows: list, range_name: str) -> list:
+    """Cells of an A1 range such as 'Tab!1:1' or 'Tab!B2:B' (whole tab for anything else)"""
+    match = re.fullmatch(r"([A-Z]*)(\d*):([A-Z]*)(\d*)", range_name.partition("!")[2])
+    if match is None:
+        return rows
+    first_column, first_row, last_column, last_row = match.groups()
+    rows = rows[int(first_row or 1) - 1:int(last_row) if last_row else None]
+    start = column_index(first_column) if first_column else 0
+    stop = column_index(last_column) + 1 if last_column else None
+    return [row[start:stop] for row in rows]
+
+def create_app(latency_ms: float) -> FastAPI:
+    app = FastAPI(title="Stub Google Sheets")
+    # spreadsheet id -> tab title -> rows
+    spreadsheets = defaultdict(lambda: {"Form Responses 1": []})
+
+    def tab(spreadsheet_id: str, range_name: str) -> list:
+        title = range_name.split("!")[0]
+        tabs = spreadsheets[spreadsheet_id]
+        if title not in tabs:
+            raise HTTPException(status_code=400, detail=f"Unable to parse range: {range_name}")
+        return tabs[title]
+
+    @app.get("/v4/spreadsheets/{spreadsheet_id}")
+    async def get_spreadsheet(spreadsheet_id: str):
+        await asyncio.sleep(latency_ms / 1000)
+        return {"sheets": [{"properties": {"title": title}} for title in spreadsheets[spreadsheet_id]]}
+
+    @app.post("/v4/spreadsheets/{spreadsheet_id}:batchUpdate")
+    async def batch_update(spreadsheet_id: str, request: Request):
+        await asyncio.sleep(latency_ms / 1000)
+        body = await request.json()
+        for item in body.get("requests", []):
+            title = item["addSheet"]["properties"]["title"]
+            if title in spreadsheets[spreadsheet_id]:
+                raise HTTPException(status_code=400, detail=f"A sheet with the name \"{title}\" already exists")
+            spreadsheets[spreadsheet_id][title] = []
+        return {"replies": [{} for _ in body.get("requests", [])]}
+
+    @app.get("/v4/spreadsheets/{spreadsheet_id}/values/{range_name}")
+    async def get_values(spreadsheet_id: str, range_name: str):
+        await asyncio.sleep(latency_ms / 1000)
+        rows = select(tab(spreadsheet_id, range_name), range_name)
+        return {"range": range_name, "values": rows}
+
+    @app.put("/v4/spreadsheets/{spreadsheet_id}/values/{range_name}")
+    async def update_values(spreadsheet_id: str, range_name: str, request: Request):
+        await asyncio.sleep(latency_ms / 1000)
+        rows = tab(spreadsheet_id, range_name)
+        values = (await request.json())["values"]
+        rows[:len(values)] = values
+        return {"updatedRows": len(values)}
+
+    @app.post("/v4/spreadsheets/{spreadsheet_id}/values/{range_name}:append")
+    async def append_values(spreadsheet_id: str, range_name: str, request: Request):
+        await asyncio.sleep(latency_ms / 1000)
+        rows = tab(spreadsheet_id, range_name)
+        values = (await request.json())["values"]
+        rows.extend(values)
+        return {"updates": {"updatedRows": len(values)}}
+
+    return app
+
+async def measure_stall(work) -> float:
+    """Run work() while a 10 ms ticker records the longest delay it saw, in ms"""
+    worst = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal worst
+        while not done:
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            worst = max(worst, (time.perf_counter() - started) * 1000 - 10)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.02)
+    await work()
+    done = True
+    await task
+    return worst
+
+async def bench(port: int, latency_ms: float, requests: int):
+    from config.settings import settings
+    settings.SHEETS_API_ENDPOINT = f"http://127.0.0.1:{port}/"
+    from services.google_sheets_service import GoogleSheetsService
+    service = GoogleSheetsService()
+    questions = [{"question_key": "q1", "question_text": "Question 1"}]
+
+    async def blocking():
+        # What the service used to do: .execute() directly on the event loop
+        client = service._thread_service()
+        for i in range(requests):
+            client.spreadsheets().values().append(
+                spreadsheetId=service.forms_sheet_id,
+                range="Form Responses 1!A:A",
+                valueInputOption="RAW",
+                insertDataOption="INSERT_ROWS",
+                body={"values": [[str(i)]]}
+            ).execute()
+
+    async def pooled():
+        await asyncio.gather(*(
+            service.append_rows("Bench Form", questions, [[str(i)]]) for i in range(requests)
+        ))
+
+    try:
+        # Warm up: imports, client construction and the tab creation are not what is measured
+        await pooled()
+        blocking_stall = await measure_stall(blocking)
+        started = time.perf_counter()
+        pooled_stall = await measure_stall(pooled)
+        pooled_s = time.perf_counter() - started
+
+        print(f"Stub latency:              {latency_ms:.0f} ms per request, {requests} appends")
+        print(f"Blocking execute():        event loop stalled up to {blocking_stall:8.1f} ms")
+        print(f"Thread pool ({settings.SHEETS_MAX_WORKERS} workers):   event loop stalled up to {pooled_stall:8.1f} ms "
+              f"({pooled_s:.2f}s for all appends)")
+    finally:
+        service.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--latency", type=float, default=200, help="Delay per response in milliseconds")
+    parser.add_argument("--bench", action="store_true", help="Benchmark GoogleSheetsService against the stub")
+    parser.add_argument("--requests", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.bench:
+        # The stub gets its own thread and event loop, so blocking calls in the benchmark cannot stall it
+        server = uvicorn.Server(uvicorn.Config(create_app(args.latency), port=args.port, log_level="warning"))
+        threading.Thread(target=server.run, daemon=True).start()
+        while not server.started:
+            time.sleep(0.05)
+        asyncio.run(bench(args.port, args.latency, args.requests))
+        server.should_exit = True
+    else:
+        uvicorn.run(create_app(args.latency), port=args.port)
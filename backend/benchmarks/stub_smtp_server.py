@@ -0,0 +1,136 @@
+"""
+Local SMTP stand-in
+Accepts every message (no TLS, no auth) and delays each reply by --latency milliseconds
+
+Run from the backend directory:
+    python -m benchmarks.stub_smtp_server --port 8025 --latency 50
+
+Then point the backend at it (e.g. in .env):
+    SMTP_HOST=127.0.0.1
+    SMTP_PORT=8025
+    SMTP_USE_TLS=false
+
+With --bench the script instead starts the stand-in in-process and compares
+a fresh connection per message with the persistent SMTPSession.
+"""
+import argparse
+import asyncio
+import smtplib
+import time
+
+from config.settings import settings
+
+class StubSMTPServer:
+    def __init__(self, latency_ms: float = 0):
+        self.latency_ms = latency_ms
+        self.messages = []
+        self.connections = 0
+        self._writers = set()
+
+    def drop_connections(self):
+        """Close every client connection, like a server timing out idle sessions"""
+        for writer in list(self._writers):
+            writer.close()
+
+    async def _reply(self, writer: asyncio.StreamWriter, line: str):
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        writer.write((line + "\r\n").encode())
+        await writer.drain()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self._writers.add(writer)
+        await self._reply(writer, "220 stub ESMTP ready")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors="replace").strip().upper()
+
+                if command.startswith("EHLO"):
+                    writer.write(b"250-stub\r\n")
+                    await self._reply(writer, "250 SIZE 10485760")
+                elif command.startswith("DATA"):
+                    await self._reply(writer, "354 End data with <CR><LF>.<CR><LF>")
+                    data = []
+                    while True:
+                        data_line = await reader.readline()
+                        if data_line in (b".\r\n", b".\n", b""):
+                            break
+                        data.append(data_line)
+                    self.messages.append(b"".join(data))
+                    await self._reply(writer, "250 OK queued")
+                elif command.startswith("QUIT"):
+                    await self._reply(writer, "221 Bye")
+                    break
+                else:
+                    # HELO, MAIL, RCPT, RSET, NOOP
+                    await self._reply(writer, "250 OK")
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def start(self, port: int) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.handle, "127.0.0.1", port)
+
+def send_with_fresh_connection(message):
+    """What send_otp_email used to do for every single message"""
+    with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
+        server.send_message(message)
+
+async def bench(port: int, latency_ms: float, messages: int):
+    stub = StubSMTPServer(latency_ms)
+    server = await stub.start(port)
+
+    settings.SMTP_HOST = "127.0.0.1"
+    settings.SMTP_PORT = port
+    settings.SMTP_USE_TLS = False
+    settings.SMTP_USER = None
+    settings.SMTP_PASSWORD = None
+    settings.SMTP_FROM_EMAIL = "bench@example.com"
+    from services.email_service import SMTPSession, build_mime_message, build_otp_message
+
+    content = build_otp_message("123456", "Bench")
+    message = build_mime_message("user@example.com", content["subject"], content["text"], content["html"])
+
+    started = time.perf_counter()
+    for _ in range(messages):
+        await asyncio.to_thread(send_with_fresh_connection, message)
+    fresh_ms = (time.perf_counter() - started) / messages * 1000
+
+    session = SMTPSession()
+    started = time.perf_counter()
+    for _ in range(messages):
+        await session.send(message)
+    pooled_ms = (time.perf_counter() - started) / messages * 1000
+    await session.close()
+
+    server.close()
+    await server.wait_closed()
+
+    print(f"Stub latency:           {latency_ms:.0f} ms per reply")
+    print(f"Fresh connection:       {fresh_ms:8.2f} ms/message")
+    print(f"Persistent session:     {pooled_ms:8.2f} ms/message ({session.connects} connect)")
+    print(f"Messages received:      {len(stub.messages)}")
+
+async def serve(port: int, latency_ms: float):
+    stub = StubSMTPServer(latency_ms)
+    server = await stub.start(port)
+    print(f"Stub SMTP server listening on 127.0.0.1:{port}")
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency", type=float, default=20, help="Delay per reply in milliseconds")
+    parser.add_argument("--bench", action="store_true", help="Benchmark SMTPSession against the stand-in")
+    parser.add_argument("--messages", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.bench:
+        asyncio.run(bench(args.port, args.latency, args.messages))
+    else:
+        asyncio.run(serve(args.port, args.latency))
@@ -1,7 +1,9 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from typing import Optional
+import asyncio
 import os
 from dotenv import load_dotenv
+from config.settings import settings
 
 load_dotenv()
 
@@ -30,23 +32,61 @@ async def connect_to_mongo():
     await database.otps.create_index("email")
     await database.otps.create_index("expires_at", expireAfterSeconds=0)  # TTL index
     
+    await database.otp_send_cooldowns.create_index("expires_at", expireAfterSeconds=0)  # TTL index
+    
     # Pending users collection indexes
     await database.pending_users.create_index("email", unique=True)
     await database.pending_users.create_index("created_at", expireAfterSeconds=86400)  # Expire after 24 hours
     
+    # Forms collection indexes
+    await database.forms.create_index("id", unique=True)
+    
     # Form entries collection indexes
     await database.form_entries.create_index([("form_id", 1), ("user_id", 1)], unique=True)  # Prevent duplicate submissions
     await database.form_entries.create_index("user_id")
     await database.form_entries.create_index("form_id")
+    await database.form_entries.create_index([("form_id", 1), ("_id", 1)])  # Exports and bulk mail walk a form's entries in _id order
     await database.form_entries.create_index("submitted_at")
+    await database.form_entries.create_index([("sheets_sync.status", 1), ("sheets_sync.next_attempt_at", 1)])  # Sheets outbox
     
     # Form drafts collection indexes
     await database.form_drafts.create_index([("form_id", 1), ("user_id", 1)], unique=True)  # One draft per user per form
     await database.form_drafts.create_index("user_id")
     await database.form_drafts.create_index("last_saved")
     
+    # Revoked refresh tokens (_id is the token's jti)
+    await database.revoked_tokens.create_index("expires_at", expireAfterSeconds=0)  # TTL index
+    await database.revoked_tokens.create_index("revoked_at")
+    
+    # Shared rate limit counters
+    await database.rate_limits.create_index("expires_at", expireAfterSeconds=0)  # TTL index
+    
+    # Email outbox (background delivery)
+    await database.email_outbox.create_index([("status", 1), ("next_attempt_at", 1)])
+    await database.email_outbox.create_index("created_at", expireAfterSeconds=settings.EMAIL_OUTBOX_RETENTION_SECONDS)  # TTL index, bodies may hold OTPs
+    
+    # Bulk mail jobs
+    await database.mail_jobs.create_index([("status", 1), ("lease_until", 1)])
+    
     print("Database indexes created")
     
+async def delete_in_batches(collection, query: dict, batch_size: int) -> int:
+    """Delete matching documents in bounded batches instead of one unbounded delete_many"""
+    deleted = 0
+    while True:
+        ids = [doc["_id"] async for doc in collection.find(query, {"_id": 1}).limit(batch_size)]
+        if not ids:
+            break
+        
+        result = await collection.delete_many({"_id": {"$in": ids}})
+        deleted += result.deleted_count
+        if len(ids) < batch_size:
+            break
+        
+        # Give other requests a turn between batches
+        await asyncio.sleep(0)
+    return deleted
+
 async def close_mongo_connection():
     """Close MongoDB connection"""
     if db.client:
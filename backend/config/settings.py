@@ -12,11 +12,46 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    TOKEN_CACHE_MAX_SIZE: int = 20000  # Decoded JWTs kept in memory, each until its exp
+    TOKEN_REVOCATION_SYNC_SECONDS: int = 15  # How often workers pick up each other's revocations
+    REFRESH_TOKEN_REUSE_GRACE_SECONDS: int = 10  # A rotated refresh token still gets its successor this long
+    
+    # Password hashing worker pool
+    PASSWORD_HASH_EXECUTOR: str = "thread"  # "thread" or "process"
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_CONCURRENCY: int = 8  # Jobs handed to the pool at once, the rest wait in queue
+    BCRYPT_ROUNDS: int = 0  # Pins the bcrypt cost, 0 uses the calibrated one shared through Mongo
+    BCRYPT_TARGET_HASH_MS: int = 250  # Calibration target per hash/verify, 0 keeps the passlib default
+    BCRYPT_MIN_ROUNDS: int = 12  # Calibration never goes below the passlib default (12) either
+    BCRYPT_MAX_ROUNDS: int = 14
+    BCRYPT_CALIBRATION_SAMPLES: int = 5  # Hashes timed, the median is used
+    
+    # Rate limits as "<attempts>/<seconds>" per email
+    RATE_LIMIT_BACKEND: str = "memory"  # "memory" (per worker) or "mongo" (shared by all workers)
+    RATE_LIMIT_LOGIN: str = "10/300"
+    RATE_LIMIT_OTP_SEND: str = "5/900"
+    RATE_LIMIT_OTP_VERIFY: str = "10/900"
+    RATE_LIMIT_SIGNUP: str = "5/900"  # Legacy /signup (no email verification)
+    RATE_LIMIT_IP_FACTOR: int = 20  # Per-IP limits are this many times the per-email ones (shared campus IPs)
+    RATE_LIMIT_TRUST_FORWARDED_FOR: bool = False  # Take the client IP from X-Forwarded-For (behind a proxy)
+    
+    # Authenticated principal cache (used by get_current_user)
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000
     
     # Google OAuth
     GOOGLE_CLIENT_ID: str = ""
     GOOGLE_CLIENT_SECRET: str = ""
     GOOGLE_REDIRECT_URI: str = "http://localhost:3000/api/auth/google/callback"
+    GOOGLE_TOKENINFO_URL: str = "https://www.googleapis.com/oauth2/v3/tokeninfo"
+    GOOGLE_USERINFO_URL: str = "https://www.googleapis.com/oauth2/v2/userinfo"
+    GOOGLE_HTTP_TIMEOUT_SECONDS: float = 10.0
+    GOOGLE_HTTP_MAX_CONNECTIONS: int = 20
+    GOOGLE_IDENTITY_CACHE_MAX_SIZE: int = 5000  # Verified tokens kept until they expire
+    GOOGLE_JWKS_URL: str = "https://www.googleapis.com/oauth2/v3/certs"
+    GOOGLE_ID_TOKEN_ISSUERS: str = "accounts.google.com,https://accounts.google.com"  # Comma-separated
+    GOOGLE_JWKS_REFRESH_SECONDS: int = 3600  # Used when Google sends no Cache-Control max-age
+    GOOGLE_JWKS_MIN_REFRESH_SECONDS: int = 60  # Throttle for refetches caused by unknown key IDs
     
     # Application
     FRONTEND_URL: str = "http://localhost:3000"
@@ -30,6 +65,65 @@ class Settings(BaseSettings):
     SMTP_USER: Optional[str] = None
     SMTP_PASSWORD: Optional[str] = None
     SMTP_FROM_EMAIL: Optional[str] = None
+    SMTP_USE_TLS: bool = True  # STARTTLS, disable for a local SMTP stand-in
+    SMTP_TIMEOUT_SECONDS: float = 20.0
+    SMTP_IDLE_SECONDS: int = 60  # Reused sessions idle for longer are checked with NOOP first
+    
+    # OTP storage
+    OTP_STORE_BACKEND: str = "mongo"  # "mongo" or "memory" (single worker only)
+    OTP_RESEND_COOLDOWN_SECONDS: int = 30  # Resends within this window reuse the OTP already sent
+    
+    # Form definition cache
+    FORM_CACHE_TTL_SECONDS: int = 60  # Edits made directly in Mongo show up after this
+    FORM_CACHE_NEGATIVE_TTL_SECONDS: int = 10  # Unknown form IDs
+    FORM_CACHE_MAX_SIZE: int = 500
+    FORM_COMPILED_TTL_SECONDS: int = 3600  # Validators and submission layouts, cached per form version
+    
+    # Team forms
+    MAX_TEAM_SIZE: int = 4  # Including the leader, team member columns 2 to MAX_TEAM_SIZE
+    
+    # Response validation
+    RESPONSE_MAX_LENGTH_SHORT: int = 500  # Characters
+    RESPONSE_MAX_LENGTH_LONG: int = 10000
+    
+    # Google Sheets mirroring (background outbox)
+    SHEETS_SYNC_QUEUE_MAX_SIZE: int = 1000
+    SHEETS_SYNC_MAX_ATTEMPTS: int = 8
+    SHEETS_SYNC_RETRY_BASE_SECONDS: float = 5.0  # Doubles after every failed attempt
+    SHEETS_SYNC_LEASE_SECONDS: int = 120  # An entry claimed by a worker that died is retried after this
+    SHEETS_SYNC_SWEEP_SECONDS: int = 30  # Picks up entries left over by restarts or a full queue
+    SHEETS_BATCH_MAX_ROWS: int = 50  # Rows per append call
+    SHEETS_BATCH_MAX_WAIT_SECONDS: float = 2.0  # A batch is flushed once its oldest row waited this long
+    SHEETS_METADATA_TTL_SECONDS: int = 600  # Cached tab list of the forms spreadsheet
+    SHEETS_MAX_WORKERS: int = 4  # Threads (and connections) for Sheets API calls
+    SHEETS_HTTP_TIMEOUT_SECONDS: float = 15.0
+    SHEETS_API_ENDPOINT: str = ""  # Override, e.g. a local fake Sheets server (requests are then unauthenticated)
+    
+    # Draft autosave write-behind buffer
+    DRAFT_FLUSH_INTERVAL_SECONDS: float = 2.0  # Unflushed autosaves are lost if the worker dies
+    DRAFT_BUFFER_MAX_SIZE: int = 2000  # Drafts buffered before an early flush
+    DRAFT_REVISION_CACHE_SECONDS: int = 900  # How long written draft revisions are remembered
+    
+    # Admin exports
+    EXPORT_BATCH_SIZE: int = 1000  # Entries per cursor batch and per streamed chunk
+    
+    # Housekeeping jobs
+    MAINTENANCE_BATCH_SIZE: int = 500  # Documents deleted per batch
+    MAINTENANCE_JITTER_SECONDS: int = 30  # Random delay added to every job interval
+    CLEANUP_EXPIRED_OTPS_INTERVAL_SECONDS: int = 600
+    CLEANUP_PENDING_USERS_INTERVAL_SECONDS: int = 3600
+    
+    # Background email delivery
+    EMAIL_QUEUE_MAX_SIZE: int = 1000
+    EMAIL_MAX_ATTEMPTS: int = 5
+    EMAIL_RETRY_BASE_SECONDS: float = 2.0  # Doubles after every failed attempt
+    EMAIL_OUTBOX_SWEEP_SECONDS: int = 30  # Picks up messages left over by restarts or a full queue
+    EMAIL_OUTBOX_RETENTION_SECONDS: int = 86400  # Outbox documents (including failed ones) are removed after this
+    
+    # Bulk notification mails
+    BULK_MAIL_SESSIONS: int = 3  # Parallel SMTP sessions per job
+    BULK_MAIL_BATCH_SIZE: int = 50  # Recipients sent between two checkpoints
+    BULK_MAIL_LEASE_SECONDS: int = 300  # A job whose worker stops renewing this is resumed by another one
     
     class Config:
         env_file = ".env"
@@ -1,16 +1,67 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from config.database import connect_to_mongo, close_mongo_connection
-from routes import auth, forms, members, leaderboard
+from config.settings import settings
+from routes import auth, forms, members, leaderboard, notifications, exports
+from routes.leaderboard import require_admin
+from services.auth_service import password_hasher, token_cache
+from services.user_service import principal_cache
+from services.google_auth_service import google_auth_service
+from services.token_revocation_service import revocation_store
+from services.rate_limit_service import rate_limiter
+from services.email_service import email_queue
+from services.bulk_mail_service import bulk_mailer
+from services.otp_service import otp_send_stats, cleanup_expired_otps, cleanup_old_pending_users
+from services.scheduler import maintenance_scheduler
+from services.form_registry import form_registry
+from services.form_validator import form_validators
+from services.form_service import submission_layouts
+from services.sheets_sync_service import sheets_sync
+from services.google_sheets_service import google_sheets_service
+from services.draft_buffer import draft_buffer
 import uvicorn
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await connect_to_mongo()
+    await password_hasher.configure_rounds()
+    await google_auth_service.start()
+    await revocation_store.start()
+    await email_queue.start()
+    await sheets_sync.start()
+    await draft_buffer.start()
+    await bulk_mailer.resume_jobs()
+    
+    # Housekeeping
+    maintenance_scheduler.register(
+        "cleanup_expired_otps",
+        cleanup_expired_otps,
+        settings.CLEANUP_EXPIRED_OTPS_INTERVAL_SECONDS
+    )
+    maintenance_scheduler.register(
+        "cleanup_old_pending_users",
+        cleanup_old_pending_users,
+        settings.CLEANUP_PENDING_USERS_INTERVAL_SECONDS
+    )
+    maintenance_scheduler.register(
+        "resume_mail_jobs",
+        bulk_mailer.resume_jobs,
+        settings.BULK_MAIL_LEASE_SECONDS
+    )
+    await maintenance_scheduler.start()
     yield
     # Shutdown
+    await maintenance_scheduler.stop()
+    await bulk_mailer.stop()
+    await draft_buffer.stop()
+    await sheets_sync.stop()
+    google_sheets_service.close()
+    await email_queue.stop()
+    await revocation_store.stop()
+    await google_auth_service.close()
+    password_hasher.shutdown()
     await close_mongo_connection()
 
 app = FastAPI(
@@ -34,6 +85,8 @@ app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(forms.router, prefix="/api", tags=["Forms"])
 app.include_router(members.router, prefix="/api", tags=["Members"])
 app.include_router(leaderboard.router, prefix="/api", tags=["Leaderboard"])
+app.include_router(notifications.router, prefix="/api", tags=["Notifications"])
+app.include_router(exports.router, prefix="/api", tags=["Exports"])
 
 @app.get("/")
 async def root():
@@ -43,5 +96,26 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", dependencies=[Depends(require_admin)])
+async def metrics():
+    return {
+        "password_hasher": password_hasher.get_stats(),
+        "principal_cache": principal_cache.get_stats(),
+        "token_cache": token_cache.get_stats(),
+        "google_auth": google_auth_service.get_stats(),
+        "token_revocation": revocation_store.get_stats(),
+        "rate_limits": rate_limiter.get_stats(),
+        "email_queue": email_queue.get_stats(),
+        "bulk_mail": bulk_mailer.get_stats(),
+        "otp_sends": otp_send_stats,
+        "maintenance": maintenance_scheduler.get_stats(),
+        "form_cache": form_registry.get_stats(),
+        "form_validators": form_validators.get_stats(),
+        "submission_layouts": submission_layouts.get_stats(),
+        "sheets_sync": sheets_sync.get_stats(),
+        "google_sheets": google_sheets_service.get_stats(),
+        "draft_buffer": draft_buffer.get_stats()
+    }
+
 if __name__ == "__main__":
     uvicorn.run("main:app", port = 8000)
\ No newline at end of file
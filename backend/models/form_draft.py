@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 from pydantic import BaseModel, Field
 from bson import ObjectId
 
@@ -24,12 +24,18 @@ class FormDraftCreate(BaseModel):
     form_id: str
     responses: Dict[str, str]
 
+class FormDraftPatch(BaseModel):
+    base_revision: int  # Revision the client's copy is based on, 0 for a new draft
+    set: Dict[str, str] = {}  # Changed answers
+    unset: List[str] = []  # Cleared answers
+
 class FormDraftInDB(BaseModel):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
     form_id: str
     user_id: str
     responses: Dict[str, str]
     last_saved: datetime
+    revision: int = 0
     
     class Config:
         populate_by_name = True
@@ -41,3 +47,4 @@ class FormDraftResponse(BaseModel):
     form_id: str
     responses: Dict[str, str]
     last_saved: datetime
+    revision: int = 0
@@ -72,3 +72,5 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     email: Optional[str] = None
     user_id: Optional[str] = None
+    jti: Optional[str] = None
+    exp: Optional[int] = None
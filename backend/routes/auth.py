@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Request
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel, EmailStr
 from typing import Optional
@@ -7,30 +7,38 @@ import pytz
 from models.user import UserCreate, UserResponse, Token, UserInDB
 from services.user_service import (
     get_user_by_email,
-    get_user_by_id,
+    get_principal,
     create_user,
     get_user_by_google_id,
-    create_google_user
+    create_google_user,
+    update_password
 )
 from services.auth_service import (
-    verify_password,
+    verify_and_update_password_async,
     create_access_token,
     create_refresh_token,
+    successor_jti,
     verify_token,
-    get_password_hash
+    get_password_hash_async
 )
 from services.otp_service import (
     create_pending_user,
     get_pending_user,
-    delete_pending_user,
+    claim_pending_user,
+    restore_pending_user,
     send_verification_otp,
-    verify_otp
+    verify_otp,
+    OTPCooldownError
 )
+from services.google_auth_service import google_auth_service, GoogleAuthError
+from services.token_revocation_service import revocation_store
+from services.rate_limit_service import rate_limiter
 from config.database import get_database
 from config.settings import settings
+from pymongo.errors import DuplicateKeyError
+import asyncio
 import httpx
 from datetime import timedelta, datetime
-import urllib.parse
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
@@ -58,11 +66,15 @@ class SignupRequest(BaseModel):
     full_name: Optional[str] = None
 
 class GoogleAuthRequest(BaseModel):
-    token: str
+    token: Optional[str] = None  # OAuth access token, verified with Google
+    id_token: Optional[str] = None  # Google ID token, verified locally
 
 class RefreshTokenRequest(BaseModel):
     refresh_token: str
 
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
 class ForgotPasswordInitiateRequest(BaseModel):
     email: EmailStr
 
@@ -71,6 +83,35 @@ class ForgotPasswordVerifyRequest(BaseModel):
     otp: str
     new_password: str
 
+def get_client_ip(http_request: Request) -> Optional[str]:
+    """Client IP used for rate limiting"""
+    if settings.RATE_LIMIT_TRUST_FORWARDED_FOR:
+        forwarded_for = http_request.headers.get("x-forwarded-for")
+        if forwarded_for:
+            return forwarded_for.split(',')[0].strip()
+    return http_request.client.host if http_request.client else None
+
+async def enforce_rate_limit(rule: str, email: str, http_request: Request):
+    """Reject with 429 before doing any work if the email or client IP is over its limit"""
+    retry_after = await rate_limiter.check(rule, email, get_client_ip(http_request))
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts. Please try again later.",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+async def send_otp_or_429(email: str, name: Optional[str] = None) -> bool:
+    """Send an OTP, or reject with 429 while the previous one is within its resend cooldown"""
+    try:
+        return await send_verification_otp(email, name)
+    except OTPCooldownError as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"An OTP was sent recently. Please wait {e.retry_after} seconds before requesting a new one.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
 # Dependency to get current user
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
     """Get current authenticated user"""
@@ -83,7 +124,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = await get_user_by_id(token_data.user_id)
+    user = await get_principal(token_data.user_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -95,8 +136,10 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
 
 # Routes
 @router.post("/signup/initiate", status_code=status.HTTP_200_OK)
-async def signup_initiate(request: SignupInitiateRequest):
+async def signup_initiate(request: SignupInitiateRequest, http_request: Request):
     """Initiate signup process - send OTP to email"""
+    await enforce_rate_limit("otp_send", request.email, http_request)
+    
     # Check if user already exists
     existing_user = await get_user_by_email(request.email)
     if existing_user:
@@ -124,40 +167,35 @@ async def signup_initiate(request: SignupInitiateRequest):
     await create_pending_user(request.email, request.password, request.full_name)
     
     # Send OTP
-    await send_verification_otp(request.email, request.full_name)
+    await send_otp_or_429(request.email, request.full_name)
     
     return {"message": "OTP sent to email", "email": request.email}
 
 @router.post("/signup/verify", response_model=Token, status_code=status.HTTP_201_CREATED)
-async def signup_verify(request: SignupVerifyRequest):
+async def signup_verify(request: SignupVerifyRequest, http_request: Request):
     """Verify OTP and create user account"""
-    # Verify OTP
-    is_valid = await verify_otp(request.email, request.otp)
+    await enforce_rate_limit("otp_verify", request.email, http_request)
+    
+    # Verify OTP and claim the pending user in one round trip
+    is_valid, pending_user = await asyncio.gather(
+        verify_otp(request.email, request.otp),
+        claim_pending_user(request.email)
+    )
     
     if not is_valid:
+        if pending_user:
+            await restore_pending_user(pending_user)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid or expired OTP"
         )
     
-    # Get pending user
-    pending_user = await get_pending_user(request.email)
-    
     if not pending_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Pending user not found. Please restart signup process."
         )
     
-    # Check if user was created in the meantime
-    existing_user = await get_user_by_email(request.email)
-    if existing_user:
-        await delete_pending_user(request.email)
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-    
     # Create actual user from pending user
     db = await get_database()
     
@@ -171,12 +209,21 @@ async def signup_verify(request: SignupVerifyRequest):
         "updated_at": datetime.now(tz = pytz.timezone('Asia/Kolkata'))
     }
     
-    result = await db.users.insert_one(user_dict)
-    user_dict["_id"] = result.inserted_id
-    user = UserInDB(**user_dict)
+    # The unique email index rejects users created in the meantime. The pending
+    # user is put back if the insert fails for any other reason, so signup can be retried
+    try:
+        insert_result = await db.users.insert_one(user_dict)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
+    except Exception:
+        await restore_pending_user(pending_user)
+        raise
     
-    # Delete pending user
-    await delete_pending_user(request.email)
+    user_dict["_id"] = insert_result.inserted_id
+    user = UserInDB(**user_dict)
     
     # Create tokens
     access_token = create_access_token(
@@ -193,8 +240,10 @@ async def signup_verify(request: SignupVerifyRequest):
     )
 
 @router.post("/signup/resend-otp", status_code=status.HTTP_200_OK)
-async def resend_otp(request: ResendOTPRequest):
+async def resend_otp(request: ResendOTPRequest, http_request: Request):
     """Resend OTP to email"""
+    await enforce_rate_limit("otp_send", request.email, http_request)
+    
     # Check if there's a pending user
     pending_user = await get_pending_user(request.email)
     
@@ -205,13 +254,15 @@ async def resend_otp(request: ResendOTPRequest):
         )
     
     # Send new OTP
-    await send_verification_otp(request.email, pending_user.get("full_name"))
+    await send_otp_or_429(request.email, pending_user.get("full_name"))
     
     return {"message": "OTP resent to email"}
 
 @router.post("/signup", response_model=Token, status_code=status.HTTP_201_CREATED)
-async def signup(request: SignupRequest):
+async def signup(request: SignupRequest, http_request: Request):
     """Register a new user (legacy endpoint - without email verification)"""
+    await enforce_rate_limit("signup", request.email, http_request)
+    
     # Check if user already exists
     existing_user = await get_user_by_email(request.email)
     if existing_user:
@@ -243,8 +294,10 @@ async def signup(request: SignupRequest):
     )
 
 @router.post("/login", response_model=Token)
-async def login(request: LoginRequest):
+async def login(request: LoginRequest, http_request: Request):
     """Login with email and password"""
+    await enforce_rate_limit("login", request.email, http_request)
+    
     # Get user
     user = await get_user_by_email(request.email)
     
@@ -264,12 +317,17 @@ async def login(request: LoginRequest):
         )
     
     # Verify password
-    if not verify_password(request.password, user.hashed_password):
+    is_valid, new_hash = await verify_and_update_password_async(request.password, user.hashed_password)
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
+    # Stored hash uses a different bcrypt cost than the calibrated one
+    if new_hash:
+        await update_password(user.email, new_hash)
+    
     if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -292,90 +350,79 @@ async def login(request: LoginRequest):
 
 @router.post("/google", response_model=Token)
 async def google_auth(request: GoogleAuthRequest):
-    """Authenticate with Google OAuth token"""
+    """Authenticate with Google OAuth access token or Google ID token"""
+    if not request.id_token and not request.token:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Google token is required"
+        )
+    
     try:
         # Verify Google token
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://www.googleapis.com/oauth2/v3/tokeninfo?access_token={urllib.parse.quote(request.token)}"
-            )
-
-            user_info = await client.get(
-                f"https://www.googleapis.com/oauth2/v2/userinfo?access_token={urllib.parse.quote(request.token)}"
-            )
-            
-            if response.status_code != 200 or user_info.status_code != 200:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid Google token"
-                )
-            
-            google_data = response.json()
-            user_info_data = user_info.json()
-            
-            # Verify audience (client ID)
-            if google_data.get("aud") != settings.GOOGLE_CLIENT_ID:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid token audience"
-                )
-
-            google_id = google_data.get("sub")
-            email = google_data.get("email")
-            name = user_info_data.get("name")
-            # picture = google_data.get("picture")
-            picture = user_info_data.get("picture")
-
-            if not google_id or not email:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Invalid Google token data"
-                )
-
-            # Check if user exists
-            user = await get_user_by_google_id(google_id)
-            
-            if not user:
-                # Check if email is already registered
-                user = await get_user_by_email(email)
-                
-                if user:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="Email already registered with different method"
-                    )
-                
-                # Create new user
-                user = await create_google_user(
-                    email=email,
-                    google_id=google_id,
-                    full_name=name,
-                    profile_picture=picture
-                )
-            
-            # Create tokens
-            access_token = create_access_token(
-                data={"sub": user.email, "user_id": str(user.id)}
-            )
-            refresh_token = create_refresh_token(
-                data={"sub": user.email, "user_id": str(user.id)}
-            )
-            
-            return Token(
-                access_token=access_token,
-                refresh_token=refresh_token,
-                token_type="bearer"
-            )
-            
+        if request.id_token:
+            identity = await google_auth_service.verify_id_token(request.id_token)
+        else:
+            identity = await google_auth_service.verify_access_token(request.token)
+    except GoogleAuthError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e)
+        )
     except httpx.HTTPError:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Unable to verify Google token"
         )
+    
+    google_id = identity["google_id"]
+    email = identity["email"]
+    name = identity["name"]
+    picture = identity["picture"]
+
+    if not google_id or not email:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid Google token data"
+        )
+
+    # Check if user exists
+    user = await get_user_by_google_id(google_id)
+    
+    if not user:
+        # Check if email is already registered
+        user = await get_user_by_email(email)
+        
+        if user:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email already registered with different method"
+            )
+        
+        # Create new user
+        user = await create_google_user(
+            email=email,
+            google_id=google_id,
+            full_name=name,
+            profile_picture=picture
+        )
+    
+    # Create tokens
+    access_token = create_access_token(
+        data={"sub": user.email, "user_id": str(user.id)}
+    )
+    refresh_token = create_refresh_token(
+        data={"sub": user.email, "user_id": str(user.id)}
+    )
+    
+    return Token(
+        access_token=access_token,
+        refresh_token=refresh_token,
+        token_type="bearer"
+    )
 
 @router.post("/refresh", response_model=Token)
 async def refresh_token(request: RefreshTokenRequest):
-    """Refresh access token using refresh token"""
+    """Refresh access token using refresh token (the refresh token is rotated)"""
     token_data = verify_token(request.refresh_token, "refresh")
     
     if token_data is None or token_data.user_id is None:
@@ -384,7 +431,20 @@ async def refresh_token(request: RefreshTokenRequest):
             detail="Invalid refresh token"
         )
     
-    user = await get_user_by_id(token_data.user_id)
+    # Tokens issued before jti was introduced cannot be revoked and are simply rotated
+    new_jti = None
+    if token_data.jti:
+        # Rotate: the presented token can never be used again, except by refreshes
+        # racing the one that rotated it, which get the same successor
+        rotated = not revocation_store.is_revoked(token_data.jti) and await revocation_store.revoke(token_data.jti, token_data.exp)
+        if not rotated and not revocation_store.in_grace_period(token_data.jti):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Refresh token has been revoked"
+            )
+        new_jti = successor_jti(token_data.jti)
+    
+    user = await get_principal(token_data.user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -396,7 +456,8 @@ async def refresh_token(request: RefreshTokenRequest):
         data={"sub": user.email, "user_id": str(user.id)}
     )
     new_refresh_token = create_refresh_token(
-        data={"sub": user.email, "user_id": str(user.id)}
+        data={"sub": user.email, "user_id": str(user.id)},
+        jti=new_jti
     )
     
     return Token(
@@ -419,13 +480,23 @@ async def get_current_user_info(current_user: UserInDB = Depends(get_current_use
     )
 
 @router.post("/logout")
-async def logout(current_user: UserInDB = Depends(get_current_user)):
-    """Logout user (client should delete tokens)"""
+async def logout(
+    request: Optional[LogoutRequest] = None,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """Logout user (revokes the refresh token if given, client should delete tokens)"""
+    if request and request.refresh_token:
+        token_data = verify_token(request.refresh_token, "refresh")
+        if token_data and token_data.jti and token_data.user_id == str(current_user.id):
+            await revocation_store.revoke(token_data.jti, token_data.exp)
+    
     return {"message": "Successfully logged out"}
 
 @router.post("/forgot-password/initiate", status_code=status.HTTP_200_OK)
-async def forgot_password_initiate(request: ForgotPasswordInitiateRequest):
+async def forgot_password_initiate(request: ForgotPasswordInitiateRequest, http_request: Request):
     """Initiate forgot password process - send OTP to email"""
+    await enforce_rate_limit("otp_send", request.email, http_request)
+    
     # Check if user exists
     existing_user = await get_user_by_email(request.email)
     
@@ -443,7 +514,7 @@ async def forgot_password_initiate(request: ForgotPasswordInitiateRequest):
         )
     
     # Send OTP
-    success = await send_verification_otp(request.email)
+    success = await send_otp_or_429(request.email)
     
     if not success:
         raise HTTPException(
@@ -457,8 +528,10 @@ async def forgot_password_initiate(request: ForgotPasswordInitiateRequest):
     }
 
 @router.post("/forgot-password/verify", status_code=status.HTTP_200_OK)
-async def forgot_password_verify(request: ForgotPasswordVerifyRequest):
+async def forgot_password_verify(request: ForgotPasswordVerifyRequest, http_request: Request):
     """Verify OTP and reset password"""
+    await enforce_rate_limit("otp_verify", request.email, http_request)
+    
     # Verify OTP
     is_valid = await verify_otp(request.email, request.otp)
     
@@ -468,34 +541,24 @@ async def forgot_password_verify(request: ForgotPasswordVerifyRequest):
             detail="Invalid or expired OTP"
         )
     
-    # Get user
-    user = await get_user_by_email(request.email)
-    if not user:
+    # Update password (the OTP was consumed by verify_otp)
+    hashed_password = await get_password_hash_async(request.new_password)
+    if not await update_password(request.email, hashed_password):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    # Update password
-    db = await get_database()
-    hashed_password = get_password_hash(request.new_password)
-    
-    await db.users.update_one(
-        {"email": request.email},
-        {"$set": {"hashed_password": hashed_password}}
-    )
-    
-    # Delete the OTP
-    await db.otps.delete_many({"email": request.email})
-    
     return {
         "message": "Password reset successful",
         "email": request.email
     }
 
 @router.post("/forgot-password/resend-otp", status_code=status.HTTP_200_OK)
-async def forgot_password_resend_otp(request: ResendOTPRequest):
+async def forgot_password_resend_otp(request: ResendOTPRequest, http_request: Request):
     """Resend OTP for forgot password"""
+    await enforce_rate_limit("otp_send", request.email, http_request)
+    
     # Check if user exists
     existing_user = await get_user_by_email(request.email)
     
@@ -513,7 +576,7 @@ async def forgot_password_resend_otp(request: ResendOTPRequest):
         )
     
     # Send new OTP
-    success = await send_verification_otp(request.email)
+    success = await send_otp_or_429(request.email)
     
     if not success:
         raise HTTPException(
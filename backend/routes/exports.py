@@ -0,0 +1,46 @@
+from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi.responses import StreamingResponse
+from typing import Literal
+
+from models.user import UserInDB
+from routes.leaderboard import require_admin
+from config.database import get_database
+from config.settings import settings
+from services.form_registry import form_registry
+from services.export_service import EntryExporter
+
+router = APIRouter()
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+@router.get("/forms/{form_id}/export")
+async def export_entries(
+    form_id: str,
+    format: Literal["csv", "ndjson"] = "csv",
+    current_user: UserInDB = Depends(require_admin)
+):
+    """Stream every entry of a form as CSV or NDJSON (admin only)"""
+    form_doc = await form_registry.get(form_id)
+    if not form_doc:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Form with id '{form_id}' not found"
+        )
+
+    db = await get_database()
+    cursor = db.form_entries.find(
+        {"form_id": form_id},
+        {"responses": 1, "user_name": 1, "user_email": 1, "score": 1, "submitted_at": 1}
+    ).sort("_id", 1).batch_size(settings.EXPORT_BATCH_SIZE)
+
+    exporter = EntryExporter(form_doc, settings.EXPORT_BATCH_SIZE)
+    body = exporter.csv(cursor) if format == "csv" else exporter.ndjson(cursor)
+
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{form_id}-entries.{format}"'}
+    )
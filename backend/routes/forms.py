@@ -1,15 +1,21 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, BackgroundTasks
 from pydantic import BaseModel
 from typing import List, Optional, Literal, Dict
 from datetime import datetime, timezone
 
 import pytz
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from models.form_entry import FormEntryCreate, FormEntryInDB, FormEntryResponse
-from models.form_draft import FormDraftCreate, FormDraftInDB, FormDraftResponse
+from models.form_draft import FormDraftCreate, FormDraftPatch, FormDraftInDB, FormDraftResponse
 from models.user import UserInDB
 from routes.auth import get_current_user
 from config.database import get_database
-from services.google_sheets_service import google_sheets_service
+from config.settings import settings
+from services.form_registry import form_registry, thaw
+from services.sheets_sync_service import sheets_sync, pending_sheets_sync
+from services.draft_buffer import draft_buffer, DraftConflict
+from services.form_validator import form_validators
 
 router = APIRouter()
 
@@ -30,12 +36,12 @@ class FormResponse(BaseModel):
     redirect_to: Optional[str] = None
     leaderboard: Optional[bool] = False
     postFormDetails: Optional[str] = None
+    max_team_size: Optional[int] = None  # Team forms only, including the leader
 
 @router.get("/forms/{form_id}", response_model=FormResponse)
 async def get_form(form_id: str):
     """Get form data by ID"""
-    db = await get_database()
-    form_doc = await db.forms.find_one({"id": form_id})
+    form_doc = await form_registry.get(form_id)
     if not form_doc:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -48,16 +54,16 @@ async def get_form(form_id: str):
         type=form_doc["type"],
         opening_time=form_doc["opening_time"],
         closing_time=form_doc["closing_time"],
-        questions=form_doc["questions"],
+        questions=thaw(form_doc["questions"]),
         redirect_to=form_doc.get("redirect_to"),
         postFormDetails=form_doc.get("postFormDetails"),
+        max_team_size=settings.MAX_TEAM_SIZE if form_doc["type"] == "team" else None,
     )
 
 @router.get("/forms/{form_id}/check-submission")
 async def check_submission(form_id: str, current_user: UserInDB = Depends(get_current_user)):
     """Check if current user has already submitted this form"""
-    db = await get_database()
-    form_doc = await db.forms.find_one({"id": form_id})
+    form_doc = await form_registry.get(form_id)
 
     if not form_doc:
         raise HTTPException(
@@ -66,6 +72,7 @@ async def check_submission(form_id: str, current_user: UserInDB = Depends(get_cu
         )
 
     # Check if user has already submitted this form
+    db = await get_database()
     existing_entry = await db.form_entries.find_one({
         "form_id": form_id,
         "user_id": str(current_user.id)
@@ -79,16 +86,28 @@ async def check_submission(form_id: str, current_user: UserInDB = Depends(get_cu
         } if existing_entry else None
     }
 
+async def delete_submitted_draft(form_id: str, user_id: str):
+    """Remove a user's draft once the form is submitted"""
+    draft_buffer.discard(form_id, user_id)
+    try:
+        db = await get_database()
+        await db.form_drafts.delete_one({
+            "form_id": form_id,
+            "user_id": user_id
+        })
+    except Exception as e:
+        print(f"Warning: Failed to delete draft after submission: {str(e)}")
+
 @router.post("/forms/{form_id}/submit", status_code=status.HTTP_201_CREATED)
 async def submit_form(
     form_id: str,
     submission: FormEntryCreate,
+    background_tasks: BackgroundTasks,
     current_user: UserInDB = Depends(get_current_user)
 ):
     """Submit a form response"""
     # Validate form exists
-    db = await get_database()
-    form_data = await db.forms.find_one({"id": form_id})
+    form_data = await form_registry.get(form_id)
 
     if not form_data:
         raise HTTPException(
@@ -113,29 +132,15 @@ async def submit_form(
             detail="Form is closed"
         )
     
-    db = await get_database()
-    
-    # Check for duplicate submission
-    existing_entry = await db.form_entries.find_one({
-        "form_id": form_id,
-        "user_id": str(current_user.id)
-    })
-    
-    if existing_entry:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="You have already submitted this form"
-        )
-    
-    # Validate all required questions are answered
-    required_questions = {q["question_key"] for q in form_data["questions"]}
-    provided_questions = set(submission.responses.keys())
-    
-    missing_questions = required_questions - provided_questions
-    if missing_questions:
+    # Validate all required questions are answered, radio options and lengths;
+    # answers to questions the form no longer has (e.g. from an old draft) are dropped
+    validator = form_validators.get(form_data)
+    responses = validator.known(submission.responses)
+    error = validator.check_submission(responses)
+    if error:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Missing required questions: {', '.join(missing_questions)}"
+            detail=error
         )
     
     # Create form entry
@@ -144,77 +149,27 @@ async def submit_form(
         "user_id": str(current_user.id),
         "user_email": current_user.email,
         "user_name": current_user.full_name,
-        "responses": submission.responses,
-        "submitted_at": now
+        "responses": responses,
+        "submitted_at": now,
+        # The entry doubles as the Sheets outbox record, written in the same insert
+        "sheets_sync": pending_sheets_sync(now)
     }
     
-    result = await db.form_entries.insert_one(entry_data)
-
-    # Clean and renumber team member data if form is team type
-    cleaned_responses = dict(submission.responses)
-    if form_data["type"] == "team":
-        # Find which team members have data
-        members_with_data = []
-        for i in range(2, 5):  # Check team members 2, 3, 4
-            fields = ['name', 'roll', 'phone']
-            has_data = any(
-                cleaned_responses.get(f"team_member_{i}_{field}")
-                for field in fields
-            )
-            if has_data:
-                members_with_data.append(i)
-        
-        # Renumber team members sequentially
-        if members_with_data:
-            # Create a new responses dict with renumbered team members
-            temp_responses = {}
-            
-            # Copy non-team-member responses
-            for key, value in cleaned_responses.items():
-                if not key.startswith('team_member_'):
-                    temp_responses[key] = value
-            
-            # Renumber team members
-            for index, old_num in enumerate(members_with_data):
-                new_num = index + 2  # Start from 2
-                fields = ['name', 'roll', 'phone']
-                for field in fields:
-                    old_key = f"team_member_{old_num}_{field}"
-                    new_key = f"team_member_{new_num}_{field}"
-                    if old_key in cleaned_responses:
-                        temp_responses[new_key] = cleaned_responses[old_key]
-            
-            cleaned_responses = temp_responses
-        
-        # Add questions for team members that have data
-        new_questions = lambda i: [
-            {"question_key": f"team_member_{i}_name", "question_text": f"Team member {i} name", "question_type": "short"},
-            {"question_key": f"team_member_{i}_roll", "question_text": f"Team member {i} roll number", "question_type": "short"},
-            {"question_key": f"team_member_{i}_phone", "question_text": f"Team member {i} phone", "question_type": "short"},
-        ]
-
-        for i in range(2, 5):  # team members 2 to 4
-            form_data["questions"].extend(new_questions(i))
-    
-    # Push to Google Sheets with cleaned responses
+    # Duplicate submissions are rejected by the unique (form_id, user_id) index
+    db = await get_database()
     try:
-        await google_sheets_service.append_form_submission(
-            form_name=form_data["name"],
-            user_name=current_user.full_name,
-            user_email=current_user.email,
-            questions=form_data["questions"],
-            responses=cleaned_responses,
-            timestamp=now
+        result = await db.form_entries.insert_one(entry_data)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="You have already submitted this form"
         )
-    except Exception as e:
-        # Log the error but don't fail the submission
-        print(f"Warning: Failed to push form submission to Google Sheets: {str(e)}")
+
+    # Mirrored to Google Sheets in the background
+    sheets_sync.enqueue(result.inserted_id)
     
-    # Delete draft after successful submission
-    await db.form_drafts.delete_one({
-        "form_id": form_id,
-        "user_id": str(current_user.id)
-    })
+    # Delete draft after the response is sent
+    background_tasks.add_task(delete_submitted_draft, form_id, str(current_user.id))
     
     return {
         "message": "Form submitted successfully",
@@ -226,10 +181,8 @@ async def submit_form(
 @router.get("/forms/{form_id}/draft")
 async def get_draft(form_id: str, current_user: UserInDB = Depends(get_current_user)):
     """Get saved draft for a form"""
-    db = await get_database()
-    
     # Check if form exists
-    form_doc = await db.forms.find_one({"id": form_id})
+    form_doc = await form_registry.get(form_id)
     if not form_doc:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -237,11 +190,24 @@ async def get_draft(form_id: str, current_user: UserInDB = Depends(get_current_u
         )
     
     # Get draft
+    # Autosaves not yet flushed are newer than the stored draft (taken before
+    # reading it, so a flush finishing in between is not missed)
+    pending = draft_buffer.get(form_id, str(current_user.id))
+    
+    db = await get_database()
     draft = await db.form_drafts.find_one({
         "form_id": form_id,
         "user_id": str(current_user.id)
     })
     
+    if pending:
+        draft = {
+            **(draft or {"_id": None, "form_id": form_id}),
+            "responses": pending.overlay(draft["responses"] if draft else {}),
+            "last_saved": pending.last_saved,
+            "revision": pending.revision
+        }
+    
     if not draft:
         return {
             "has_draft": False,
@@ -251,10 +217,11 @@ async def get_draft(form_id: str, current_user: UserInDB = Depends(get_current_u
     return {
         "has_draft": True,
         "draft": {
-            "id": str(draft["_id"]),
+            "id": str(draft["_id"]) if draft["_id"] else None,
             "form_id": draft["form_id"],
             "responses": draft["responses"],
-            "last_saved": draft["last_saved"].isoformat()
+            "last_saved": draft["last_saved"].isoformat(),
+            "revision": draft.get("revision", 0)
         }
     }
 
@@ -265,29 +232,47 @@ async def save_draft(
     current_user: UserInDB = Depends(get_current_user)
 ):
     """Save or update draft for a form"""
-    db = await get_database()
-    
     # Check if form exists
-    form_doc = await db.forms.find_one({"id": form_id})
+    form_doc = await form_registry.get(form_id)
     if not form_doc:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Form with id '{form_id}' not found"
         )
-    now = datetime.now(tz = pytz.timezone('Asia/Kolkata'))
     
-    # Check if user already submitted this form
-    existing_entry = await db.form_entries.find_one({
-        "form_id": form_id,
-        "user_id": str(current_user.id)
-    })
+    error = form_validators.get(form_doc).check_draft(draft.responses)
+    if error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=error
+        )
+    
+    now = datetime.now(tz = pytz.timezone('Asia/Kolkata'))
+    user_id = str(current_user.id)
     
+    # Check if user already submitted this form (possibly through another worker,
+    # so a draft buffered here is no proof it was not)
+    db = await get_database()
+    existing_entry = await db.form_entries.find_one(
+        {"form_id": form_id, "user_id": user_id},
+        {"_id": 1}
+    )
     if existing_entry:
+        draft_buffer.discard(form_id, user_id)
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="Form already submitted, cannot save draft"
         )
     
+    # Buffered and written behind once this worker knows the draft's revision
+    revision = draft_buffer.save_full(form_id, user_id, draft.responses, now)
+    if revision is not None:
+        return {
+            "message": "Draft saved successfully",
+            "last_saved": now.isoformat(),
+            "revision": revision
+        }
+    
     # Upsert draft (update if exists, insert if not)
     draft_data = {
         "form_id": form_id,
@@ -296,18 +281,138 @@ async def save_draft(
         "last_saved": now
     }
     
-    result = await db.form_drafts.update_one(
+    result = await db.form_drafts.find_one_and_update(
         {
             "form_id": form_id,
             "user_id": str(current_user.id)
         },
-        {"$set": draft_data},
-        upsert=True
+        {"$set": draft_data, "$inc": {"revision": 1}},
+        projection={"revision": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
     )
+    draft_buffer.remember(form_id, user_id, result["revision"])
+    
+    return {
+        "message": "Draft saved successfully",
+        "last_saved": now.isoformat(),
+        "revision": result["revision"]
+    }
+
+def validate_response_key(key: str):
+    """Response keys become field paths in draft updates"""
+    if not key or "." in key or key.startswith("$"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid response key '{key}'"
+        )
+
+@router.patch("/forms/{form_id}/draft")
+async def patch_draft(
+    form_id: str,
+    patch: FormDraftPatch,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Apply only the changed answers to a draft
+    The patch applies only if the draft is still at base_revision, otherwise
+    409 is returned and the client should fall back to a full save. A conflict
+    only found when the buffered patch is flushed fails the next patch.
+    """
+    form_doc = await form_registry.get(form_id)
+    if not form_doc:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Form with id '{form_id}' not found"
+        )
+    
+    for key in list(patch.set) + patch.unset:
+        validate_response_key(key)
+    if set(patch.set) & set(patch.unset):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A response cannot be both set and unset"
+        )
+    
+    error = form_validators.get(form_doc).check_draft(patch.set)
+    if error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=error
+        )
+    
+    # Nothing changed, nothing to write
+    if not patch.set and not patch.unset:
+        return {
+            "message": "Draft unchanged",
+            "revision": patch.base_revision
+        }
+    
+    now = datetime.now(tz = pytz.timezone('Asia/Kolkata'))
+    user_id = str(current_user.id)
+    
+    # Buffered and written behind once this worker knows the draft's revision
+    try:
+        revision = draft_buffer.patch(form_id, user_id, patch.base_revision, patch.set, patch.unset, now)
+    except DraftConflict:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Draft was changed elsewhere, save the full draft instead"
+        )
+    if revision is not None:
+        return {
+            "message": "Draft saved successfully",
+            "last_saved": now.isoformat(),
+            "revision": revision
+        }
+    
+    db = await get_database()
+    if patch.base_revision == 0:
+        # A new draft; once created, the draft is removed on submission,
+        # so later patches need no submission check
+        existing_entry = await db.form_entries.find_one({
+            "form_id": form_id,
+            "user_id": str(current_user.id)
+        })
+        if existing_entry:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Form already submitted, cannot save draft"
+            )
+    
+    update = {
+        "$set": {
+            **{f"responses.{key}": value for key, value in patch.set.items()},
+            "last_saved": now
+        },
+        "$inc": {"revision": 1}
+    }
+    if patch.unset:
+        update["$unset"] = {f"responses.{key}": "" for key in patch.unset}
+    
+    query = {
+        "form_id": form_id,
+        "user_id": str(current_user.id),
+        # Drafts saved before revisions existed count as revision 0
+        "revision": patch.base_revision if patch.base_revision else {"$in": [0, None]}
+    }
+    try:
+        result = await db.form_drafts.update_one(query, update, upsert=patch.base_revision == 0)
+    except DuplicateKeyError:
+        # The draft exists at a newer revision
+        result = None
+    
+    if result is None or (result.matched_count == 0 and result.upserted_id is None):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Draft was changed elsewhere, save the full draft instead"
+        )
+    draft_buffer.remember(form_id, user_id, patch.base_revision + 1)
     
     return {
         "message": "Draft saved successfully",
-        "last_saved": now.isoformat()
+        "last_saved": now.isoformat(),
+        "revision": patch.base_revision + 1
     }
 
 @router.delete("/forms/{form_id}/draft")
@@ -315,12 +420,14 @@ async def delete_draft(form_id: str, current_user: UserInDB = Depends(get_curren
     """Delete saved draft for a form"""
     db = await get_database()
     
+    had_pending = draft_buffer.has_pending(form_id, str(current_user.id))
+    draft_buffer.discard(form_id, str(current_user.id))
     result = await db.form_drafts.delete_one({
         "form_id": form_id,
         "user_id": str(current_user.id)
     })
     
-    if result.deleted_count == 0:
+    if result.deleted_count == 0 and not had_pending:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No draft found"
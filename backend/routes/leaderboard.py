@@ -8,6 +8,7 @@ from models.form_entry import FormEntryResponse
 from routes.auth import get_current_user
 from config.database import get_database
 from config.settings import settings
+from services.form_registry import form_registry, thaw
 
 router = APIRouter()
 
@@ -41,10 +42,8 @@ async def require_admin(current_user: UserInDB = Depends(get_current_user)) -> U
 @router.get("/leaderboard/{form_id}")
 async def get_leaderboard(form_id: str):
     """Get public leaderboard - only entries with scores"""
-    db = await get_database()
-    
     # Verify form exists and has leaderboard enabled
-    form_doc = await db.forms.find_one({"id": form_id})
+    form_doc = await form_registry.get(form_id)
     if not form_doc:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -58,6 +57,7 @@ async def get_leaderboard(form_id: str):
         )
     
     # Get all entries with non-null scores, sorted by score descending
+    db = await get_database()
     cursor = db.form_entries.find({
         "form_id": form_id,
         "score": {"$ne": None}
@@ -90,10 +90,8 @@ async def get_admin_leaderboard(
     current_user: UserInDB = Depends(require_admin)
 ):
     """Get admin leaderboard - all entries with editable scores"""
-    db = await get_database()
-    
     # Verify form exists
-    form_doc = await db.forms.find_one({"id": form_id})
+    form_doc = await form_registry.get(form_id)
     if not form_doc:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -107,6 +105,7 @@ async def get_admin_leaderboard(
         )
     
     # Get all entries for this form, sorted by submission time
+    db = await get_database()
     cursor = db.form_entries.find({
         "form_id": form_id
     }).sort("submitted_at", -1)
@@ -125,7 +124,7 @@ async def get_admin_leaderboard(
     return {
         "form_id": form_id,
         "form_name": form_doc["name"],
-        "questions": form_doc.get("questions", []),
+        "questions": thaw(form_doc.get("questions", ())),
         "entries": entries,
         "total_count": len(entries)
     }
@@ -138,10 +137,8 @@ async def update_entry_score(
     current_user: UserInDB = Depends(require_admin)
 ):
     """Update score for a specific entry (admin only)"""
-    db = await get_database()
-    
     # Verify form exists
-    form_doc = await db.forms.find_one({"id": form_id})
+    form_doc = await form_registry.get(form_id)
     if not form_doc:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -149,6 +146,7 @@ async def update_entry_score(
         )
     
     # Verify entry exists and belongs to the form
+    db = await get_database()
     try:
         entry_object_id = ObjectId(entry_id)
     except:
@@ -0,0 +1,75 @@
+from fastapi import APIRouter, HTTPException, status, Depends
+from pydantic import BaseModel
+from typing import Optional
+from bson import ObjectId
+
+from models.user import UserInDB
+from routes.leaderboard import require_admin
+from services.bulk_mail_service import bulk_mailer
+from services.form_registry import form_registry
+
+router = APIRouter()
+
+# Request/Response Models
+class NotifyParticipantsRequest(BaseModel):
+    # Templates may use $name, $email, $form_name and $leaderboard_url
+    subject: str
+    text: str
+    html: Optional[str] = None
+
+@router.post("/forms/{form_id}/notify", status_code=status.HTTP_202_ACCEPTED)
+async def notify_participants(
+    form_id: str,
+    request: NotifyParticipantsRequest,
+    current_user: UserInDB = Depends(require_admin)
+):
+    """Email every submitter of a form (admin only), sent in the background"""
+    form_doc = await form_registry.get(form_id)
+    if not form_doc:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Form with id '{form_id}' not found"
+        )
+    
+    job_id = await bulk_mailer.create_job(
+        form_id=form_id,
+        form_name=form_doc["name"],
+        subject=request.subject,
+        text=request.text,
+        html=request.html
+    )
+    
+    return {
+        "message": "Notification job started",
+        "job_id": job_id
+    }
+
+@router.get("/mail-jobs/{job_id}")
+async def get_mail_job(job_id: str, current_user: UserInDB = Depends(require_admin)):
+    """Get progress of a bulk mail job (admin only)"""
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid job ID"
+        )
+    
+    job = await bulk_mailer.get_job(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Mail job not found"
+        )
+    
+    return {
+        "id": str(job["_id"]),
+        "form_id": job["form_id"],
+        "status": job["status"],
+        "sent": job["sent"],
+        "failed": job["failed"],
+        "failures": job.get("failures", []),
+        "messages_per_second": job.get("messages_per_second"),
+        "created_at": job["created_at"].isoformat(),
+        "updated_at": job["updated_at"].isoformat(),
+        "finished_at": job["finished_at"].isoformat() if job.get("finished_at") else None,
+        "error": job.get("error")
+    }
@@ -1,22 +1,250 @@
 from passlib.context import CryptContext
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from typing import Optional
+from typing import Optional, Tuple
+import asyncio
+import functools
+import hashlib
+import hmac
+import statistics
+import time
+import uuid
 
 import pytz
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from config.database import get_database
 from config.settings import settings
 from models.user import UserInDB, TokenData
+from services.cache import TTLCache
 from bson import ObjectId
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+PASSLIB_DEFAULT_ROUNDS = 12  # passlib's bcrypt cost, calibration never goes below it
+
+@functools.lru_cache(maxsize=None)
+def _get_crypt_context(rounds: Optional[int]) -> CryptContext:
+    """
+    Context pinned to a bcrypt cost, hashes with any other cost need an update.
+    Cached per process, so it also works inside process pool workers.
+    """
+    if rounds is None:
+        return pwd_context
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds
+    )
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     return pwd_context.verify(plain_password, hashed_password)
 
-def get_password_hash(password: str) -> str:
+def get_password_hash(password: str, rounds: Optional[int] = None) -> str:
     """Hash a password"""
-    return pwd_context.hash(password)
+    return _get_crypt_context(rounds).hash(password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str, rounds: Optional[int] = None) -> Tuple[bool, Optional[str]]:
+    """Verify a password, also returns a new hash if the stored one uses another bcrypt cost"""
+    return _get_crypt_context(rounds).verify_and_update(plain_password, hashed_password)
+
+def _time_bcrypt_hash(rounds: int) -> float:
+    """Seconds taken by one bcrypt hash at the given cost"""
+    context = _get_crypt_context(rounds)
+    started = time.perf_counter()
+    context.hash("calibration-password")
+    return time.perf_counter() - started
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing and verification in a bounded worker pool so that
+    the event loop keeps serving other requests while a hash is computed.
+    At most `max_concurrency` jobs are handed to the pool at once, the rest
+    wait in queue (reported as `queued` in the stats).
+    """
+    def __init__(self, executor_type: str = "thread", max_workers: int = 4, max_concurrency: int = 8):
+        self.executor_type = executor_type
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
+        self._executor: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        
+        # bcrypt cost set by configure_rounds(), None keeps the passlib default
+        self.rounds: Optional[int] = None
+        self.calibrated_hash_ms: Optional[float] = None
+        self.rehashed = 0
+        
+        # Metrics
+        self.queued = 0
+        self.max_queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+    
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_type == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="password-hasher"
+                )
+        return self._executor
+    
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+    
+    async def _run(self, func, *args):
+        semaphore = self._get_semaphore()
+        queued_at = time.perf_counter()
+        
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        try:
+            await semaphore.acquire()
+        finally:
+            self.queued -= 1
+        
+        started_at = time.perf_counter()
+        self.total_wait_seconds += started_at - queued_at
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_executor(), func, *args)
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.total_run_seconds += time.perf_counter() - started_at
+            semaphore.release()
+    
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify a password against its hash in the worker pool"""
+        return await self._run(verify_password, plain_password, hashed_password)
+    
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password in the worker pool, returns a new hash if the cost has changed"""
+        valid, new_hash = await self._run(verify_and_update_password, plain_password, hashed_password, self.rounds)
+        if new_hash:
+            self.rehashed += 1
+        return valid, new_hash
+    
+    async def hash(self, password: str) -> str:
+        """Hash a password in the worker pool"""
+        return await self._run(get_password_hash, password, self.rounds)
+    
+    async def calibrate(self, target_ms: float, min_rounds: int, max_rounds: int, samples: int = 5) -> Tuple[int, float]:
+        """
+        Highest bcrypt cost whose hash time stays within target_ms on this hardware.
+        Each extra round doubles the work, so measuring at min_rounds is enough;
+        the median of several samples keeps one slow run from skewing the result.
+        Never below the passlib default.
+
+        Returns:
+            (rounds, estimated ms per hash)
+        """
+        min_rounds = max(min_rounds, PASSLIB_DEFAULT_ROUNDS)
+        measured = statistics.median([
+            await self._run(_time_bcrypt_hash, min_rounds) for _ in range(max(samples, 1))
+        ])
+        rounds = min_rounds
+        while rounds < max_rounds and measured * 2 ** (rounds + 1 - min_rounds) * 1000 <= target_ms:
+            rounds += 1
+        return rounds, round(measured * 2 ** (rounds - min_rounds) * 1000, 2)
+    
+    async def configure_rounds(self) -> Optional[int]:
+        """
+        Settle the bcrypt cost every worker uses
+        BCRYPT_ROUNDS pins it. Otherwise the first worker to start calibrates and
+        stores the result in Mongo, and every worker adopts the stored value, so
+        workers that would measure differently do not rehash each other's hashes
+        on every login. Delete the server_config bcrypt_rounds document to recalibrate.
+        """
+        if settings.BCRYPT_ROUNDS > 0:
+            self.rounds = settings.BCRYPT_ROUNDS
+            print(f"bcrypt cost pinned to {self.rounds} rounds")
+            return self.rounds
+        if settings.BCRYPT_TARGET_HASH_MS <= 0:
+            return None
+        
+        db = await get_database()
+        stored = await db.server_config.find_one({"_id": "bcrypt_rounds"})
+        if stored is None:
+            rounds, hash_ms = await self.calibrate(
+                settings.BCRYPT_TARGET_HASH_MS,
+                settings.BCRYPT_MIN_ROUNDS,
+                settings.BCRYPT_MAX_ROUNDS,
+                settings.BCRYPT_CALIBRATION_SAMPLES
+            )
+            try:
+                # Only the first worker's result is kept
+                stored = await db.server_config.find_one_and_update(
+                    {"_id": "bcrypt_rounds"},
+                    {"$setOnInsert": {"rounds": rounds, "hash_ms": hash_ms, "calibrated_at": datetime.utcnow()}},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                stored = await db.server_config.find_one({"_id": "bcrypt_rounds"})
+        
+        self.rounds = stored["rounds"]
+        self.calibrated_hash_ms = stored.get("hash_ms")
+        print(f"bcrypt cost set to {self.rounds} rounds (~{self.calibrated_hash_ms} ms per hash when calibrated)")
+        return self.rounds
+    
+    def get_stats(self) -> dict:
+        finished = self.completed + self.failed
+        return {
+            "executor": self.executor_type,
+            "workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "bcrypt_rounds": self.rounds,
+            "calibrated_hash_ms": self.calibrated_hash_ms,
+            "rehashed": self.rehashed,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait_ms": round(self.total_wait_seconds / finished * 1000, 2) if finished else 0.0,
+            "avg_run_ms": round(self.total_run_seconds / finished * 1000, 2) if finished else 0.0,
+        }
+    
+    def shutdown(self):
+        """Stop the worker pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+password_hasher = PasswordHasher(
+    executor_type=settings.PASSWORD_HASH_EXECUTOR,
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_concurrency=settings.PASSWORD_HASH_MAX_CONCURRENCY
+)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash without blocking the event loop"""
+    return await password_hasher.verify(plain_password, hashed_password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password without blocking the event loop, returns a new hash if it needs a rehash"""
+    return await password_hasher.verify_and_update(plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password without blocking the event loop"""
+    return await password_hasher.hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
@@ -30,25 +258,59 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def create_refresh_token(data: dict) -> str:
-    """Create JWT refresh token"""
+def create_refresh_token(data: dict, jti: Optional[str] = None) -> str:
+    """Create JWT refresh token with a unique token ID (jti) so it can be revoked"""
     to_encode = data.copy()
     expire = datetime.now(tz = pytz.timezone('Asia/Kolkata')) + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire, "type": "refresh"})
+    to_encode.update({"exp": expire, "type": "refresh", "jti": jti or uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+def successor_jti(jti: str) -> str:
+    """
+    Token ID of the refresh token that replaces jti on rotation
+    Derived rather than random, so every refresh that races on the same token
+    gets a token with the same ID and revoking one revokes them all
+    """
+    return hmac.new(settings.SECRET_KEY.encode(), jti.encode(), hashlib.sha256).hexdigest()[:32]
+
+# Decoded tokens by SHA-256 digest of the raw token, each entry expires at the token's exp
+token_cache = TTLCache(
+    max_size=settings.TOKEN_CACHE_MAX_SIZE,
+    ttl_seconds=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+)
+
 def verify_token(token: str, token_type: str = "access") -> Optional[TokenData]:
     """Verify and decode JWT token"""
+    digest = hashlib.sha256(token.encode()).digest()
+    cached = token_cache.get(digest)
+    if cached is not None:
+        token_type_in_payload, token_data = cached
+        return token_data if token_type_in_payload == token_type else None
+    
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         email: str = payload.get("sub")
         user_id: str = payload.get("user_id")
         token_type_in_payload: str = payload.get("type")
         
-        if email is None or token_type_in_payload != token_type:
+        if email is None:
+            return None
+        
+        token_data = TokenData(
+            email=email,
+            user_id=user_id,
+            jti=payload.get("jti"),
+            exp=payload.get("exp")
+        )
+        
+        # Only valid tokens are cached, and never past their expiry
+        expires_in = payload.get("exp", 0) - time.time()
+        token_cache.set(digest, (token_type_in_payload, token_data), ttl=expires_in)
+        
+        if token_type_in_payload != token_type:
             return None
             
-        return TokenData(email=email, user_id=user_id)
+        return token_data
     except JWTError:
         return None
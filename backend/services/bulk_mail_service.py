@@ -0,0 +1,231 @@
+"""
+Bulk notification mailer for form participants
+Streams recipients from form_entries, sends over a small pool of persistent
+SMTP sessions and checkpoints progress in the mail_jobs collection so an
+interrupted job resumes where it stopped
+"""
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from string import Template
+from typing import Optional, List
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from config.database import get_database
+from config.settings import settings
+from services.email_service import SMTPSession, build_mime_message, smtp_configured
+
+class BulkMailer:
+    def __init__(self):
+        # Identifies this worker process when claiming jobs
+        self.owner = uuid.uuid4().hex
+        self._tasks = {}
+
+    async def create_job(self, form_id: str, form_name: str, subject: str, text: str, html: Optional[str] = None) -> str:
+        """Persist a new job and start sending in the background"""
+        db = await get_database()
+        now = datetime.now(tz=timezone.utc)
+        result = await db.mail_jobs.insert_one({
+            "form_id": form_id,
+            "form_name": form_name,
+            "subject": subject,
+            "text": text,
+            "html": html,
+            "status": "running",
+            "last_entry_id": None,
+            "sent": 0,
+            "failed": 0,
+            "failures": [],
+            "created_at": now,
+            "updated_at": now,
+            "owner": None,
+            "lease_until": now
+        })
+        job_id = result.inserted_id
+        self._start(job_id)
+        return str(job_id)
+
+    async def get_job(self, job_id: str) -> Optional[dict]:
+        db = await get_database()
+        return await db.mail_jobs.find_one({"_id": ObjectId(job_id)})
+
+    async def resume_jobs(self):
+        """Pick up running jobs whose worker went away (called at startup)"""
+        db = await get_database()
+        cursor = db.mail_jobs.find(
+            {"status": "running", "lease_until": {"$lt": datetime.now(tz=timezone.utc)}},
+            {"_id": 1}
+        )
+        async for job in cursor:
+            self._start(job["_id"])
+
+    async def stop(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+        for task in list(self._tasks.values()):
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = {}
+
+        # Release the leases, so the jobs resume right away after a restart
+        # (on this worker or another) instead of once the lease expires
+        try:
+            db = await get_database()
+            await db.mail_jobs.update_many(
+                {"owner": self.owner, "status": "running"},
+                {"$set": {"owner": None, "lease_until": datetime.now(tz=timezone.utc)}}
+            )
+        except Exception as e:
+            print(f"Warning: Failed to release bulk mail jobs: {str(e)}")
+
+    def _start(self, job_id: ObjectId):
+        if job_id not in self._tasks:
+            task = asyncio.create_task(self._run(job_id))
+            self._tasks[job_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    def _lease(self) -> datetime:
+        return datetime.now(tz=timezone.utc) + timedelta(seconds=settings.BULK_MAIL_LEASE_SECONDS)
+
+    async def _claim(self, job_id: ObjectId) -> Optional[dict]:
+        """Take the job unless another worker holds a live lease on it"""
+        db = await get_database()
+        return await db.mail_jobs.find_one_and_update(
+            {
+                "_id": job_id,
+                "status": "running",
+                "$or": [
+                    {"owner": self.owner},
+                    {"lease_until": {"$lt": datetime.now(tz=timezone.utc)}}
+                ]
+            },
+            {"$set": {"owner": self.owner, "lease_until": self._lease()}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _run(self, job_id: ObjectId):
+        try:
+            job = await self._claim(job_id)
+            if job:
+                await self._send_job(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Bulk mail job {job_id} failed: {str(e)}")
+            db = await get_database()
+            await db.mail_jobs.update_one(
+                {"_id": job_id, "owner": self.owner},
+                {"$set": {"status": "failed", "error": str(e), "updated_at": datetime.now(tz=timezone.utc)}}
+            )
+
+    async def _send_job(self, job: dict):
+        db = await get_database()
+
+        # Templates are parsed once per job, each recipient only costs a substitution
+        subject = Template(job["subject"])
+        text = Template(job["text"])
+        html = Template(job["html"]) if job.get("html") else None
+        common = {
+            "form_name": job["form_name"],
+            "leaderboard_url": f"{settings.FRONTEND_URL}/leaderboard/{job['form_id']}"
+        }
+
+        sessions: asyncio.Queue = asyncio.Queue()
+        for _ in range(settings.BULK_MAIL_SESSIONS):
+            sessions.put_nowait(SMTPSession())
+
+        async def send(entry: dict) -> Optional[str]:
+            values = {**common, "name": entry.get("user_name") or "", "email": entry["user_email"]}
+            message = build_mime_message(
+                entry["user_email"],
+                subject.safe_substitute(values),
+                text.safe_substitute(values),
+                html.safe_substitute(values) if html else None
+            )
+            if not smtp_configured():
+                print(f"📧 Bulk email (Console Mode) to {entry['user_email']}: {message['Subject']}")
+                return None
+
+            session = await sessions.get()
+            try:
+                await session.send(message)
+                return None
+            except Exception as e:
+                return str(e)
+            finally:
+                sessions.put_nowait(session)
+
+        query = {"form_id": job["form_id"]}
+        if job.get("last_entry_id"):
+            query["_id"] = {"$gt": job["last_entry_id"]}
+
+        cursor = db.form_entries.find(
+            query,
+            {"user_email": 1, "user_name": 1}
+        ).sort("_id", 1).batch_size(settings.BULK_MAIL_BATCH_SIZE)
+
+        started = time.perf_counter()
+        sent_this_run = 0
+        batch: List[dict] = []
+
+        async def flush():
+            nonlocal sent_this_run
+            results = await asyncio.gather(*(send(entry) for entry in batch))
+            failures = [
+                {"email": entry["user_email"], "error": error}
+                for entry, error in zip(batch, results) if error
+            ]
+            sent = len(batch) - len(failures)
+            sent_this_run += sent
+
+            # Checkpoint after the whole batch is done, so a restart resumes after it
+            update = {
+                "$set": {
+                    "last_entry_id": batch[-1]["_id"],
+                    "lease_until": self._lease(),
+                    "updated_at": datetime.now(tz=timezone.utc),
+                    "messages_per_second": round(sent_this_run / max(time.perf_counter() - started, 1e-6), 2)
+                },
+                "$inc": {"sent": sent, "failed": len(failures)}
+            }
+            if failures:
+                # Keep only the most recent failures on the job document
+                update["$push"] = {"failures": {"$each": failures, "$slice": -100}}
+
+            result = await db.mail_jobs.update_one({"_id": job["_id"], "owner": self.owner}, update)
+            if result.matched_count == 0:
+                raise Exception("Lost ownership of the job")
+            batch.clear()
+
+        try:
+            async for entry in cursor:
+                batch.append(entry)
+                if len(batch) >= settings.BULK_MAIL_BATCH_SIZE:
+                    await flush()
+            if batch:
+                await flush()
+        finally:
+            while not sessions.empty():
+                await sessions.get_nowait().close()
+
+        await db.mail_jobs.update_one(
+            {"_id": job["_id"], "owner": self.owner},
+            {"$set": {
+                "status": "completed",
+                "finished_at": datetime.now(tz=timezone.utc),
+                "updated_at": datetime.now(tz=timezone.utc)
+            }}
+        )
+        print(f"✓ Bulk mail job {job['_id']} completed")
+
+    def get_stats(self) -> dict:
+        return {
+            "active_jobs": len(self._tasks),
+        }
+
+# Create a singleton instance
+bulk_mailer = BulkMailer()
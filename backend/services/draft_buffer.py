@@ -0,0 +1,385 @@
+"""
+Write-behind buffer for form drafts
+Autosaves are staged in memory, only the latest state per (form_id, user_id)
+is kept, and the buffer is flushed to form_drafts with one unordered
+bulk_write every DRAFT_FLUSH_INTERVAL_SECONDS and at shutdown.
+A crash loses at most the last interval of autosaves; the client still holds
+the full draft and saves it again.
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError
+from config.database import get_database
+from config.settings import settings
+from services.cache import TTLCache
+
+DraftKey = Tuple[str, str]  # (form_id, user_id)
+
+class DraftConflict(Exception):
+    """The client's draft is not based on the latest revision"""
+
+class PendingDraft:
+    """
+    Unflushed changes to one draft
+    Either the full responses (a full save) or a delta of set/unset answers,
+    both applied on top of the stored draft at expected_revision
+    """
+    def __init__(self, revision: int, last_saved: datetime, expected_revision: int,
+                 responses: Optional[Dict[str, str]] = None):
+        self.revision = revision
+        self.last_saved = last_saved
+        self.expected_revision = expected_revision  # Stored revision the changes apply to
+        self.responses = responses  # Set for a full save
+        self.set: Dict[str, str] = {}
+        self.unset: Set[str] = set()
+        self.writes = 1  # Saves folded into this entry
+
+    @property
+    def full(self) -> bool:
+        return self.responses is not None
+
+    def apply(self, set_values: Dict[str, str], unset: List[str]):
+        if self.full:
+            self.responses.update(set_values)
+            for key in unset:
+                self.responses.pop(key, None)
+        else:
+            for key in unset:
+                self.set.pop(key, None)
+                self.unset.add(key)
+            for key, value in set_values.items():
+                self.unset.discard(key)
+                self.set[key] = value
+
+    def copy(self) -> "PendingDraft":
+        entry = PendingDraft(
+            self.revision, self.last_saved, self.expected_revision,
+            responses=dict(self.responses) if self.full else None
+        )
+        entry.set = dict(self.set)
+        entry.unset = set(self.unset)
+        entry.writes = self.writes
+        return entry
+
+    def merge(self, newer: "PendingDraft") -> "PendingDraft":
+        """This entry followed by a newer one, as a single entry"""
+        if newer.full:
+            # Nothing was written in between, so it still applies to the same stored revision
+            newer.expected_revision = self.expected_revision
+            newer.writes += self.writes
+            return newer
+        self.apply(newer.set, list(newer.unset))
+        self.revision = newer.revision
+        self.last_saved = newer.last_saved
+        self.writes += newer.writes
+        return self
+
+    def overlay(self, responses: Dict[str, str]) -> Dict[str, str]:
+        """Responses as they will be once this entry is flushed"""
+        if self.full:
+            return dict(self.responses)
+        merged = {key: value for key, value in responses.items() if key not in self.unset}
+        merged.update(self.set)
+        return merged
+
+    def to_operation(self, form_id: str, user_id: str) -> UpdateOne:
+        """
+        Conditional on the stored revision, so revisions only move forward and a
+        draft deleted meanwhile (e.g. on submission) is not written back
+        """
+        query = {
+            "form_id": form_id,
+            "user_id": user_id,
+            # Drafts saved before revisions existed count as revision 0
+            "revision": self.expected_revision if self.expected_revision else {"$in": [0, None]}
+        }
+        if self.full:
+            update = {"$set": {"responses": self.responses, "last_saved": self.last_saved, "revision": self.revision}}
+        else:
+            update = {"$set": {
+                **{f"responses.{key}": value for key, value in self.set.items()},
+                "last_saved": self.last_saved,
+                "revision": self.revision
+            }}
+            if self.unset:
+                update["$unset"] = {f"responses.{key}": "" for key in self.unset}
+        return UpdateOne(query, update, upsert=self.expected_revision == 0)
+
+class DraftBuffer:
+    def __init__(self):
+        self._pending: Dict[DraftKey, PendingDraft] = {}
+        # Batch being written, its revisions are the latest until the write finishes
+        self._flushing: Dict[DraftKey, PendingDraft] = {}
+        # Revisions this worker last wrote, so saves can be checked without a read
+        self._revisions = TTLCache(
+            max_size=settings.DRAFT_BUFFER_MAX_SIZE * 4,
+            ttl_seconds=settings.DRAFT_REVISION_CACHE_SECONDS
+        )
+        # Drafts whose buffered delta no longer applied when flushed; the next patch gets a 409
+        self._conflicts: Set[DraftKey] = set()
+        self._flush_lock = asyncio.Lock()
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.writes_received = 0
+        self.writes_flushed = 0
+        self.writes_discarded = 0
+        self.flushes = 0
+        self.flush_failures = 0
+        self.conflicts = 0
+        self.fallback_writes = 0
+        self.last_flush_ms: Optional[float] = None
+        self.last_flush_size = 0
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), settings.DRAFT_FLUSH_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Warning: Draft buffer flush failed: {str(e)}")
+
+    def _local_revision(self, key: DraftKey) -> Optional[int]:
+        """Revision of changes buffered here (pending or being flushed), newer than the database"""
+        for entries in (self._pending, self._flushing):
+            entry = entries.get(key)
+            if entry is not None:
+                return entry.revision
+        return None
+
+    def _known_revision(self, key: DraftKey) -> Optional[int]:
+        revision = self._local_revision(key)
+        if revision is not None:
+            return revision
+        return self._revisions.get(key)
+
+    def _stage(self, key: DraftKey, entry: PendingDraft):
+        self.writes_received += 1
+        previous = self._pending.get(key)
+        self._pending[key] = previous.merge(entry) if previous else entry
+        if len(self._pending) >= settings.DRAFT_BUFFER_MAX_SIZE:
+            self._full.set()
+
+    def has_pending(self, form_id: str, user_id: str) -> bool:
+        return (form_id, user_id) in self._pending
+
+    def save_full(self, form_id: str, user_id: str, responses: Dict[str, str], now: datetime) -> Optional[int]:
+        """
+        Stage a full save
+        Returns the new revision, or None if this worker does not know the
+        draft's revision (the caller then writes through and calls remember)
+        """
+        key = (form_id, user_id)
+        revision = self._known_revision(key)
+        if revision is None:
+            return None
+        self._conflicts.discard(key)
+        self._stage(key, PendingDraft(revision + 1, now, expected_revision=revision, responses=dict(responses)))
+        return revision + 1
+
+    def patch(self, form_id: str, user_id: str, base_revision: int,
+              set_values: Dict[str, str], unset: List[str], now: datetime) -> Optional[int]:
+        """
+        Stage changed answers on top of base_revision
+        Returns the new revision, or None if this worker does not know the
+        draft's revision (the caller then writes through and calls remember)
+        """
+        key = (form_id, user_id)
+        if key in self._conflicts:
+            self._conflicts.discard(key)
+            raise DraftConflict()
+
+        revision = self._local_revision(key)
+        if revision is None:
+            # Only the cached revision is known, which another worker may have moved on from,
+            # so a mismatch is settled by the conditional write-through instead
+            revision = self._revisions.get(key)
+            if revision is None or revision != base_revision:
+                return None
+        elif revision != base_revision:
+            raise DraftConflict()
+
+        # Still applied conditionally when flushed, another worker may have written the draft since
+        entry = PendingDraft(base_revision + 1, now, expected_revision=base_revision)
+        entry.apply(set_values, unset)
+        self._stage(key, entry)
+        return base_revision + 1
+
+    def remember(self, form_id: str, user_id: str, revision: int):
+        """Record the revision of a draft written directly to the database"""
+        self._revisions.set((form_id, user_id), revision)
+
+    def get(self, form_id: str, user_id: str) -> Optional[PendingDraft]:
+        """
+        Changes not yet in the database, including those of a batch being written
+        Read it before the stored draft: overlaying a batch that has landed meanwhile is harmless
+        """
+        key = (form_id, user_id)
+        pending = self._pending.get(key)
+        flushing = self._flushing.get(key)
+        if flushing is None:
+            return pending
+        if pending is None:
+            return flushing
+        return flushing.copy().merge(pending.copy())
+
+    def discard(self, form_id: str, user_id: str):
+        """Drop buffered changes, e.g. when the draft is deleted or the form submitted"""
+        key = (form_id, user_id)
+        pending = self._pending.pop(key, None)
+        if pending is not None:
+            self.writes_discarded += pending.writes
+        # A batch being written is not remembered once the write finishes
+        self._flushing.pop(key, None)
+        self._revisions.invalidate(key)
+        self._conflicts.discard(key)
+
+    async def flush(self):
+        """Write every buffered draft with one unordered bulk_write"""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            self._flushing = dict(batch)
+            try:
+                await self._write_batch(batch)
+            finally:
+                self._flushing = {}
+
+    async def _write_batch(self, batch: Dict[DraftKey, PendingDraft]):
+        keys = list(batch)
+        started = time.perf_counter()
+
+        db = await get_database()
+        unapplied: Set[DraftKey] = set()
+        try:
+            result = await db.form_drafts.bulk_write(
+                [batch[key].to_operation(*key) for key in keys],
+                ordered=False
+            )
+            matched = result.matched_count + result.upserted_count
+        except BulkWriteError as e:
+            # Duplicate keys: a first save met a draft that already exists
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                self._requeue(batch)
+                self.flush_failures += 1
+                raise
+            unapplied.update(keys[error["index"]] for error in e.details["writeErrors"])
+            matched = e.details.get("nMatched", 0) + e.details.get("nUpserted", 0)
+        except Exception:
+            self._requeue(batch)
+            self.flush_failures += 1
+            raise
+
+        if matched + len(unapplied) < len(keys):
+            # Some drafts were not at their expected revision, find out which
+            unapplied.update(await self._unapplied(db, batch, unapplied))
+
+        conflicted = 0
+        for key in keys:
+            # Discarded (deleted or submitted) while the batch was being written
+            if key not in self._flushing:
+                continue
+            entry = batch[key]
+            if key not in unapplied:
+                self._revisions.set(key, entry.revision)
+            elif entry.full:
+                # A full save holds the whole draft, write it on top of whatever is stored now
+                await self._write_full(db, key, entry)
+            else:
+                # The delta no longer applies, the client has to send the full draft
+                self._conflicts.add(key)
+                self._revisions.invalidate(key)
+                conflicted += 1
+        self.conflicts += conflicted
+
+        self.flushes += 1
+        self.writes_flushed += len(keys)
+        self.last_flush_size = len(keys)
+        self.last_flush_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    async def _write_full(self, db, key: DraftKey, entry: PendingDraft):
+        """
+        Write a full save whose expected revision was stale, bumping the stored revision
+        Only over an older draft: a newer save (e.g. written through by another worker)
+        wins, and this one is dropped; the client's next patch then gets a 409 and it
+        saves in full. Not upserted: a draft that is gone was deleted or submitted.
+        """
+        form_id, user_id = key
+        result = await db.form_drafts.find_one_and_update(
+            {"form_id": form_id, "user_id": user_id, "last_saved": {"$lt": entry.last_saved}},
+            {"$set": {"responses": entry.responses, "last_saved": entry.last_saved}, "$inc": {"revision": 1}},
+            projection={"revision": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        self.fallback_writes += 1
+        if result is None:
+            self._revisions.invalidate(key)
+        else:
+            # The client's revision no longer matches, its next patch gets a 409 and it saves in full
+            self._revisions.set(key, result["revision"])
+
+    async def _unapplied(self, db, batch: Dict[DraftKey, PendingDraft], known: Set[DraftKey]) -> Set[DraftKey]:
+        candidates = [key for key in batch if key not in known]
+        if not candidates:
+            return set()
+        cursor = db.form_drafts.find(
+            {"$or": [
+                {"form_id": form_id, "user_id": user_id, "revision": batch[(form_id, user_id)].revision}
+                for form_id, user_id in candidates
+            ]},
+            {"form_id": 1, "user_id": 1}
+        )
+        applied = {(doc["form_id"], doc["user_id"]) async for doc in cursor}
+        return {key for key in candidates if key not in applied}
+
+    def _requeue(self, batch: Dict[DraftKey, PendingDraft]):
+        """Put a batch that could not be written back in front of newer saves"""
+        for key, entry in batch.items():
+            if key not in self._flushing:
+                continue  # Discarded meanwhile
+            newer = self._pending.get(key)
+            self._pending[key] = entry.merge(newer) if newer else entry
+
+    def get_stats(self) -> dict:
+        return {
+            "buffered": len(self._pending),
+            "writes_received": self.writes_received,
+            "writes_flushed": self.writes_flushed,
+            "writes_discarded": self.writes_discarded,
+            "writes_coalesced": self.writes_received - self.writes_flushed - self.writes_discarded - sum(
+                entry.writes for entry in self._pending.values()
+            ),
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "conflicts": self.conflicts,
+            "fallback_writes": self.fallback_writes,
+            "last_flush_size": self.last_flush_size,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+# Create a singleton instance
+draft_buffer = DraftBuffer()
@@ -1,39 +1,29 @@
+import asyncio
 import random
 import smtplib
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from config.database import get_database
 from config.settings import settings
-from typing import Optional
+from services.otp_store import hash_otp
+from pymongo import ReturnDocument
+from typing import Optional, Dict, Any, Set
 
 def generate_otp() -> str:
     """Generate a 6-digit OTP"""
     return ''.join([str(random.randint(0, 9)) for _ in range(6)])
 
-async def send_otp_email(email: str, otp: str, name: Optional[str] = None) -> bool:
-    """
-    Send OTP via email
-    Automatically uses SMTP if configured, otherwise prints to console
-    """
-    try:
-        # Check if SMTP is configured
-        smtp_configured = all([
-            settings.SMTP_HOST, 
-            settings.SMTP_PORT, 
-            settings.SMTP_USER, 
-            settings.SMTP_PASSWORD
-        ])
-        
-        if smtp_configured:
-            # Send via SMTP
-            print(f"Sending OTP email to {email}...")
-            
-            message = MIMEMultipart("alternative")
-            message["Subject"] = "Your Aeromodelling club Verification Code"
-            message["From"] = settings.SMTP_FROM_EMAIL or settings.SMTP_USER
-            message["To"] = email
-            
-            # Create HTML email
-            html = f'''
+def smtp_configured() -> bool:
+    """Check if SMTP is configured (user and password are optional for a local stand-in)"""
+    return bool(settings.SMTP_HOST and settings.SMTP_PORT)
+
+def build_otp_message(otp: str, name: Optional[str] = None) -> Dict[str, str]:
+    """Render the OTP email, returns subject, text and html parts"""
+    # Create HTML email
+    html = f'''
             <html>
               <body style="font-family: Arial, sans-serif; background-color: #f4f4f4; padding: 20px;">
                 <div style="max-width: 600px; margin: 0 auto; background-color: white; padding: 30px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
@@ -52,8 +42,8 @@ async def send_otp_email(email: str, otp: str, name: Optional[str] = None) -> bo
               </body>
             </html>
             '''
-            
-            text = f'''
+
+    text = f'''
 Aeromodelling club - Email Verification
 
 Hello{' ' + name if name else ''},
@@ -69,40 +59,348 @@ If you didn't request this code, please ignore this email.
 ---
 Aeromodelling club
             '''
-            
-            part1 = MIMEText(text, "plain")
-            part2 = MIMEText(html, "html")
-            
-            message.attach(part1)
-            message.attach(part2)
-            
-            # Send email
-            with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
-                server.starttls()
-                server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-                server.send_message(message)
-            
-            print(f"✓ OTP email sent successfully to {email}")
-            return True
-        else:
+
+    return {
+        "subject": "Your Aeromodelling club Verification Code",
+        "text": text,
+        "html": html
+    }
+
+def build_mime_message(to: str, subject: str, text: str, html: Optional[str] = None) -> MIMEMultipart:
+    message = MIMEMultipart("alternative")
+    message["Subject"] = subject
+    message["From"] = settings.SMTP_FROM_EMAIL or settings.SMTP_USER
+    message["To"] = to
+
+    message.attach(MIMEText(text, "plain"))
+    if html:
+        message.attach(MIMEText(html, "html"))
+    return message
+
+class SMTPSession:
+    """
+    A reusable, authenticated SMTP connection.
+    smtplib is blocking, so every network call runs in a worker thread.
+    """
+    def __init__(self):
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self.connects = 0
+        self.sent = 0
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT_SECONDS)
+        if settings.SMTP_USE_TLS:
+            server.starttls()
+        if settings.SMTP_USER and settings.SMTP_PASSWORD:
+            server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+        self.connects += 1
+        return server
+
+    def _is_alive(self) -> bool:
+        try:
+            return self._server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def _send_blocking(self, message: MIMEMultipart):
+        if self._server is not None and time.monotonic() - self._last_used > settings.SMTP_IDLE_SECONDS:
+            if not self._is_alive():
+                self._close_blocking()
+
+        if self._server is None:
+            self._server = self._connect()
+
+        try:
+            self._server.send_message(message)
+        except (smtplib.SMTPServerDisconnected, OSError):
+            # The server dropped the session, reconnect once and retry
+            self._close_blocking()
+            self._server = self._connect()
+            self._server.send_message(message)
+
+        self._last_used = time.monotonic()
+        self.sent += 1
+
+    def _close_blocking(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+    async def send(self, message: MIMEMultipart):
+        await asyncio.to_thread(self._send_blocking, message)
+
+    async def close(self):
+        await asyncio.to_thread(self._close_blocking)
+
+class EmailDeliveryQueue:
+    """
+    Background email delivery.
+    Messages are persisted to the email_outbox collection and queued in memory;
+    one worker sends them over a persistent SMTP session with retry and backoff.
+    Messages that did not fit the queue or were left by a restart are picked up
+    again by a periodic sweep of the outbox.
+
+    OTP emails are stored without a body: the outbox only holds the recipient
+    and the keyed hash of the code, the code itself stays in the memory of the
+    worker that queued it and the email is rendered when it is sent. Only that
+    worker delivers it, and if it restarts first the email is dropped (the
+    user requests a new code).
+    """
+    def __init__(self):
+        self.queue: Optional[asyncio.Queue] = None
+        self.session = SMTPSession()
+        self.instance_id = uuid.uuid4().hex
+        self._queued_ids: Set[Any] = set()
+        self._otps: Dict[Any, str] = {}
+        self._tasks = []
+
+        # Metrics
+        self.enqueued = 0
+        self.delivered = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=settings.EMAIL_QUEUE_MAX_SIZE)
+        await self._sweep()
+        self._tasks = [
+            asyncio.create_task(self._worker()),
+            asyncio.create_task(self._sweep_loop())
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        await self.session.close()
+
+    def _put(self, message_id) -> bool:
+        if self.queue is None or message_id in self._queued_ids:
+            return False
+        try:
+            self.queue.put_nowait(message_id)
+        except asyncio.QueueFull:
+            # Stays pending in the outbox, the next sweep will queue it
+            return False
+        self._queued_ids.add(message_id)
+        return True
+
+    async def enqueue(self, to: str, subject: str, text: str, html: Optional[str] = None):
+        """Persist a message to the outbox and queue it for delivery"""
+        db = await get_database()
+        now = datetime.now(tz=timezone.utc)
+        result = await db.email_outbox.insert_one({
+            "to": to,
+            "subject": subject,
+            "text": text,
+            "html": html,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now
+        })
+        self.enqueued += 1
+        self._put(result.inserted_id)
+        return result.inserted_id
+
+    async def enqueue_otp(self, to: str, otp: str, name: Optional[str] = None):
+        """Queue an OTP email, the code is kept in memory only"""
+        db = await get_database()
+        now = datetime.now(tz=timezone.utc)
+        message_id = (await db.email_outbox.insert_one({
+            "to": to,
+            "template": "otp",
+            "name": name,
+            "otp_hash": hash_otp(to, otp),
+            "owner": self.instance_id,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now
+        })).inserted_id
+        self._otps[message_id] = otp
+        self.enqueued += 1
+        self._put(message_id)
+        return message_id
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(settings.EMAIL_OUTBOX_SWEEP_SECONDS)
+            try:
+                await self._sweep()
+            except Exception as e:
+                print(f"Warning: Email outbox sweep failed: {str(e)}")
+
+    async def _sweep(self):
+        """Queue due outbox messages, including ones whose sending worker died"""
+        db = await get_database()
+        now = datetime.now(tz=timezone.utc)
+        cursor = db.email_outbox.find(
+            {
+                "$or": [
+                    {"status": "pending", "next_attempt_at": {"$lte": now}},
+                    {"status": "sending", "lease_until": {"$lt": now}}
+                ],
+                # OTP emails can only be rendered by the worker holding the code
+                "owner": {"$in": [None, self.instance_id]}
+            },
+            {"_id": 1}
+        ).sort("next_attempt_at", 1).limit(settings.EMAIL_QUEUE_MAX_SIZE)
+
+        async for doc in cursor:
+            if not self._put(doc["_id"]):
+                if self.queue.full():
+                    break
+
+    async def _claim(self, message_id) -> Optional[dict]:
+        """Take ownership of a message so no other worker sends it too"""
+        db = await get_database()
+        now = datetime.now(tz=timezone.utc)
+        return await db.email_outbox.find_one_and_update(
+            {
+                "_id": message_id,
+                "$or": [
+                    {"status": "pending"},
+                    {"status": "sending", "lease_until": {"$lt": now}}
+                ],
+                "owner": {"$in": [None, self.instance_id]}
+            },
+            {"$set": {
+                "status": "sending",
+                "lease_until": now + timedelta(seconds=settings.SMTP_TIMEOUT_SECONDS * 3)
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _worker(self):
+        while True:
+            message_id = await self.queue.get()
+            self._queued_ids.discard(message_id)
+            try:
+                doc = await self._claim(message_id)
+                if doc:
+                    await self._deliver(doc)
+            except Exception as e:
+                print(f"Warning: Email delivery worker error: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+    def _render(self, doc: dict) -> Dict[str, str]:
+        """Subject, text and html of an outbox message"""
+        if doc.get("template") == "otp":
+            otp = self._otps.get(doc["_id"])
+            if otp is None:
+                raise LookupError("OTP is no longer in memory")
+            return build_otp_message(otp, doc.get("name"))
+        return {"subject": doc["subject"], "text": doc["text"], "html": doc.get("html")}
+
+    async def _deliver(self, doc: dict):
+        db = await get_database()
+        try:
+            content = self._render(doc)
+        except LookupError as e:
+            # Not worth retrying, the user has to request a new code
+            self.failed += 1
+            print(f"❌ Dropping email to {doc['to']}: {str(e)}")
+            await db.email_outbox.update_one(
+                {"_id": doc["_id"]},
+                {"$set": {"status": "failed", "last_error": str(e)}}
+            )
+            return
+
+        try:
+            await self.send_now(doc["to"], content["subject"], content["text"], content.get("html"))
+        except Exception as e:
+            attempts = doc["attempts"] + 1
+            if attempts >= settings.EMAIL_MAX_ATTEMPTS:
+                self.failed += 1
+                self._otps.pop(doc["_id"], None)
+                print(f"❌ Giving up on email to {doc['to']} after {attempts} attempts: {str(e)}")
+                # Kept for inspection without the bodies
+                await db.email_outbox.update_one(
+                    {"_id": doc["_id"]},
+                    {
+                        "$set": {"status": "failed", "attempts": attempts, "last_error": str(e)},
+                        "$unset": {"text": "", "html": ""}
+                    }
+                )
+                return
+
+            self.retried += 1
+            delay = settings.EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+            print(f"❌ Error sending email to {doc['to']} (attempt {attempts}), retrying in {delay:.0f}s: {str(e)}")
+            await db.email_outbox.update_one(
+                {"_id": doc["_id"]},
+                {"$set": {
+                    "status": "pending",
+                    "attempts": attempts,
+                    "last_error": str(e),
+                    "next_attempt_at": datetime.now(tz=timezone.utc) + timedelta(seconds=delay)
+                }}
+            )
+            asyncio.get_running_loop().call_later(delay, self._put, doc["_id"])
+            return
+
+        self.delivered += 1
+        self._otps.pop(doc["_id"], None)
+        await db.email_outbox.delete_one({"_id": doc["_id"]})
+
+    async def send_now(self, to: str, subject: str, text: str, html: Optional[str] = None):
+        """Send a message over the persistent session (or print it when SMTP is not configured)"""
+        if not smtp_configured():
             # Fallback to console for development
             print(f"\n{'='*50}")
-            print(f"📧 OTP Email (Console Mode - SMTP not configured)")
+            print(f"📧 Email (Console Mode - SMTP not configured)")
             print(f"{'='*50}")
-            print(f"To: {email}")
-            print(f"Name: {name or 'N/A'}")
-            print(f"OTP Code: {otp}")
+            print(f"To: {to}")
+            print(f"Subject: {subject}")
+            print(text)
             print(f"{'='*50}\n")
-            return True
-            
-    except Exception as e:
-        print(f"❌ Error sending email: {str(e)}")
-        # Fallback to console if SMTP fails
+            return
+
+        await self.session.send(build_mime_message(to, subject, text, html))
+        print(f"✓ Email sent successfully to {to}")
+
+    def get_stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize() if self.queue else 0,
+            "enqueued": self.enqueued,
+            "delivered": self.delivered,
+            "retried": self.retried,
+            "failed": self.failed,
+            "smtp_connects": self.session.connects,
+        }
+
+# Create a singleton instance
+email_queue = EmailDeliveryQueue()
+
+async def send_otp_email(email: str, otp: str, name: Optional[str] = None) -> bool:
+    """
+    Queue the OTP email for background delivery
+    Returns as soon as the message is persisted to the outbox
+    Without SMTP the OTP is printed to the console instead and never stored
+    """
+    if not smtp_configured():
+        # Fallback to console for development
         print(f"\n{'='*50}")
-        print(f"📧 OTP Email (Fallback Mode - SMTP failed)")
+        print(f"📧 OTP Email (Console Mode - SMTP not configured)")
         print(f"{'='*50}")
         print(f"To: {email}")
         print(f"Name: {name or 'N/A'}")
         print(f"OTP Code: {otp}")
         print(f"{'='*50}\n")
         return True
+    
+    await email_queue.enqueue_otp(email, otp, name)
+    return True
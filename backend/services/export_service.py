@@ -0,0 +1,75 @@
+"""
+Streaming export of form entries
+Entries are read through a batched cursor and written out one batch at a
+time, so memory use does not grow with the number of entries
+"""
+import csv
+import io
+import json
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Mapping
+
+from services.form_service import submission_layouts
+
+FIXED_COLUMNS = ["submission_id", "submitted_at", "user_name", "user_email", "score"]
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+def csv_cell(value: Any) -> Any:
+    """Keep spreadsheet apps from evaluating answers as formulas"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+class EntryExporter:
+    def __init__(self, form: Mapping[str, Any], batch_size: int):
+        self.batch_size = batch_size
+        # Same columns as the form's sheet
+        self.layout = submission_layouts.get(form)
+        self.questions = self.layout.questions
+        self.keys = self.layout.keys
+
+    def _answers(self, entry: dict) -> Dict[str, str]:
+        responses = entry.get("responses") or {}
+        return self.layout.normalize(responses) if self.layout.team else responses
+
+    async def csv(self, entries: AsyncIterable[dict]) -> AsyncIterator[str]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(FIXED_COLUMNS + [
+            question.get("question_text", question["question_key"]) for question in self.questions
+        ])
+
+        rows = 0
+        async for entry in entries:
+            answers = self._answers(entry)
+            writer.writerow([
+                str(entry["_id"]),
+                entry["submitted_at"].isoformat(),
+                csv_cell(entry.get("user_name") or ""),
+                entry.get("user_email", ""),
+                "" if entry.get("score") is None else entry["score"],
+                *(csv_cell(answers.get(key, "")) for key in self.keys)
+            ])
+            rows += 1
+            if rows % self.batch_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    async def ndjson(self, entries: AsyncIterable[dict]) -> AsyncIterator[str]:
+        lines: List[str] = []
+        async for entry in entries:
+            answers = self._answers(entry)
+            lines.append(json.dumps({
+                "submission_id": str(entry["_id"]),
+                "submitted_at": entry["submitted_at"].isoformat(),
+                "user_name": entry.get("user_name"),
+                "user_email": entry.get("user_email"),
+                "score": entry.get("score"),
+                "responses": {key: answers.get(key, "") for key in self.keys}
+            }, ensure_ascii=False))
+            if len(lines) >= self.batch_size:
+                yield "\n".join(lines) + "\n"
+                lines = []
+        if lines:
+            yield "\n".join(lines) + "\n"
@@ -0,0 +1,136 @@
+"""
+In-memory registry of form definitions
+Forms are read far more often than they change, so definitions are cached
+as immutable snapshots (with negative caching for unknown IDs) instead of
+being fetched from Mongo on every request
+"""
+import asyncio
+import hashlib
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, Optional
+
+import bson
+from config.database import get_database
+from config.settings import settings
+from services.cache import TTLCache
+
+# Cached marker for form IDs that do not exist
+_MISSING = object()
+
+def freeze(value: Any) -> Any:
+    """Recursively turn dicts into read-only mappings and lists into tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+def thaw(value: Any) -> Any:
+    """Mutable (and JSON serializable) copy of a frozen value"""
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+def form_version(form_doc: dict) -> str:
+    """
+    Version of a form definition
+    Uses the document's own `version` field when present, otherwise a content hash,
+    so anything derived from a form (validators, layouts) can be cached per version
+    """
+    if form_doc.get("version") is not None:
+        return str(form_doc["version"])
+    content = {key: value for key, value in form_doc.items() if key != "_id"}
+    return hashlib.sha1(bson.encode(content)).hexdigest()[:16]
+
+class FormRegistry:
+    def __init__(self):
+        self.cache = TTLCache(
+            max_size=settings.FORM_CACHE_MAX_SIZE,
+            ttl_seconds=settings.FORM_CACHE_TTL_SECONDS
+        )
+        # Loads in progress, so a burst of misses for one form costs a single query
+        self._loading: Dict[str, asyncio.Future] = {}
+        self.loads = 0
+
+    async def get(self, form_id: str) -> Optional[Mapping[str, Any]]:
+        """
+        Get a form definition by ID
+
+        Returns:
+            Read-only mapping of the form document (with a `_version` key), or None
+        """
+        form = self.cache.get(form_id)
+        if form is _MISSING:
+            return None
+        if form is not None:
+            return form
+
+        loading = self._loading.get(form_id)
+        if loading is None:
+            loading = asyncio.ensure_future(self._load(form_id))
+            self._loading[form_id] = loading
+            loading.add_done_callback(lambda _: self._loading.pop(form_id, None))
+
+        form = await asyncio.shield(loading)
+        return None if form is _MISSING else form
+
+    async def _load(self, form_id: str):
+        db = await get_database()
+        form_doc = await db.forms.find_one({"id": form_id})
+        self.loads += 1
+
+        if not form_doc:
+            self.cache.set(form_id, _MISSING, ttl=settings.FORM_CACHE_NEGATIVE_TTL_SECONDS)
+            return _MISSING
+
+        form_doc["_version"] = form_version(form_doc)
+        form = freeze(form_doc)
+        self.cache.set(form_id, form)
+        return form
+
+    def invalidate(self, form_id: Optional[str] = None):
+        """Drop one form (or all forms) so the next read reloads it"""
+        if form_id is None:
+            self.cache.clear()
+        else:
+            self.cache.invalidate(form_id)
+
+    def get_stats(self) -> dict:
+        return {
+            **self.cache.get_stats(),
+            "loads": self.loads,
+        }
+
+class PerFormVersion:
+    """
+    Objects derived from a form definition (validators, layouts), built once
+    per form version; a version never changes, old versions simply age out
+    """
+    def __init__(self, build: Callable[[Mapping[str, Any]], Any]):
+        self.build = build
+        self.cache = TTLCache(
+            max_size=settings.FORM_CACHE_MAX_SIZE,
+            ttl_seconds=settings.FORM_COMPILED_TTL_SECONDS
+        )
+        self.builds = 0
+
+    def get(self, form: Mapping[str, Any]) -> Any:
+        """Derived object for a form from the registry"""
+        key = (form["id"], form["_version"])
+        value = self.cache.get(key)
+        if value is None:
+            value = self.build(form)
+            self.builds += 1
+            self.cache.set(key, value)
+        return value
+
+    def get_stats(self) -> dict:
+        return {
+            **self.cache.get_stats(),
+            "builds": self.builds,
+        }
+
+# Create a singleton instance
+form_registry = FormRegistry()
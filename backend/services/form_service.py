@@ -0,0 +1,68 @@
+"""
+Form submission helpers shared by the routes and the background workers
+"""
+from typing import Any, Dict, List, Mapping, Tuple
+
+from config.settings import settings
+from services.form_registry import thaw, PerFormVersion
+
+TEAM_MEMBER_FIELDS = ['name', 'roll', 'phone']
+TEAM_MEMBER_PREFIX = 'team_member_'
+
+def team_member_questions(i: int) -> List[Dict[str, str]]:
+    """Questions for the optional team member i (2 and up)"""
+    return [
+        {"question_key": f"team_member_{i}_name", "question_text": f"Team member {i} name", "question_type": "short"},
+        {"question_key": f"team_member_{i}_roll", "question_text": f"Team member {i} roll number", "question_type": "short"},
+        {"question_key": f"team_member_{i}_phone", "question_text": f"Team member {i} phone", "question_type": "short"},
+    ]
+
+class SubmissionLayout:
+    """
+    How a form's submissions are laid out as columns (Sheets, exports)
+    Built once per form version: the column order, the team member questions
+    and the keys of each team member slot used to renumber members
+    """
+    def __init__(self, form: Mapping[str, Any]):
+        self.team = form["type"] == "team"
+        questions = list(thaw(form["questions"]))
+        # Keys of team members 2 to MAX_TEAM_SIZE, one tuple per slot
+        self.member_keys: Tuple[Tuple[str, ...], ...] = ()
+        if self.team:
+            members = range(2, settings.MAX_TEAM_SIZE + 1)
+            self.member_keys = tuple(
+                tuple(f"team_member_{i}_{field}" for field in TEAM_MEMBER_FIELDS) for i in members
+            )
+            for i in members:
+                questions.extend(team_member_questions(i))
+        self.questions: Tuple[Dict[str, Any], ...] = tuple(questions)
+        self.keys: Tuple[str, ...] = tuple(question["question_key"] for question in questions)
+
+    def normalize(self, responses: Dict[str, str]) -> Dict[str, str]:
+        """Responses with team members left empty dropped and the rest renumbered from 2"""
+        if not self.team:
+            return dict(responses)
+
+        normalized = {key: value for key, value in responses.items() if not key.startswith(TEAM_MEMBER_PREFIX)}
+        slots = iter(self.member_keys)
+        for keys in self.member_keys:
+            values = [responses.get(key) for key in keys]
+            if any(values):
+                for new_key, value in zip(next(slots), values):
+                    if value is not None:
+                        normalized[new_key] = value
+        return normalized
+
+# Create a singleton instance
+submission_layouts = PerFormVersion(SubmissionLayout)
+
+def prepare_sheet_submission(form: Mapping[str, Any], responses: Dict[str, str]) -> Tuple[Tuple[Dict[str, Any], ...], Dict[str, str]]:
+    """
+    Questions and responses as they are mirrored to Google Sheets
+    For team forms, team members are renumbered and the team member columns added
+
+    Returns:
+        (questions, cleaned responses)
+    """
+    layout = submission_layouts.get(form)
+    return layout.questions, layout.normalize(responses)
@@ -0,0 +1,84 @@
+"""
+Per-form response validation
+A form's questions are compiled once into lookup tables (required keys,
+radio options, length limits) and the result is cached per form version,
+so checking a response costs a pass over the answers and nothing more
+"""
+from typing import Any, Dict, FrozenSet, Mapping, Optional
+
+from config.settings import settings
+from services.form_registry import PerFormVersion
+from services.form_service import submission_layouts
+
+class FormValidator:
+    def __init__(self, form: Mapping[str, Any]):
+        max_lengths = {
+            "short": settings.RESPONSE_MAX_LENGTH_SHORT,
+            "long": settings.RESPONSE_MAX_LENGTH_LONG,
+        }
+        # Questions of the form itself are required, team member ones are optional
+        self.required: FrozenSet[str] = frozenset(q["question_key"] for q in form["questions"])
+        self.options: Dict[str, FrozenSet[str]] = {}
+        self.max_length: Dict[str, int] = {}
+        for question in submission_layouts.get(form).questions:
+            key = question["question_key"]
+            if question["question_type"] == "radio":
+                self.options[key] = frozenset(question.get("options") or ())
+            # Radio answers are bounded by their options
+            self.max_length[key] = max_lengths.get(question["question_type"], settings.RESPONSE_MAX_LENGTH_LONG)
+        self.min_max_length = min(self.max_length.values(), default=settings.RESPONSE_MAX_LENGTH_LONG)
+
+    def known(self, responses: Dict[str, str]) -> Dict[str, str]:
+        """
+        Responses without keys the form does not have
+        A draft saved before the form was edited can hold answers to removed
+        questions, and the page submits whatever the draft held
+        """
+        if self.max_length.keys() >= responses.keys():
+            return responses
+        return {key: value for key, value in responses.items() if key in self.max_length}
+
+    def check_submission(self, responses: Dict[str, str]) -> Optional[str]:
+        """
+        Validate a complete submission (pass it through known first)
+
+        Returns:
+            Error message, or None if the responses are valid
+        """
+        missing = self.required.difference(responses)
+        if not missing:
+            # Blank answers count as missing
+            missing = [key for key in self.required if not responses[key].strip()]
+        if missing:
+            return f"Missing required questions: {', '.join(sorted(missing))}"
+
+        return self._check_lengths(responses) or self._check_options(responses)
+
+    def check_draft(self, responses: Dict[str, str]) -> Optional[str]:
+        """
+        Validate (part of) a draft
+        Only lengths are checked: answers may be missing, and keys the form no
+        longer has or radio options renamed since are kept, so a draft saved
+        before the form was edited still saves. Options are checked on submission.
+        """
+        return self._check_lengths(responses)
+
+    def _check_lengths(self, responses: Dict[str, str]) -> Optional[str]:
+        # Answers are usually well within every limit, only check each one when the longest is not
+        if responses and max(map(len, responses.values())) > self.min_max_length:
+            for key, value in responses.items():
+                limit = self.max_length.get(key, settings.RESPONSE_MAX_LENGTH_LONG)
+                if len(value) > limit:
+                    return f"Answer to '{key}' is too long (max {limit} characters)"
+        return None
+
+    def _check_options(self, responses: Dict[str, str]) -> Optional[str]:
+        for key, choices in self.options.items():
+            value = responses.get(key)
+            if value is None or value in choices:
+                continue
+            return f"'{value}' is not an option for '{key}'"
+        return None
+
+# Create a singleton instance
+form_validators = PerFormVersion(FormValidator)
@@ -0,0 +1,251 @@
+"""
+Google OAuth token verification over a long-lived pooled HTTP client,
+and offline Google ID token verification against a cached JWKS key set
+"""
+import asyncio
+import hashlib
+import re
+import time
+from typing import Optional, Dict, Any, Callable, Awaitable, Tuple
+
+import httpx
+from jose import JWTError, jwt
+from config.settings import settings
+from services.cache import TTLCache
+
+class GoogleAuthError(Exception):
+    """Raised when Google rejects a token or it was issued for another client"""
+    pass
+
+# A JWKS fetcher returns the key set document and how long it may be cached (seconds, or None)
+JWKSFetcher = Callable[[], Awaitable[Tuple[Dict[str, Any], Optional[float]]]]
+
+def static_jwks_fetcher(jwks: Dict[str, Any]) -> JWKSFetcher:
+    """Fetcher serving a fixed key set, e.g. a local one for tests"""
+    async def fetch():
+        return jwks, None
+    return fetch
+
+class JWKSKeySet:
+    """
+    Signing keys by key ID, loaded through a pluggable fetcher.
+
+    Only the very first load waits on the network. Once the keys are stale
+    they are refreshed in the background while the current ones keep being
+    served, and a token signed with an unknown key ID triggers a refetch at
+    most once every GOOGLE_JWKS_MIN_REFRESH_SECONDS.
+    """
+    def __init__(self, fetcher: JWKSFetcher):
+        self.fetcher = fetcher
+        self.keys: Dict[str, Dict[str, Any]] = {}
+        self.expires_at = 0.0
+        self.last_fetch_at = 0.0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def refresh(self):
+        """Fetch the key set now"""
+        async with self._lock:
+            self.last_fetch_at = time.monotonic()
+            try:
+                jwks, max_age = await self.fetcher()
+            except Exception:
+                self.refresh_failures += 1
+                raise
+
+            self.keys = {key["kid"]: key for key in jwks.get("keys", []) if "kid" in key}
+            ttl = max_age if max_age is not None else settings.GOOGLE_JWKS_REFRESH_SECONDS
+            self.expires_at = time.monotonic() + ttl
+            self.refreshes += 1
+
+    async def _refresh_quietly(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            print(f"Warning: Failed to refresh Google JWKS: {str(e)}")
+
+    def _refresh_in_background(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_quietly())
+
+    async def get_key(self, kid: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Get the signing key for a key ID"""
+        if not self.keys:
+            await self.refresh()
+        elif time.monotonic() >= self.expires_at:
+            self._refresh_in_background()
+
+        key = self.keys.get(kid)
+        if key is None and time.monotonic() - self.last_fetch_at >= settings.GOOGLE_JWKS_MIN_REFRESH_SECONDS:
+            # Google may have rotated its keys
+            await self.refresh()
+            key = self.keys.get(kid)
+        return key
+
+    def get_stats(self) -> dict:
+        return {
+            "keys": len(self.keys),
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "expires_in_seconds": round(max(self.expires_at - time.monotonic(), 0), 1),
+        }
+
+class GoogleAuthService:
+    def __init__(self):
+        self.client: Optional[httpx.AsyncClient] = None
+
+        # Verified identities by SHA-256 digest of the access token, kept until the token expires
+        self.identity_cache = TTLCache(
+            max_size=settings.GOOGLE_IDENTITY_CACHE_MAX_SIZE,
+            ttl_seconds=3600
+        )
+        self.key_set = JWKSKeySet(fetcher=self._fetch_google_jwks)
+        self.id_token_issuers = tuple(
+            issuer.strip() for issuer in settings.GOOGLE_ID_TOKEN_ISSUERS.split(',') if issuer.strip()
+        )
+
+    async def start(self):
+        """Open the pooled HTTP client (called from the app lifespan)"""
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                timeout=settings.GOOGLE_HTTP_TIMEOUT_SECONDS,
+                limits=httpx.Limits(
+                    max_connections=settings.GOOGLE_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.GOOGLE_HTTP_MAX_CONNECTIONS
+                )
+            )
+
+    async def close(self):
+        """Close the pooled HTTP client"""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        if self.client is None:
+            await self.start()
+        return self.client
+
+    async def verify_access_token(self, token: str) -> Dict[str, Any]:
+        """
+        Verify a Google OAuth access token and return the identity behind it
+
+        The tokeninfo and userinfo lookups run concurrently over the pooled client.
+
+        Returns:
+            Dictionary with google_id, email, name and picture
+
+        Raises:
+            GoogleAuthError: If the token is invalid or issued for another client
+            httpx.HTTPError: If Google could not be reached
+        """
+        digest = hashlib.sha256(token.encode()).digest()
+        identity = self.identity_cache.get(digest)
+        if identity is not None:
+            return identity
+
+        client = await self._get_client()
+        params = {"access_token": token}
+        token_info, user_info = await asyncio.gather(
+            client.get(settings.GOOGLE_TOKENINFO_URL, params=params),
+            client.get(settings.GOOGLE_USERINFO_URL, params=params)
+        )
+
+        if token_info.status_code != 200 or user_info.status_code != 200:
+            raise GoogleAuthError("Invalid Google token")
+
+        google_data = token_info.json()
+        user_info_data = user_info.json()
+
+        # Verify audience (client ID)
+        if google_data.get("aud") != settings.GOOGLE_CLIENT_ID:
+            raise GoogleAuthError("Invalid token audience")
+
+        identity = {
+            "google_id": google_data.get("sub"),
+            "email": google_data.get("email"),
+            "name": user_info_data.get("name"),
+            "picture": user_info_data.get("picture"),
+        }
+
+        if identity["google_id"] and identity["email"]:
+            self.identity_cache.set(digest, identity, ttl=self._seconds_until_expiry(google_data))
+
+        return identity
+
+    async def _fetch_google_jwks(self) -> Tuple[Dict[str, Any], Optional[float]]:
+        """Default JWKS fetcher, honours the max-age Google sends with its certs"""
+        client = await self._get_client()
+        response = await client.get(settings.GOOGLE_JWKS_URL)
+        response.raise_for_status()
+
+        max_age = None
+        match = re.search(r"max-age=(\d+)", response.headers.get("cache-control", ""))
+        if match:
+            max_age = float(match.group(1))
+        return response.json(), max_age
+
+    async def verify_id_token(self, id_token: str) -> Dict[str, Any]:
+        """
+        Verify a Google ID token locally against the cached JWKS key set
+
+        Checks the signature, audience, issuer and expiry without calling Google
+        (apart from the occasional key set refresh).
+
+        Returns:
+            Dictionary with google_id, email, name and picture
+
+        Raises:
+            GoogleAuthError: If the token is invalid, expired or issued for another client
+        """
+        try:
+            header = jwt.get_unverified_header(id_token)
+        except JWTError:
+            raise GoogleAuthError("Invalid Google ID token")
+
+        key = await self.key_set.get_key(header.get("kid"))
+        if key is None:
+            raise GoogleAuthError("Unknown Google ID token signing key")
+
+        try:
+            claims = jwt.decode(
+                id_token,
+                key,
+                algorithms=["RS256"],
+                audience=settings.GOOGLE_CLIENT_ID,
+                issuer=self.id_token_issuers,
+                options={"verify_at_hash": False}
+            )
+        except JWTError:
+            raise GoogleAuthError("Invalid Google ID token")
+
+        if claims.get("email") and not claims.get("email_verified", False):
+            raise GoogleAuthError("Google account email is not verified")
+
+        return {
+            "google_id": claims.get("sub"),
+            "email": claims.get("email"),
+            "name": claims.get("name"),
+            "picture": claims.get("picture"),
+        }
+
+    def _seconds_until_expiry(self, google_data: Dict[str, Any]) -> float:
+        """Remaining token lifetime according to tokeninfo"""
+        try:
+            if "exp" in google_data:
+                return float(google_data["exp"]) - time.time()
+            return float(google_data.get("expires_in", 0))
+        except (TypeError, ValueError):
+            return 0
+
+    def get_stats(self) -> dict:
+        return {
+            "client_open": self.client is not None,
+            "identity_cache": self.identity_cache.get_stats(),
+            "jwks": self.key_set.get_stats(),
+        }
+
+# Create a singleton instance
+google_auth_service = GoogleAuthService()
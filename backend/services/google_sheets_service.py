@@ -1,45 +1,115 @@
 """
 Google Sheets service for fetching team member data
 """
-import os
+import asyncio
 import re
-from typing import List, Dict, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Optional, Set
+import httplib2
 from google.oauth2.service_account import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 import urllib.parse
 from datetime import datetime
+from config.settings import settings
 
 # Define the scopes
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 
 class GoogleSheetsService:
+    """
+    googleapiclient is blocking and not thread-safe, so every request runs on a
+    small dedicated thread pool, each thread with its own HTTP connection and
+    client. The service account token is cached on the shared credentials.
+    """
     def __init__(self):
         self.credentials = None
-        self.service = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
         
         self.members_sheet_id = "1yLMzDbhLFgkUV7DqYpapw3fkzsrY-vGEwiNQVM-wOSs"
         self.forms_sheet_id = "1EOi8OXaNdDWlPMQKuh2zLsqVYFNOkB_QU2dVKYHdCqM"
         
+        # Cached tab list and header rows of the forms spreadsheet
+        self._sheet_titles: Optional[Set[str]] = None
+        self._sheet_titles_fetched_at = 0.0
+        self._headers: Dict[str, List[str]] = {}
+        self._sheet_locks: Dict[str, asyncio.Lock] = {}
+        
+        # Metrics
+        self.metadata_fetches = 0
+        self.requests = 0
+        self.request_ms_total = 0.0
+        self.request_ms_max = 0.0
+        
     def initialize(self):
         """Initialize Google Sheets API service"""
         try:
-            # Path to your service account key file
-            service_account_file = "config/sheet-key.json"
+            if not settings.SHEETS_API_ENDPOINT:
+                # Path to your service account key file
+                service_account_file = "config/sheet-key.json"
+                
+                # Create credentials
+                self.credentials = Credentials.from_service_account_file(
+                    service_account_file, 
+                    scopes=SCOPES
+                )
             
-            # Create credentials
-            self.credentials = Credentials.from_service_account_file(
-                service_account_file, 
-                scopes=SCOPES
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.SHEETS_MAX_WORKERS,
+                thread_name_prefix="sheets"
             )
-            
-            # Build the service
-            self.service = build('sheets', 'v4', credentials=self.credentials)
             return True
         except Exception as e:
             print(f"Error initializing Google Sheets service: {str(e)}")
             return False
     
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    
+    def _thread_service(self):
+        """Sheets client of the current executor thread, built on first use"""
+        service = getattr(self._local, "service", None)
+        if service is None:
+            http = httplib2.Http(timeout=settings.SHEETS_HTTP_TIMEOUT_SECONDS)
+            client_options = None
+            if settings.SHEETS_API_ENDPOINT:
+                # Local fake Sheets server, requests are sent unauthenticated
+                client_options = {"api_endpoint": settings.SHEETS_API_ENDPOINT}
+            else:
+                http = AuthorizedHttp(self.credentials, http=http)
+            
+            service = build('sheets', 'v4', http=http, client_options=client_options, cache_discovery=False)
+            self._local.service = service
+        return service
+    
+    async def _execute(self, make_request: Callable[[Any], Any]) -> Any:
+        """
+        Build a request with make_request(service) and execute it on the Sheets
+        thread pool, so a slow response never blocks the event loop
+        """
+        if self._executor is None:
+            if not self.initialize():
+                raise Exception("Failed to initialize Google Sheets service")
+        
+        executor = self._executor
+        self.requests += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                executor,
+                lambda: make_request(self._thread_service()).execute()
+            )
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.request_ms_total += elapsed_ms
+            self.request_ms_max = max(self.request_ms_max, elapsed_ms)
+    
     async def fetch_team_members(self, sheet_name: str = 'Sheet1') -> List[Dict[str, Any]]:
         """
         Fetch team member data from Google Sheets
@@ -50,19 +120,15 @@ class GoogleSheetsService:
         Returns:
             List of team member dictionaries
         """
-        if not self.service:
-            if not self.initialize():
-                raise Exception("Failed to initialize Google Sheets service")
-        
         try:
             # Define the range (adjust based on your sheet structure)
             range_name = f'{sheet_name}!A:I'  # Columns A to I (9 columns as per your fields)
             
             # Call the Sheets API
-            result = self.service.spreadsheets().values().get(
+            result = await self._execute(lambda service: service.spreadsheets().values().get(
                 spreadsheetId=self.members_sheet_id,
                 range=range_name
-            ).execute()
+            ))
             
             values = result.get('values', [])
             
@@ -120,9 +186,43 @@ class GoogleSheetsService:
         sanitized = sanitized[:100]
         return sanitized
     
+    def _sheet_lock(self, sheet_name: str) -> asyncio.Lock:
+        lock = self._sheet_locks.get(sheet_name)
+        if lock is None:
+            lock = self._sheet_locks[sheet_name] = asyncio.Lock()
+        return lock
+    
+    async def _fetch_sheet_titles(self) -> Set[str]:
+        """Download the spreadsheet's tab list (one API call)"""
+        spreadsheet = await self._execute(lambda service: service.spreadsheets().get(
+            spreadsheetId=self.forms_sheet_id,
+            fields='sheets.properties.title'
+        ))
+        self.metadata_fetches += 1
+        self._sheet_titles = {sheet['properties']['title'] for sheet in spreadsheet.get('sheets', [])}
+        self._sheet_titles_fetched_at = time.monotonic()
+        return self._sheet_titles
+    
+    async def _cached_sheet_titles(self) -> Set[str]:
+        """Tab list, refreshed once it is older than SHEETS_METADATA_TTL_SECONDS"""
+        if (
+            self._sheet_titles is None
+            or time.monotonic() - self._sheet_titles_fetched_at > settings.SHEETS_METADATA_TTL_SECONDS
+        ):
+            return await self._fetch_sheet_titles()
+        return self._sheet_titles
+    
+    def invalidate_sheet(self, sheet_name: str):
+        """Forget what is cached about a tab (e.g. after it was renamed or deleted)"""
+        self._headers.pop(sheet_name, None)
+        if self._sheet_titles is not None:
+            self._sheet_titles.discard(sheet_name)
+    
     async def _get_or_create_sheet(self, form_name: str, questions: List[Dict[str, Any]]) -> str:
         """
         Get existing sheet or create new one for the form
+        The tab list and each tab's header row are cached, so once a sheet is
+        known this makes no API calls
         
         Args:
             form_name: Name of the form
@@ -131,114 +231,178 @@ class GoogleSheetsService:
         Returns:
             Sheet name (sanitized)
         """
-        if not self.service:
-            if not self.initialize():
-                raise Exception("Failed to initialize Google Sheets service")
-        
         sheet_name = self._sanitize_sheet_name(form_name)
         
-        try:
-            # Get all sheets in the spreadsheet
-            spreadsheet = self.service.spreadsheets().get(
-                spreadsheetId=self.forms_sheet_id
-            ).execute()
-            
-            sheets = spreadsheet.get('sheets', [])
-            sheet_exists = any(sheet['properties']['title'] == sheet_name for sheet in sheets)
-            
-            if not sheet_exists:
-                # Create new sheet
-                requests = [{
-                    'addSheet': {
-                        'properties': {
-                            'title': sheet_name
-                        }
-                    }
-                }]
+        # Add question texts as headers
+        headers = ['Timestamp', 'Email']
+        for question in questions:
+            headers.append(question.get('question_text', question.get('question_key', '')))
+        
+        if self._headers.get(sheet_name) == headers:
+            return sheet_name
+        
+        # One creator per tab, concurrent submissions for a new form wait for it
+        async with self._sheet_lock(sheet_name):
+            try:
+                fetches = self.metadata_fetches
+                titles = await self._cached_sheet_titles()
+                if sheet_name not in titles and self.metadata_fetches == fetches:
+                    # Refresh on a miss, the tab may have been created since the last fetch
+                    titles = await self._fetch_sheet_titles()
                 
-                self.service.spreadsheets().batchUpdate(
-                    spreadsheetId=self.forms_sheet_id,
-                    body={'requests': requests}
-                ).execute()
+                if sheet_name not in titles:
+                    # Create new sheet
+                    requests = [{
+                        'addSheet': {
+                            'properties': {
+                                'title': sheet_name
+                            }
+                        }
+                    }]
+                    
+                    await self._execute(lambda service: service.spreadsheets().batchUpdate(
+                        spreadsheetId=self.forms_sheet_id,
+                        body={'requests': requests}
+                    ))
+                    titles.add(sheet_name)
+                    existing_headers = []
+                else:
+                    existing_headers = self._headers.get(sheet_name)
+                    if existing_headers is None:
+                        result = await self._execute(lambda service: service.spreadsheets().values().get(
+                            spreadsheetId=self.forms_sheet_id,
+                            range=f'{sheet_name}!1:1'
+                        ))
+                        values = result.get('values', [])
+                        existing_headers = values[0] if values else []
                 
-                # Add headers
-                headers = ['Timestamp', 'Email']
-                # Add question texts as headers
-                for question in questions:
-                    headers.append(question.get('question_text', question.get('question_key', '')))
-
+                # Write headers to a new sheet, or extend them when questions were added to the form
+                if len(headers) > len(existing_headers) and headers[:len(existing_headers)] == existing_headers:
+                    await self._execute(lambda service: service.spreadsheets().values().update(
+                        spreadsheetId=self.forms_sheet_id,
+                        range=f'{sheet_name}!A1',
+                        valueInputOption='RAW',
+                        body={'values': [headers]}
+                    ))
+                    existing_headers = headers
                 
+                self._headers[sheet_name] = existing_headers
+                return sheet_name
                 
-                # Write headers to the new sheet
-                self.service.spreadsheets().values().update(
-                    spreadsheetId=self.forms_sheet_id,
-                    range=f'{sheet_name}!A1',
-                    valueInputOption='RAW',
-                    body={'values': [headers]}
-                ).execute()
-            
-            return sheet_name
-            
-        except HttpError as error:
-            print(f"Error creating/getting sheet: {error}")
-            raise Exception(f"Failed to create/get sheet: {str(error)}")
+            except HttpError as error:
+                print(f"Error creating/getting sheet: {error}")
+                self.invalidate_sheet(sheet_name)
+                raise Exception(f"Failed to create/get sheet: {str(error)}")
     
-    async def append_form_submission(
-        self, 
-        form_name: str, 
-        user_name: str, 
+    async def fetch_submitted_emails(self, form_name: str) -> Set[str]:
+        """
+        Emails already in the form's sheet (the Email column)
+        Each user submits a form once, so these identify the rows already appended
+        """
+        sheet_name = self._sanitize_sheet_name(form_name)
+        titles = await self._cached_sheet_titles()
+        if sheet_name not in titles:
+            # The tab may have been created since the last fetch
+            titles = await self._fetch_sheet_titles()
+            if sheet_name not in titles:
+                return set()
+        
+        result = await self._execute(lambda service: service.spreadsheets().values().get(
+            spreadsheetId=self.forms_sheet_id,
+            range=f'{sheet_name}!B2:B'
+        ))
+        return {row[0] for row in result.get('values', []) if row}
+    
+    def build_submission_row(
+        self,
         user_email: str,
         questions: List[Dict[str, Any]],
         responses: Dict[str, str],
         timestamp: datetime
+    ) -> List[str]:
+        """Sheet row for one submission: timestamp, email, then answers in question order"""
+        row_data = [
+            timestamp.strftime('%Y-%m-%d %I:%M:%S %p'),
+            user_email
+        ]
+        
+        # Add responses in the same order as questions
+        for question in questions:
+            question_key = question.get('question_key', '')
+            answer = responses.get(question_key, '')
+            row_data.append(answer)
+        
+        return row_data
+    
+    async def append_rows(
+        self,
+        form_name: str,
+        questions: List[Dict[str, Any]],
+        rows: List[List[str]]
     ):
         """
-        Append form submission data to Google Sheets
+        Append several rows to the form's sheet in a single API call
+        The append either adds all rows or none of them
         
         Args:
             form_name: Name of the form
-            user_email: Email of the user who submitted
-            questions: List of question objects from the form
-            responses: Dictionary of question_key: answer pairs
-            timestamp: Submission timestamp
+            questions: List of question objects, used for the headers of a new sheet
+            rows: Rows built with build_submission_row
         """
-        if not self.service:
-            if not self.initialize():
-                raise Exception("Failed to initialize Google Sheets service")
-        
         try:
             # Get or create sheet
             sheet_name = await self._get_or_create_sheet(form_name, questions)
             
-            # Prepare row data
-            row_data = [
-                timestamp.strftime('%Y-%m-%d %I:%M:%S %p'),
-                user_email
-            ]
-            
-            # Add responses in the same order as questions
-            for question in questions:
-                question_key = question.get('question_key', '')
-                answer = responses.get(question_key, '')
-                row_data.append(answer)
-            
-            # Append the row
-            self.service.spreadsheets().values().append(
+            # Append the rows
+            await self._execute(lambda service: service.spreadsheets().values().append(
                 spreadsheetId=self.forms_sheet_id,
                 range=f'{sheet_name}!A:A',
                 valueInputOption='RAW',
                 insertDataOption='INSERT_ROWS',
-                body={'values': [row_data]}
-            ).execute()
+                body={'values': rows}
+            ))
             
             return True
             
         except HttpError as error:
-            print(f"Error appending form submission: {error}")
-            raise Exception(f"Failed to append form submission: {str(error)}")
+            print(f"Error appending form submissions: {error}")
+            # The tab may have been renamed or deleted, look it up again next time
+            self.invalidate_sheet(self._sanitize_sheet_name(form_name))
+            raise Exception(f"Failed to append form submissions: {str(error)}")
         except Exception as e:
-            print(f"Error in append_form_submission: {str(e)}")
-            raise Exception(f"Error processing form submission: {str(e)}")
+            print(f"Error in append_rows: {str(e)}")
+            raise Exception(f"Error processing form submissions: {str(e)}")
+    
+    async def append_form_submission(
+        self, 
+        form_name: str, 
+        user_name: str, 
+        user_email: str,
+        questions: List[Dict[str, Any]],
+        responses: Dict[str, str],
+        timestamp: datetime
+    ):
+        """
+        Append form submission data to Google Sheets
+        
+        Args:
+            form_name: Name of the form
+            user_email: Email of the user who submitted
+            questions: List of question objects from the form
+            responses: Dictionary of question_key: answer pairs
+            timestamp: Submission timestamp
+        """
+        row_data = self.build_submission_row(user_email, questions, responses, timestamp)
+        return await self.append_rows(form_name, questions, [row_data])
+
+    def get_stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "avg_request_ms": round(self.request_ms_total / self.requests, 2) if self.requests else None,
+            "max_request_ms": round(self.request_ms_max, 2),
+            "metadata_fetches": self.metadata_fetches,
+            "cached_sheets": len(self._headers),
+        }
 
 # Create a singleton instance
 google_sheets_service = GoogleSheetsService()
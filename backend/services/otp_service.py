@@ -1,10 +1,15 @@
+import asyncio
+import math
 import pytz
-from config.database import get_database
+from config.database import get_database, delete_in_batches
+from config.settings import settings
 from models.otp import OTPInDB, PendingUserCreate
 from services.email_service import generate_otp, send_otp_email
-from services.auth_service import get_password_hash
-from datetime import datetime, timedelta
-from typing import Optional
+from services.auth_service import get_password_hash_async
+from services.otp_store import otp_store
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict
+from pymongo.errors import DuplicateKeyError
 
 async def create_pending_user(email: str, password: str, full_name: Optional[str] = None) -> bool:
     """Create a pending user record (not yet verified)"""
@@ -16,7 +21,7 @@ async def create_pending_user(email: str, password: str, full_name: Optional[str
     pending_user = {
         "email": email,
         "full_name": full_name,
-        "hashed_password": get_password_hash(password),
+        "hashed_password": await get_password_hash_async(password),
         "created_at": datetime.now(tz = pytz.timezone('Asia/Kolkata'))
     }
     
@@ -28,6 +33,20 @@ async def get_pending_user(email: str) -> Optional[dict]:
     db = await get_database()
     return await db.pending_users.find_one({"email": email})
 
+async def claim_pending_user(email: str) -> Optional[dict]:
+    """Remove and return the pending user, so only one verification can create the account"""
+    db = await get_database()
+    return await db.pending_users.find_one_and_delete({"email": email})
+
+async def restore_pending_user(pending_user: dict):
+    """Put back a pending user claimed by a verification that failed"""
+    db = await get_database()
+    try:
+        await db.pending_users.insert_one(pending_user)
+    except DuplicateKeyError:
+        # Signup was restarted meanwhile, the newer pending user wins
+        pass
+
 async def delete_pending_user(email: str) -> bool:
     """Delete pending user after verification"""
     db = await get_database()
@@ -35,62 +54,111 @@ async def delete_pending_user(email: str) -> bool:
     return result.deleted_count > 0
 
 async def store_otp(email: str, otp: str, expiry_minutes: int = 10) -> bool:
-    """Store OTP in database with expiration"""
-    db = await get_database()
-    
-    # Delete any existing OTP for this email
-    await db.otps.delete_many({"email": email})
-    
-    otp_data = {
-        "email": email,
-        "otp": otp,
-        "expires_at": datetime.now(tz = pytz.timezone('Asia/Kolkata')) + timedelta(minutes=expiry_minutes),
-        "created_at": datetime.now(tz = pytz.timezone('Asia/Kolkata'))
-    }
-    
-    await db.otps.insert_one(otp_data)
+    """Store OTP with expiration, replacing any previous OTP for this email"""
+    await otp_store.store(email, otp, expiry_minutes * 60)
     return True
 
 async def verify_otp(email: str, otp: str) -> bool:
-    """Verify OTP for email"""
+    """Verify OTP for email, consuming it atomically"""
+    return await otp_store.consume(email, otp)
+
+class OTPCooldownError(Exception):
+    """An OTP was sent to this email less than OTP_RESEND_COOLDOWN_SECONDS ago"""
+    def __init__(self, retry_after: int):
+        super().__init__(f"OTP sent recently, retry after {retry_after} seconds")
+        self.retry_after = retry_after
+
+# OTP sends currently running in this worker, by email
+_inflight_sends: Dict[str, asyncio.Task] = {}
+
+otp_send_stats = {
+    "sent": 0,
+    "coalesced": 0,  # Joined a send already in flight in this worker
+    "cooldown": 0  # Refused because an OTP was sent recently (by any worker)
+}
+
+async def _claim_send_cooldown(email: str) -> datetime:
+    """
+    Claim the right to send an OTP to this email, shared across workers via Mongo.
+    Returns the claim time, raises OTPCooldownError if another send happened within the cooldown.
+    """
     db = await get_database()
+    now = datetime.now(tz = timezone.utc)
+    cooldown = timedelta(seconds=settings.OTP_RESEND_COOLDOWN_SECONDS)
     
-    otp_record = await db.otps.find_one({"email": email, "otp": otp})
+    try:
+        # Matches only an expired claim; otherwise the upsert collides on _id
+        await db.otp_send_cooldowns.update_one(
+            {"_id": email, "sent_at": {"$lte": now - cooldown}},
+            {"$set": {"sent_at": now, "expires_at": now + cooldown}},
+            upsert=True
+        )
+        return now
+    except DuplicateKeyError:
+        pass
     
-    if not otp_record:
-        return False
-    
-    new_expiry = otp_record["expires_at"].replace(tzinfo=pytz.utc)
+    # The earlier OTP may have been used already or not have arrived,
+    # so the caller is told to wait instead of being told a new one was sent
+    claim = await db.otp_send_cooldowns.find_one({"_id": email}, {"expires_at": 1})
+    retry_after = 1
+    if claim:
+        expires_at = claim["expires_at"]
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        retry_after = max(1, math.ceil((expires_at - now).total_seconds()))
+    raise OTPCooldownError(retry_after)
+
+async def _send_otp(email: str, name: Optional[str]) -> bool:
+    try:
+        claimed_at = await _claim_send_cooldown(email)
+    except OTPCooldownError:
+        otp_send_stats["cooldown"] += 1
+        raise
     
-    # Check if OTP is expired
-    if new_expiry < datetime.now(tz = pytz.timezone('Asia/Kolkata')):
-        # Delete expired OTP
-        await db.otps.delete_one({"email": email})
-        return False
+    try:
+        otp = generate_otp()
+        
+        # Store OTP in database
+        await store_otp(email, otp)
+        
+        # Send email
+        await send_otp_email(email, otp, name)
+    except Exception:
+        # Release the cooldown so the user can retry right away
+        db = await get_database()
+        await db.otp_send_cooldowns.delete_one({"_id": email, "sent_at": claimed_at})
+        raise
     
-    # Delete used OTP
-    await db.otps.delete_one({"email": email})
+    otp_send_stats["sent"] += 1
     return True
 
-async def send_verification_otp(email: str, name: Optional[str] = None) -> str:
-    """Generate and send OTP to email"""
-    otp = generate_otp()
-    
-    # Store OTP in database
-    await store_otp(email, otp)
+async def send_verification_otp(email: str, name: Optional[str] = None) -> bool:
+    """
+    Generate and send OTP to email
+    Concurrent calls for the same email share one send, and repeated calls within
+    OTP_RESEND_COOLDOWN_SECONDS raise OTPCooldownError
+    """
+    task = _inflight_sends.get(email)
+    if task is not None:
+        otp_send_stats["coalesced"] += 1
+    else:
+        task = asyncio.create_task(_send_otp(email, name))
+        _inflight_sends[email] = task
+        task.add_done_callback(lambda _: _inflight_sends.pop(email, None))
     
-    # Send email
-    await send_otp_email(email, otp, name)
-    
-    return otp
+    # Shielded, so one cancelled request does not cancel the send for the others
+    return await asyncio.shield(task)
 
-async def cleanup_expired_otps():
-    """Remove expired OTPs from database"""
-    db = await get_database()
-    await db.otps.delete_many({"expires_at": {"$lt": datetime.now(tz = pytz.timezone('Asia/Kolkata'))}})
+async def cleanup_expired_otps() -> int:
+    """Remove expired OTPs"""
+    return await otp_store.cleanup_expired()
 
-async def cleanup_old_pending_users():
+async def cleanup_old_pending_users() -> int:
     """Remove pending users older than 24 hours"""
     db = await get_database()
     cutoff_time = datetime.now(tz = pytz.timezone('Asia/Kolkata')) - timedelta(hours=24)
-    await db.pending_users.delete_many({"created_at": {"$lt": cutoff_time}})
+    return await delete_in_batches(
+        db.pending_users,
+        {"created_at": {"$lt": cutoff_time}},
+        settings.MAINTENANCE_BATCH_SIZE
+    )
@@ -0,0 +1,139 @@
+"""
+OTP storage backends
+OTPs are stored as keyed hashes and consumed atomically: a code can be
+verified at most once, and only before it expires
+"""
+import hashlib
+import hmac
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Set, Tuple
+
+from config.database import get_database, delete_in_batches
+from config.settings import settings
+
+def hash_otp(email: str, otp: str) -> str:
+    """Keyed hash of an OTP, so stored codes are useless to someone reading the database"""
+    return hmac.new(settings.SECRET_KEY.encode(), f"{email}:{otp}".encode(), hashlib.sha256).hexdigest()
+
+class OTPStore(ABC):
+    @abstractmethod
+    async def store(self, email: str, otp: str, expiry_seconds: int):
+        """Store an OTP for the email, replacing any previous one"""
+
+    @abstractmethod
+    async def consume(self, email: str, otp: str) -> bool:
+        """Atomically check and remove an OTP, returns False if wrong or expired"""
+
+    @abstractmethod
+    async def delete(self, email: str):
+        """Remove any OTP for the email"""
+
+    @abstractmethod
+    async def cleanup_expired(self) -> int:
+        """Remove expired OTPs, returns how many were removed"""
+
+class MongoOTPStore(OTPStore):
+    """One document per email (_id is the email), one round trip per operation"""
+    async def store(self, email: str, otp: str, expiry_seconds: int):
+        db = await get_database()
+        now = datetime.now(tz=timezone.utc)
+        await db.otps.replace_one(
+            {"_id": email},
+            {
+                "email": email,
+                "otp_hash": hash_otp(email, otp),
+                "expires_at": now + timedelta(seconds=expiry_seconds),
+                "created_at": now
+            },
+            upsert=True
+        )
+
+    async def consume(self, email: str, otp: str) -> bool:
+        db = await get_database()
+        record = await db.otps.find_one_and_delete({
+            "_id": email,
+            "otp_hash": hash_otp(email, otp),
+            "expires_at": {"$gt": datetime.now(tz=timezone.utc)}
+        })
+        return record is not None
+
+    async def delete(self, email: str):
+        db = await get_database()
+        await db.otps.delete_many({"email": email})
+
+    async def cleanup_expired(self) -> int:
+        # The TTL index on expires_at normally does this already
+        db = await get_database()
+        return await delete_in_batches(
+            db.otps,
+            {"expires_at": {"$lt": datetime.now(tz=timezone.utc)}},
+            settings.MAINTENANCE_BATCH_SIZE
+        )
+
+class InMemoryOTPStore(OTPStore):
+    """
+    Single-node store, expiry is tracked with a timing wheel.
+    Each slot covers TICK_SECONDS; entries expiring further out than one
+    revolution simply stay in their slot until their deadline comes round.
+    Expired entries are dropped as the wheel advances on each operation.
+    """
+    TICK_SECONDS = 1
+    SLOTS = 1024
+
+    def __init__(self):
+        # email -> (otp hash, expiry as monotonic time)
+        self._entries: Dict[str, Tuple[str, float]] = {}
+        self._wheel: List[Set[str]] = [set() for _ in range(self.SLOTS)]
+        # Last tick whose slot has been fully processed
+        self._tick = self._current_tick() - 1
+
+    def _current_tick(self) -> int:
+        return int(time.monotonic() // self.TICK_SECONDS)
+
+    def _advance(self) -> int:
+        """Expire entries in every slot the wheel fully passed since the last call"""
+        now = time.monotonic()
+        last_passed = self._current_tick() - 1
+        expired = 0
+        for tick in range(max(self._tick + 1, last_passed - self.SLOTS + 1), last_passed + 1):
+            slot = self._wheel[tick % self.SLOTS]
+            for email in list(slot):
+                entry = self._entries.get(email)
+                if entry is None or entry[1] <= now:
+                    slot.discard(email)
+                    if self._entries.pop(email, None) is not None:
+                        expired += 1
+        self._tick = max(self._tick, last_passed)
+        return expired
+
+    async def store(self, email: str, otp: str, expiry_seconds: int):
+        self._advance()
+        expires_at = time.monotonic() + expiry_seconds
+        self._entries[email] = (hash_otp(email, otp), expires_at)
+        self._wheel[int(expires_at // self.TICK_SECONDS) % self.SLOTS].add(email)
+
+    async def consume(self, email: str, otp: str) -> bool:
+        self._advance()
+        entry = self._entries.get(email)
+        if entry is None or entry[1] <= time.monotonic():
+            return False
+        if not hmac.compare_digest(entry[0], hash_otp(email, otp)):
+            return False
+        del self._entries[email]
+        return True
+
+    async def delete(self, email: str):
+        self._entries.pop(email, None)
+
+    async def cleanup_expired(self) -> int:
+        return self._advance()
+
+def _create_store() -> OTPStore:
+    if settings.OTP_STORE_BACKEND == "memory":
+        return InMemoryOTPStore()
+    return MongoOTPStore()
+
+# Create a singleton instance
+otp_store = _create_store()
@@ -0,0 +1,150 @@
+"""
+Sliding-window rate limiting for the auth endpoints
+Limits are checked before any password hashing, database or SMTP work is done
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple, Deque
+
+from pymongo import ReturnDocument
+from config.database import get_database
+from config.settings import settings
+
+def parse_rate(rate: str) -> Tuple[int, int]:
+    """Parse a '<attempts>/<seconds>' rate string"""
+    attempts, seconds = rate.split('/')
+    return int(attempts), int(seconds)
+
+class InMemoryRateLimitBackend:
+    """Exact sliding-window log per key, local to one worker process"""
+    SWEEP_EVERY = 1000
+
+    def __init__(self):
+        # key -> (window in seconds, attempt timestamps)
+        self._hits: Dict[str, Tuple[int, Deque[float]]] = {}
+        self._calls = 0
+
+    async def hit(self, key: str, limit: int, window_seconds: int) -> Optional[float]:
+        """Record an attempt, returns seconds to wait if the key is over its limit"""
+        now = time.monotonic()
+        self._calls += 1
+        if self._calls % self.SWEEP_EVERY == 0:
+            self._sweep(now)
+
+        _, hits = self._hits.setdefault(key, (window_seconds, deque()))
+        while hits and hits[0] <= now - window_seconds:
+            hits.popleft()
+
+        if len(hits) >= limit:
+            return hits[0] + window_seconds - now
+
+        hits.append(now)
+        return None
+
+    def _sweep(self, now: float):
+        """Forget keys without recent attempts"""
+        idle = [
+            key for key, (window_seconds, hits) in self._hits.items()
+            if not hits or hits[-1] <= now - window_seconds
+        ]
+        for key in idle:
+            del self._hits[key]
+
+class MongoRateLimitBackend:
+    """
+    Sliding-window counter shared by all workers.
+    Counts attempts in fixed windows and weights the previous window by how
+    much of it still overlaps the sliding window.
+    """
+    async def hit(self, key: str, limit: int, window_seconds: int) -> Optional[float]:
+        """Record an attempt, returns seconds to wait if the key is over its limit"""
+        db = await get_database()
+        now = time.time()
+        window_start = int(now // window_seconds) * window_seconds
+        previous_start = window_start - window_seconds
+
+        current, previous = await asyncio.gather(
+            db.rate_limits.find_one_and_update(
+                {"_id": f"{key}:{window_start}"},
+                {
+                    "$inc": {"count": 1},
+                    "$setOnInsert": {
+                        "expires_at": datetime.fromtimestamp(window_start + 2 * window_seconds, tz=timezone.utc)
+                    }
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            ),
+            db.rate_limits.find_one({"_id": f"{key}:{previous_start}"}, {"count": 1})
+        )
+
+        previous_count = previous["count"] if previous else 0
+        overlap = 1 - (now - window_start) / window_seconds
+        # The current attempt is already included in the count
+        estimated = previous_count * overlap + current["count"] - 1
+
+        if estimated < limit:
+            return None
+
+        if current["count"] - 1 >= limit:
+            return window_start + window_seconds - now
+        # Wait until enough of the previous window has slid out
+        needed_overlap = (limit - (current["count"] - 1)) / previous_count
+        return max(window_start + (1 - needed_overlap) * window_seconds - now, 1)
+
+class RateLimiter:
+    def __init__(self, backend):
+        self.backend = backend
+        self.rules: Dict[str, Tuple[int, int]] = {
+            "login": parse_rate(settings.RATE_LIMIT_LOGIN),
+            "otp_send": parse_rate(settings.RATE_LIMIT_OTP_SEND),
+            "otp_verify": parse_rate(settings.RATE_LIMIT_OTP_VERIFY),
+            "signup": parse_rate(settings.RATE_LIMIT_SIGNUP),
+        }
+
+        # Metrics
+        self.allowed: Dict[str, int] = {rule: 0 for rule in self.rules}
+        self.rejected: Dict[str, int] = {rule: 0 for rule in self.rules}
+
+    async def check(self, rule: str, email: Optional[str], client_ip: Optional[str]) -> Optional[int]:
+        """
+        Count an attempt against the email and the client IP.
+        The IP limit is RATE_LIMIT_IP_FACTOR times looser, since many users can share one IP.
+
+        Returns:
+            Seconds the client should wait before retrying, or None if allowed
+        """
+        limit, window_seconds = self.rules[rule]
+        checks = []
+        if email:
+            checks.append(self.backend.hit(f"{rule}:email:{email.lower()}", limit, window_seconds))
+        if client_ip:
+            checks.append(self.backend.hit(f"{rule}:ip:{client_ip}", limit * settings.RATE_LIMIT_IP_FACTOR, window_seconds))
+
+        waits = [wait for wait in await asyncio.gather(*checks) if wait is not None]
+        retry_after = max(waits) if waits else None
+
+        if retry_after is None:
+            self.allowed[rule] += 1
+            return None
+
+        self.rejected[rule] += 1
+        return max(math.ceil(retry_after), 1)
+
+    def get_stats(self) -> dict:
+        return {
+            "backend": settings.RATE_LIMIT_BACKEND,
+            "allowed": dict(self.allowed),
+            "rejected": dict(self.rejected),
+        }
+
+def _create_backend():
+    if settings.RATE_LIMIT_BACKEND == "mongo":
+        return MongoRateLimitBackend()
+    return InMemoryRateLimitBackend()
+
+# Create a singleton instance
+rate_limiter = RateLimiter(_create_backend())
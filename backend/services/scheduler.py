@@ -0,0 +1,124 @@
+"""
+Background scheduler for housekeeping jobs
+Each job runs on its own interval (plus jitter) and only on the worker that
+holds its leader lock in the scheduler_locks collection
+"""
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+from pymongo.errors import DuplicateKeyError
+from config.database import get_database
+from config.settings import settings
+
+class MaintenanceJob:
+    def __init__(self, name: str, func: Callable[[], Awaitable[Optional[int]]], interval_seconds: float):
+        self.name = name
+        self.func = func
+        self.interval_seconds = interval_seconds
+
+        # Metrics
+        self.runs = 0
+        self.skipped = 0  # Another worker held the lock
+        self.failures = 0
+        self.total_rows = 0
+        self.last_rows: Optional[int] = None
+        self.last_duration_ms: Optional[float] = None
+        self.last_run_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+
+    def get_stats(self) -> dict:
+        return {
+            "interval_seconds": self.interval_seconds,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "total_rows": self.total_rows,
+            "last_rows": self.last_rows,
+            "last_duration_ms": self.last_duration_ms,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_error": self.last_error,
+        }
+
+class MaintenanceScheduler:
+    def __init__(self):
+        # Identifies this worker process in the leader locks
+        self.owner = uuid.uuid4().hex
+        self.jobs: Dict[str, MaintenanceJob] = {}
+        self._tasks = []
+
+    def register(self, name: str, func: Callable[[], Awaitable[Optional[int]]], interval_seconds: float):
+        """Register a job; func returns the number of rows it touched (or None)"""
+        self.jobs[name] = MaintenanceJob(name, func, interval_seconds)
+
+    async def start(self):
+        for job in self.jobs.values():
+            self._tasks.append(asyncio.create_task(self._loop(job)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def _loop(self, job: MaintenanceJob):
+        while True:
+            # Jitter spreads the workers (and the jobs) out instead of firing together
+            await asyncio.sleep(job.interval_seconds + random.uniform(0, settings.MAINTENANCE_JITTER_SECONDS))
+            try:
+                await self.run_once(job)
+            except Exception as e:
+                print(f"Warning: Maintenance job {job.name} failed: {str(e)}")
+
+    async def _acquire_lock(self, job: MaintenanceJob) -> bool:
+        """Take or renew the job's leader lock, held until just after the leader's next run"""
+        db = await get_database()
+        now = datetime.now(tz=timezone.utc)
+        try:
+            # Matches a lock that is ours or has lapsed; otherwise the upsert collides on _id
+            await db.scheduler_locks.update_one(
+                {"_id": job.name, "$or": [{"owner": self.owner}, {"locked_until": {"$lt": now}}]},
+                {"$set": {
+                    "owner": self.owner,
+                    "locked_until": now + timedelta(
+                        seconds=job.interval_seconds + settings.MAINTENANCE_JITTER_SECONDS
+                    )
+                }},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def run_once(self, job: MaintenanceJob):
+        if not await self._acquire_lock(job):
+            job.skipped += 1
+            return
+
+        started = time.perf_counter()
+        job.last_run_at = datetime.now(tz=timezone.utc)
+        try:
+            rows = await job.func()
+            job.last_rows = rows
+            job.total_rows += rows or 0
+            job.last_error = None
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            raise
+        finally:
+            job.runs += 1
+            job.last_duration_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    def get_stats(self) -> dict:
+        return {name: job.get_stats() for name, job in self.jobs.items()}
+
+# Create a singleton instance
+maintenance_scheduler = MaintenanceScheduler()
@@ -0,0 +1,330 @@
+"""
+Background mirroring of form submissions to Google Sheets
+Each form entry is written with a pending sheets_sync state in the same insert,
+so the entry itself is the outbox record. One worker appends pending entries
+to the form's sheet with retry and backoff, and a periodic sweep picks up
+entries left over by restarts, a full queue or a dead worker.
+Rows are batched per sheet and appended with one API call once a batch is
+full or its oldest row has waited long enough.
+An append that timed out may still have gone through, and a worker may die
+between appending and marking its entries synced, so entries claimed more
+than once are checked against the sheet's Email column (one submission per
+user and form) before being appended again.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set
+
+import pytz
+from pymongo import ReturnDocument
+from config.database import get_database
+from config.settings import settings
+from services.form_registry import form_registry
+from services.form_service import prepare_sheet_submission
+from services.google_sheets_service import google_sheets_service
+
+def pending_sheets_sync(now: datetime) -> dict:
+    """Initial sheets_sync state stored on a new form entry"""
+    return {
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now
+    }
+
+class SheetBatch:
+    """Rows waiting to be appended to one sheet"""
+    def __init__(self, questions: List[Dict[str, Any]]):
+        self.questions = questions  # Headers, if the sheet has to be created
+        self.entries: List[dict] = []
+        self.rows: List[List[str]] = []
+        self.started = time.monotonic()
+
+class SheetsSyncWorker:
+    def __init__(self):
+        self.queue: Optional[asyncio.Queue] = None
+        self._queued_ids: Set[Any] = set()
+        self._tasks = []
+        # Open batches of claimed entries, keyed by form (one sheet per form)
+        self._batches: Dict[str, SheetBatch] = {}
+
+        # Metrics
+        self.enqueued = 0
+        self.synced = 0
+        self.retried = 0
+        self.failed = 0
+        # Unsynced entries, counted by each sweep
+        self.backlog = 0
+        self.oldest_pending_at: Optional[datetime] = None
+        self.last_lag_seconds: Optional[float] = None  # Submission to sheet, oldest entry of the last flush
+        self.sheet_stats: Dict[str, dict] = {}
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=settings.SHEETS_SYNC_QUEUE_MAX_SIZE)
+        await self._sweep()
+        self._tasks = [
+            asyncio.create_task(self._worker()),
+            asyncio.create_task(self._sweep_loop())
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+        # Rows already claimed are flushed rather than left waiting for their lease to expire
+        for form_name in list(self._batches):
+            try:
+                await self._flush(form_name)
+            except Exception as e:
+                print(f"Warning: Failed to flush Sheets batch for {form_name}: {str(e)}")
+
+    def _put(self, entry_id) -> bool:
+        if self.queue is None or entry_id in self._queued_ids:
+            return False
+        try:
+            self.queue.put_nowait(entry_id)
+        except asyncio.QueueFull:
+            # Stays pending on the entry, the next sweep will queue it
+            return False
+        self._queued_ids.add(entry_id)
+        return True
+
+    def enqueue(self, entry_id):
+        """Queue a freshly inserted entry (its pending state is already stored)"""
+        self.enqueued += 1
+        self.backlog += 1
+        self._put(entry_id)
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(settings.SHEETS_SYNC_SWEEP_SECONDS)
+            try:
+                await self._sweep()
+            except Exception as e:
+                print(f"Warning: Sheets sync sweep failed: {str(e)}")
+
+    async def _sweep(self):
+        """Queue due entries, including ones whose syncing worker died"""
+        db = await get_database()
+        now = datetime.now(tz=timezone.utc)
+
+        self.backlog = await db.form_entries.count_documents({"sheets_sync.status": {"$in": ["pending", "syncing"]}})
+        oldest = await db.form_entries.find_one(
+            {"sheets_sync.status": {"$in": ["pending", "syncing"]}},
+            {"submitted_at": 1},
+            sort=[("submitted_at", 1)]
+        )
+        self.oldest_pending_at = oldest["submitted_at"].replace(tzinfo=timezone.utc) if oldest else None
+
+        cursor = db.form_entries.find(
+            {"$or": [
+                {"sheets_sync.status": "pending", "sheets_sync.next_attempt_at": {"$lte": now}},
+                {"sheets_sync.status": "syncing", "sheets_sync.lease_until": {"$lt": now}}
+            ]},
+            {"_id": 1}
+        ).sort("sheets_sync.next_attempt_at", 1).limit(settings.SHEETS_SYNC_QUEUE_MAX_SIZE)
+
+        async for doc in cursor:
+            if not self._put(doc["_id"]):
+                if self.queue.full():
+                    break
+
+    async def _claim(self, entry_id) -> Optional[dict]:
+        """Take ownership of an entry so it is appended to the sheet only once"""
+        db = await get_database()
+        now = datetime.now(tz=timezone.utc)
+        return await db.form_entries.find_one_and_update(
+            {
+                "_id": entry_id,
+                "$or": [
+                    {"sheets_sync.status": "pending"},
+                    {"sheets_sync.status": "syncing", "sheets_sync.lease_until": {"$lt": now}}
+                ]
+            },
+            {
+                "$set": {
+                    "sheets_sync.status": "syncing",
+                    "sheets_sync.lease_until": now + timedelta(seconds=settings.SHEETS_SYNC_LEASE_SECONDS)
+                },
+                # More than one claim means an earlier append may have gone through
+                "$inc": {"sheets_sync.claims": 1}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _next_flush_in(self) -> Optional[float]:
+        """Seconds until the oldest open batch is due, None when there is none"""
+        if not self._batches:
+            return None
+        oldest = min(batch.started for batch in self._batches.values())
+        return max(oldest + settings.SHEETS_BATCH_MAX_WAIT_SECONDS - time.monotonic(), 0)
+
+    async def _worker(self):
+        while True:
+            try:
+                entry_id = await asyncio.wait_for(self.queue.get(), self._next_flush_in())
+            except asyncio.TimeoutError:
+                entry_id = None
+
+            if entry_id is not None:
+                self._queued_ids.discard(entry_id)
+                try:
+                    entry = await self._claim(entry_id)
+                    if entry:
+                        await self._add(entry)
+                except Exception as e:
+                    print(f"Warning: Sheets sync worker error: {str(e)}")
+                finally:
+                    self.queue.task_done()
+
+            await self._flush_due()
+
+    async def _add(self, entry: dict):
+        """Add a claimed entry's row to its sheet's batch, flushing the batch once full"""
+        try:
+            form = await form_registry.get(entry["form_id"])
+            if not form:
+                raise Exception(f"Form '{entry['form_id']}' not found")
+
+            questions, responses = prepare_sheet_submission(form, entry["responses"])
+            submitted_at = entry["submitted_at"].replace(tzinfo=timezone.utc)
+            row = google_sheets_service.build_submission_row(
+                entry["user_email"],
+                questions,
+                responses,
+                submitted_at.astimezone(pytz.timezone('Asia/Kolkata'))
+            )
+        except Exception as e:
+            await self._retry_or_fail(entry, e)
+            return
+
+        batch = self._batches.get(form["name"])
+        if batch is None:
+            batch = self._batches[form["name"]] = SheetBatch(questions)
+        batch.entries.append(entry)
+        batch.rows.append(row)
+
+        if len(batch.rows) >= settings.SHEETS_BATCH_MAX_ROWS:
+            await self._flush(form["name"])
+
+    async def _flush_due(self):
+        now = time.monotonic()
+        for form_name, batch in list(self._batches.items()):
+            if now - batch.started >= settings.SHEETS_BATCH_MAX_WAIT_SECONDS:
+                await self._flush(form_name)
+
+    async def _flush(self, form_name: str):
+        """Append a whole batch in one API call, then mark its entries synced"""
+        batch = self._batches.pop(form_name)
+        stats = self.sheet_stats.setdefault(form_name, {
+            "flushes": 0, "failed_flushes": 0, "rows": 0, "skipped_rows": 0, "last_flush_rows": 0, "max_flush_rows": 0,
+            "last_flush_ms": None, "max_flush_ms": 0.0
+        })
+        started = time.perf_counter()
+        try:
+            rows = await self._rows_to_append(form_name, batch)
+            if rows:
+                await google_sheets_service.append_rows(form_name, batch.questions, rows)
+        except Exception as e:
+            # Either nothing was appended or the append may have timed out after going
+            # through; every entry of the batch is retried and checked against the sheet
+            stats["failed_flushes"] += 1
+            for entry in batch.entries:
+                await self._retry_or_fail(entry, e)
+            return
+        
+        already_appended = len(batch.rows) - len(rows)
+        if already_appended:
+            stats["skipped_rows"] += already_appended
+
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        stats["flushes"] += 1
+        stats["rows"] += len(rows)
+        stats["last_flush_rows"] = len(rows)
+        stats["max_flush_rows"] = max(stats["max_flush_rows"], len(rows))
+        stats["last_flush_ms"] = elapsed_ms
+        stats["max_flush_ms"] = max(stats["max_flush_ms"], elapsed_ms)
+
+        await self._mark_synced(batch.entries)
+
+    async def _rows_to_append(self, form_name: str, batch: SheetBatch) -> List[List[str]]:
+        """Rows of a batch minus those a previous attempt already appended"""
+        if all(entry["sheets_sync"].get("claims", 1) <= 1 for entry in batch.entries):
+            return batch.rows
+        
+        emails = await google_sheets_service.fetch_submitted_emails(form_name)
+        return [
+            row for entry, row in zip(batch.entries, batch.rows)
+            if entry["sheets_sync"].get("claims", 1) <= 1 or entry["user_email"] not in emails
+        ]
+
+    async def _mark_synced(self, entries: List[dict]):
+        db = await get_database()
+        now = datetime.now(tz=timezone.utc)
+        self.synced += len(entries)
+        self.backlog = max(self.backlog - len(entries), 0)
+        self.last_lag_seconds = round(
+            (now - min(entry["submitted_at"] for entry in entries).replace(tzinfo=timezone.utc)).total_seconds(), 3
+        )
+        await db.form_entries.update_many(
+            {"_id": {"$in": [entry["_id"] for entry in entries]}},
+            {"$set": {"sheets_sync.status": "synced", "sheets_sync.synced_at": now},
+             "$unset": {"sheets_sync.lease_until": "", "sheets_sync.next_attempt_at": ""}}
+        )
+
+    async def _retry_or_fail(self, entry: dict, error: Exception):
+        db = await get_database()
+        attempts = entry["sheets_sync"]["attempts"] + 1
+        if attempts >= settings.SHEETS_SYNC_MAX_ATTEMPTS:
+            self.failed += 1
+            self.backlog = max(self.backlog - 1, 0)
+            print(f"❌ Giving up on syncing entry {entry['_id']} to Google Sheets after {attempts} attempts: {str(error)}")
+            await db.form_entries.update_one(
+                {"_id": entry["_id"]},
+                {"$set": {
+                    "sheets_sync.status": "failed",
+                    "sheets_sync.attempts": attempts,
+                    "sheets_sync.last_error": str(error)
+                }}
+            )
+            return
+
+        self.retried += 1
+        delay = settings.SHEETS_SYNC_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+        print(f"Warning: Failed to push entry {entry['_id']} to Google Sheets (attempt {attempts}), retrying in {delay:.0f}s: {str(error)}")
+        await db.form_entries.update_one(
+            {"_id": entry["_id"]},
+            {"$set": {
+                "sheets_sync.status": "pending",
+                "sheets_sync.attempts": attempts,
+                "sheets_sync.last_error": str(error),
+                "sheets_sync.next_attempt_at": datetime.now(tz=timezone.utc) + timedelta(seconds=delay)
+            }}
+        )
+        asyncio.get_running_loop().call_later(delay, self._put, entry["_id"])
+
+    def get_stats(self) -> dict:
+        backlog_age = None
+        if self.oldest_pending_at:
+            backlog_age = round((datetime.now(tz=timezone.utc) - self.oldest_pending_at).total_seconds(), 1)
+        return {
+            "queued": self.queue.qsize() if self.queue else 0,
+            "enqueued": self.enqueued,
+            "synced": self.synced,
+            "retried": self.retried,
+            "failed": self.failed,
+            "backlog": self.backlog,
+            "backlog_age_seconds": backlog_age,
+            "last_lag_seconds": self.last_lag_seconds,
+            "open_batches": {form_name: len(batch.rows) for form_name, batch in self._batches.items()},
+            "sheets": self.sheet_stats,
+        }
+
+# Create a singleton instance
+sheets_sync = SheetsSyncWorker()
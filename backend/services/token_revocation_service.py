@@ -0,0 +1,140 @@
+"""
+Refresh token revocation store
+Revoked token IDs (jti) are persisted in Mongo and mirrored in memory,
+so checking a token costs a dictionary lookup instead of a database round trip
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from pymongo.errors import DuplicateKeyError
+from config.database import get_database
+from config.settings import settings
+
+class TokenRevocationStore:
+    def __init__(self):
+        # jti -> token expiry (unix time); entries are useless once the token has expired
+        self._revoked: Dict[str, float] = {}
+        # jti -> revocation time (unix time), only kept while the refresh grace period lasts
+        self._revoked_at: Dict[str, float] = {}
+        self._last_synced_at: Optional[datetime] = None
+        self._sync_task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.checks = 0
+        self.rejections = 0
+        self.syncs = 0
+
+    async def start(self):
+        """Load current revocations and keep following other workers' revocations"""
+        await self.sync()
+        if self._sync_task is None:
+            self._sync_task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self):
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            try:
+                await self._sync_task
+            except asyncio.CancelledError:
+                pass
+            self._sync_task = None
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(settings.TOKEN_REVOCATION_SYNC_SECONDS)
+            try:
+                await self.sync()
+            except Exception as e:
+                print(f"Warning: Failed to sync revoked tokens: {str(e)}")
+
+    async def sync(self):
+        """Pull revocations made since the last sync (by any worker) and drop expired ones"""
+        db = await get_database()
+        started_at = datetime.now(tz=timezone.utc)
+        query = {"expires_at": {"$gt": started_at}}
+        if self._last_synced_at is not None:
+            # Overlap the previous sync a little to absorb clock skew between workers
+            margin = timedelta(seconds=settings.TOKEN_REVOCATION_SYNC_SECONDS)
+            query["revoked_at"] = {"$gte": self._last_synced_at - margin}
+
+        cursor = db.revoked_tokens.find(query, {"expires_at": 1, "revoked_at": 1})
+        async for doc in cursor:
+            self._revoked[doc["_id"]] = doc["expires_at"].replace(tzinfo=timezone.utc).timestamp()
+            self._remember_revoked_at(doc)
+
+        self._last_synced_at = started_at
+
+        self._prune()
+        self.syncs += 1
+
+    def _prune(self):
+        now = time.time()
+        expired = [jti for jti, expires_at in self._revoked.items() if expires_at <= now]
+        for jti in expired:
+            del self._revoked[jti]
+
+        grace_started = now - settings.REFRESH_TOKEN_REUSE_GRACE_SECONDS
+        for jti in [jti for jti, revoked_at in self._revoked_at.items() if revoked_at <= grace_started]:
+            del self._revoked_at[jti]
+
+    def _remember_revoked_at(self, doc: dict):
+        revoked_at = doc["revoked_at"].replace(tzinfo=timezone.utc).timestamp()
+        if revoked_at > time.time() - settings.REFRESH_TOKEN_REUSE_GRACE_SECONDS:
+            self._revoked_at[doc["_id"]] = revoked_at
+
+    def is_revoked(self, jti: str) -> bool:
+        """Check a token ID against the in-memory mirror"""
+        self.checks += 1
+        if jti in self._revoked:
+            self.rejections += 1
+            return True
+        return False
+
+    async def revoke(self, jti: str, expires_at: float) -> bool:
+        """
+        Revoke a token ID until the token expires
+
+        Returns:
+            False if the token was already revoked (e.g. a refresh token replayed
+            on another worker before the in-memory mirrors synced)
+        """
+        db = await get_database()
+        revoked_at = datetime.now(tz=timezone.utc)
+        try:
+            await db.revoked_tokens.insert_one({
+                "_id": jti,
+                "expires_at": datetime.fromtimestamp(expires_at, tz=timezone.utc),
+                "revoked_at": revoked_at
+            })
+            self._revoked_at[jti] = revoked_at.timestamp()
+            return True
+        except DuplicateKeyError:
+            # Revoked by another request, possibly a moment ago on another worker
+            doc = await db.revoked_tokens.find_one({"_id": jti}, {"revoked_at": 1})
+            if doc is not None:
+                self._remember_revoked_at(doc)
+            return False
+        finally:
+            self._revoked[jti] = expires_at
+
+    def in_grace_period(self, jti: str) -> bool:
+        """
+        Whether a revoked token ID was revoked less than REFRESH_TOKEN_REUSE_GRACE_SECONDS ago
+        Concurrent refreshes (several tabs, or requests racing on a 401) present the
+        same refresh token, only the first one rotates it
+        """
+        revoked_at = self._revoked_at.get(jti)
+        return revoked_at is not None and time.time() - revoked_at < settings.REFRESH_TOKEN_REUSE_GRACE_SECONDS
+
+    def get_stats(self) -> dict:
+        return {
+            "revoked": len(self._revoked),
+            "checks": self.checks,
+            "rejections": self.rejections,
+            "syncs": self.syncs,
+        }
+
+# Create a singleton instance
+revocation_store = TokenRevocationStore()
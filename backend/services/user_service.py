@@ -1,10 +1,23 @@
 import pytz
 from config.database import get_database
 from models.user import UserInDB, UserCreate
-from services.auth_service import get_password_hash
+from services.auth_service import get_password_hash_async
+from services.cache import TTLCache
+from config.settings import settings
 from typing import Optional
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ReturnDocument
+
+# Authenticated users by user_id, so get_current_user does not hit Mongo on every request
+principal_cache = TTLCache(
+    max_size=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
+
+def invalidate_principal(user_id: str) -> bool:
+    """Evict a user from the principal cache"""
+    return principal_cache.invalidate(str(user_id))
 
 async def get_user_by_email(email: str) -> Optional[UserInDB]:
     """Get user by email"""
@@ -22,6 +35,17 @@ async def get_user_by_id(user_id: str) -> Optional[UserInDB]:
         return UserInDB(**user_dict)
     return None
 
+async def get_principal(user_id: str) -> Optional[UserInDB]:
+    """Get user by ID for request authentication, served from the principal cache when possible"""
+    user = principal_cache.get(user_id)
+    if user is not None:
+        return user
+    
+    user = await get_user_by_id(user_id)
+    if user is not None:
+        principal_cache.set(user_id, user)
+    return user
+
 async def get_user_by_google_id(google_id: str) -> Optional[UserInDB]:
     """Get user by Google ID"""
     db = await get_database()
@@ -37,7 +61,7 @@ async def create_user(user_data: UserCreate) -> UserInDB:
     user_dict = {
         "email": user_data.email,
         "full_name": user_data.full_name,
-        "hashed_password": get_password_hash(user_data.password),
+        "hashed_password": await get_password_hash_async(user_data.password),
         "is_active": True,
         "is_verified": False,
         "created_at": datetime.now(tz = pytz.timezone('Asia/Kolkata')),
@@ -75,9 +99,32 @@ async def update_user(user_id: str, update_data: dict) -> Optional[UserInDB]:
     
     update_data["updated_at"] = datetime.now(tz = pytz.timezone('Asia/Kolkata'))
     
-    await db.users.update_one(
+    user_dict = await db.users.find_one_and_update(
         {"_id": ObjectId(user_id)},
-        {"$set": update_data}
+        {"$set": update_data},
+        return_document=ReturnDocument.AFTER
     )
+    invalidate_principal(user_id)
+    
+    if user_dict:
+        return UserInDB(**user_dict)
+    return None
+
+async def update_password(email: str, hashed_password: str) -> bool:
+    """Set a new password hash for the user with this email"""
+    db = await get_database()
+    
+    user_dict = await db.users.find_one_and_update(
+        {"email": email},
+        {"$set": {
+            "hashed_password": hashed_password,
+            "updated_at": datetime.now(tz = pytz.timezone('Asia/Kolkata'))
+        }},
+        projection={"_id": 1}
+    )
+    
+    if not user_dict:
+        return False
     
-    return await get_user_by_id(user_id)
+    invalidate_principal(user_dict["_id"])
+    return True
@@ -0,0 +1,60 @@
+"""
+Shared fixtures
+Tests run against an in-memory MongoDB (mongomock) and local stand-ins for
+Google and SMTP, so no external service is needed:
+    pip install -r requirements-dev.txt && python -m pytest
+"""
+import socket
+import threading
+import time
+
+import pytest
+import uvicorn
+from mongomock_motor import AsyncMongoMockClient
+
+from config import database
+from config.settings import settings
+
+@pytest.fixture
+def mongo():
+    """A fresh in-memory database for the test, returned by get_database()"""
+    database.db.client = AsyncMongoMockClient(tz_aware=False)
+    yield database.db.client.aero_club
+    database.db.client = None
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture
+def serve_app():
+    """Serve ASGI apps (the benchmark stubs) on their own thread, serve_app(app) returns the base URL"""
+    servers = []
+
+    def serve(app) -> str:
+        port = free_port()
+        server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.01)
+        servers.append((server, thread))
+        return f"http://127.0.0.1:{port}"
+
+    yield serve
+    for server, thread in servers:
+        server.should_exit = True
+        thread.join()
+
+@pytest.fixture
+def smtp_settings(monkeypatch):
+    """smtp_settings(port) points the email settings at a local SMTP stand-in"""
+    def configure(port: int):
+        monkeypatch.setattr(settings, "SMTP_HOST", "127.0.0.1")
+        monkeypatch.setattr(settings, "SMTP_PORT", port)
+        monkeypatch.setattr(settings, "SMTP_USE_TLS", False)
+        monkeypatch.setattr(settings, "SMTP_USER", None)
+        monkeypatch.setattr(settings, "SMTP_PASSWORD", None)
+        monkeypatch.setattr(settings, "SMTP_FROM_EMAIL", "club@example.com")
+    return configure
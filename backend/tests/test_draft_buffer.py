@@ -0,0 +1,96 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from services.draft_buffer import DraftBuffer
+
+FORM_ID, USER_ID = "form", "user"
+
+async def seed(db, revision: int, responses: dict, last_saved: datetime):
+    await db.form_drafts.create_index([("form_id", 1), ("user_id", 1)], unique=True)
+    await db.form_drafts.insert_one({
+        "form_id": FORM_ID, "user_id": USER_ID, "responses": responses,
+        "revision": revision, "last_saved": last_saved
+    })
+
+def stall_bulk_write(monkeypatch, db, release: asyncio.Event):
+    collection_type = type(db.form_drafts)
+    bulk_write = collection_type.bulk_write
+
+    async def stalled(self, *args, **kwargs):
+        await release.wait()
+        return await bulk_write(self, *args, **kwargs)
+    monkeypatch.setattr(collection_type, "bulk_write", stalled)
+
+def test_batch_being_flushed_stays_visible(mongo, monkeypatch):
+    async def run():
+        now = datetime.now()
+        await seed(mongo, 1, {"a": "1"}, now)
+        buffer = DraftBuffer()
+        buffer.remember(FORM_ID, USER_ID, 1)
+        assert buffer.patch(FORM_ID, USER_ID, 1, {"a": "2"}, [], now) == 2
+
+        release = asyncio.Event()
+        stall_bulk_write(monkeypatch, mongo, release)
+        flush = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0)
+
+        # Mongo still holds revision 1, the draft as read must not
+        pending = buffer.get(FORM_ID, USER_ID)
+        assert pending.revision == 2
+        assert pending.overlay({"a": "1"}) == {"a": "2"}
+
+        # Patches build on the revision in flight, and show up on top of it
+        assert buffer.patch(FORM_ID, USER_ID, 2, {"b": "x"}, [], now) == 3
+        pending = buffer.get(FORM_ID, USER_ID)
+        assert pending.revision == 3
+        assert pending.overlay({"a": "1"}) == {"a": "2", "b": "x"}
+        # The entries themselves are untouched by the combined view
+        assert buffer.get(FORM_ID, USER_ID) is not buffer._pending[(FORM_ID, USER_ID)]
+
+        release.set()
+        await flush
+        await buffer.flush()
+        draft = await mongo.form_drafts.find_one({})
+        assert draft["responses"] == {"a": "2", "b": "x"}
+        assert draft["revision"] == 3
+        assert buffer.get(FORM_ID, USER_ID) is None
+
+    asyncio.run(run())
+
+def test_stale_full_save_does_not_overwrite_newer_draft(mongo):
+    async def run():
+        staged_at = datetime.now()
+        await seed(mongo, 1, {"a": "1"}, staged_at - timedelta(seconds=5))
+        buffer = DraftBuffer()
+        buffer.remember(FORM_ID, USER_ID, 1)
+        assert buffer.save_full(FORM_ID, USER_ID, {"a": "old"}, staged_at) == 2
+
+        # Another worker writes the draft through after this save was staged
+        await mongo.form_drafts.update_one({}, {"$set": {
+            "responses": {"a": "newer"}, "revision": 5, "last_saved": staged_at + timedelta(seconds=1)
+        }})
+        await buffer.flush()
+
+        draft = await mongo.form_drafts.find_one({})
+        assert draft["responses"] == {"a": "newer"}
+        assert draft["revision"] == 5
+        # The client's revision is stale: its next patch is written through and fails there
+        assert buffer.patch(FORM_ID, USER_ID, 2, {"a": "x"}, [], datetime.now()) is None
+
+    asyncio.run(run())
+
+def test_stale_full_save_replaces_older_draft(mongo):
+    async def run():
+        staged_at = datetime.now()
+        await seed(mongo, 4, {"a": "elsewhere"}, staged_at - timedelta(seconds=5))
+        buffer = DraftBuffer()
+        buffer.remember(FORM_ID, USER_ID, 1)
+        buffer.save_full(FORM_ID, USER_ID, {"a": "mine"}, staged_at)
+        await buffer.flush()
+
+        draft = await mongo.form_drafts.find_one({})
+        assert draft["responses"] == {"a": "mine"}
+        # Revisions only move forward
+        assert draft["revision"] == 5
+
+    asyncio.run(run())
@@ -0,0 +1,44 @@
+import asyncio
+
+from benchmarks.stub_smtp_server import StubSMTPServer
+from services.email_service import EmailDeliveryQueue
+
+def test_otp_is_never_written_to_the_outbox(mongo, smtp_settings):
+    async def run():
+        stub = StubSMTPServer()
+        server = await stub.start(0)
+        smtp_settings(server.sockets[0].getsockname()[1])
+        queue = EmailDeliveryQueue()
+        queue.queue = asyncio.Queue()
+        try:
+            message_id = await queue.enqueue_otp("pilot@example.com", "482915", "Pilot")
+            doc = await mongo.email_outbox.find_one({"_id": message_id})
+            assert "482915" not in repr(doc)
+
+            await queue._deliver(await queue._claim(message_id))
+        finally:
+            await queue.session.close()
+            server.close()
+            await server.wait_closed()
+
+        assert len(stub.messages) == 1 and b"482915" in stub.messages[0]
+        assert await mongo.email_outbox.count_documents({}) == 0
+    asyncio.run(run())
+
+def test_otp_email_is_left_to_the_worker_holding_the_code(mongo):
+    async def run():
+        owner, other = EmailDeliveryQueue(), EmailDeliveryQueue()
+        owner.queue, other.queue = asyncio.Queue(), asyncio.Queue()
+        message_id = await owner.enqueue_otp("pilot@example.com", "482915")
+
+        await other._sweep()
+        assert other.queue.empty()
+        assert await other._claim(message_id) is None
+
+        # After a restart nobody holds the code, the email is dropped
+        restarted = EmailDeliveryQueue()
+        restarted.instance_id = owner.instance_id
+        await restarted._deliver(await restarted._claim(message_id))
+        doc = await mongo.email_outbox.find_one({"_id": message_id})
+        assert doc["status"] == "failed"
+    asyncio.run(run())
@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+import pytest
+
+from benchmarks.stub_google_oauth import create_app
+from config.settings import settings
+from services.google_auth_service import GoogleAuthService
+
+@pytest.fixture
+def jwks():
+    return {"keys": [{"kid": "key-1", "kty": "RSA", "n": "AQAB", "e": "AQAB"}]}
+
+@pytest.fixture
+def google(serve_app, monkeypatch, jwks):
+    base_url = serve_app(create_app(latency_ms=0, jwks=jwks))
+    monkeypatch.setattr(settings, "GOOGLE_JWKS_URL", f"{base_url}/oauth2/v3/certs")
+    return GoogleAuthService()
+
+def test_jwks_max_age_is_honoured(google):
+    async def run():
+        try:
+            assert await google.key_set.get_key("key-1") is not None
+            assert google.key_set.expires_at - time.monotonic() == pytest.approx(3600, abs=5)
+        finally:
+            await google.close()
+    asyncio.run(run())
+
+def test_unknown_kid_refetch_is_throttled(google, jwks):
+    async def run():
+        key_set = google.key_set
+        try:
+            await key_set.get_key("key-1")
+            assert key_set.refreshes == 1
+
+            # Right after a fetch, unknown key IDs do not reach Google
+            for _ in range(5):
+                assert await key_set.get_key("key-2") is None
+            assert key_set.refreshes == 1
+
+            # Once the throttle has passed, a rotated key is picked up
+            jwks["keys"].append({"kid": "key-2", "kty": "RSA", "n": "AQAB", "e": "AQAB"})
+            key_set.last_fetch_at -= settings.GOOGLE_JWKS_MIN_REFRESH_SECONDS
+            assert await key_set.get_key("key-2") is not None
+            assert key_set.refreshes == 2
+        finally:
+            await google.close()
+    asyncio.run(run())
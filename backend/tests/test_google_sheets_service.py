@@ -0,0 +1,55 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from benchmarks.stub_sheets_server import create_app
+from config.settings import settings
+from services.google_sheets_service import GoogleSheetsService
+
+QUESTIONS = [{"question_key": "q1", "question_text": "Question 1"}]
+
+@pytest.fixture
+def sheets(serve_app, monkeypatch):
+    monkeypatch.setattr(settings, "SHEETS_API_ENDPOINT", serve_app(create_app(latency_ms=0)) + "/")
+    service = GoogleSheetsService()
+    yield service
+    service.close()
+
+def row(service: GoogleSheetsService, email: str) -> list:
+    return service.build_submission_row(email, QUESTIONS, {"q1": "yes"}, datetime(2024, 1, 1))
+
+def test_known_sheet_needs_no_metadata_calls(sheets):
+    async def run():
+        # Tab list, tab creation, header row, then the append
+        await sheets.append_rows("Glider Build", QUESTIONS, [row(sheets, "a@example.com")])
+        assert sheets.requests == 4
+
+        await sheets.append_rows("Glider Build", QUESTIONS, [row(sheets, "b@example.com")])
+        assert sheets.requests == 5
+        assert sheets.metadata_fetches == 1
+    asyncio.run(run())
+
+def test_new_question_extends_cached_header(sheets):
+    async def run():
+        await sheets.append_rows("Glider Build", QUESTIONS, [row(sheets, "a@example.com")])
+        requests = sheets.requests
+
+        questions = QUESTIONS + [{"question_key": "q2", "question_text": "Question 2"}]
+        await sheets.append_rows("Glider Build", questions, [row(sheets, "b@example.com")])
+        # Header rewrite and the append, the tab list and old header come from the cache
+        assert sheets.requests == requests + 2
+        assert sheets._headers["Glider Build"] == ["Timestamp", "Email", "Question 1", "Question 2"]
+    asyncio.run(run())
+
+def test_batched_append_is_one_call(sheets):
+    async def run():
+        await sheets.append_rows("Glider Build", QUESTIONS, [row(sheets, "a@example.com")])
+        requests = sheets.requests
+
+        emails = [f"pilot{i}@example.com" for i in range(5)]
+        await sheets.append_rows("Glider Build", QUESTIONS, [row(sheets, email) for email in emails])
+        assert sheets.requests == requests + 1
+
+        assert await sheets.fetch_submitted_emails("Glider Build") == {"a@example.com", *emails}
+    asyncio.run(run())
@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import routes.auth
+from routes.auth import refresh_token, RefreshTokenRequest
+from services.auth_service import create_refresh_token, verify_token
+from services.token_revocation_service import TokenRevocationStore
+from services.user_service import principal_cache
+
+@pytest.fixture
+def store(monkeypatch):
+    store = TokenRevocationStore()
+    monkeypatch.setattr(routes.auth, "revocation_store", store)
+    principal_cache.clear()
+    return store
+
+async def seed_user(db) -> str:
+    result = await db.users.insert_one({"email": "pilot@example.com", "full_name": "Pilot", "is_active": True})
+    return str(result.inserted_id)
+
+def yield_on_insert(monkeypatch, db):
+    """Let the event loop switch requests between the revocation check and the insert"""
+    collection_type = type(db.revoked_tokens)
+    insert_one = collection_type.insert_one
+
+    async def yielding(self, *args, **kwargs):
+        await asyncio.sleep(0)
+        return await insert_one(self, *args, **kwargs)
+    monkeypatch.setattr(collection_type, "insert_one", yielding)
+
+def test_concurrent_refreshes_get_the_same_successor(mongo, store, monkeypatch):
+    async def run():
+        user_id = await seed_user(mongo)
+        token = create_refresh_token({"sub": "pilot@example.com", "user_id": user_id})
+        yield_on_insert(monkeypatch, mongo)
+
+        first, second = await asyncio.gather(
+            refresh_token(RefreshTokenRequest(refresh_token=token)),
+            refresh_token(RefreshTokenRequest(refresh_token=token)),
+        )
+
+        successors = {verify_token(t.refresh_token, "refresh").jti for t in (first, second)}
+        assert len(successors) == 1
+        assert verify_token(token, "refresh").jti not in successors
+    asyncio.run(run())
+
+def test_rotated_token_is_rejected_after_grace_period(mongo, store, monkeypatch):
+    async def run():
+        user_id = await seed_user(mongo)
+        token = create_refresh_token({"sub": "pilot@example.com", "user_id": user_id})
+        await refresh_token(RefreshTokenRequest(refresh_token=token))
+
+        # Move the rotation back past the grace period
+        jti = verify_token(token, "refresh").jti
+        store._revoked_at[jti] = time.time() - routes.auth.settings.REFRESH_TOKEN_REUSE_GRACE_SECONDS
+        with pytest.raises(HTTPException) as raised:
+            await refresh_token(RefreshTokenRequest(refresh_token=token))
+        assert raised.value.status_code == 401
+    asyncio.run(run())
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from routes.auth import signup_verify, SignupVerifyRequest
+from services.otp_service import create_pending_user, store_otp
+
+EMAIL, OTP = "pilot@example.com", "123456"
+
+def http_request() -> Request:
+    return Request({"type": "http", "headers": [], "client": ("127.0.0.1", 1234)})
+
+async def seed(db):
+    await db.pending_users.create_index("email", unique=True)
+    await db.users.create_index("email", unique=True)
+    await create_pending_user(EMAIL, "hunter22", "Pilot")
+    await store_otp(EMAIL, OTP)
+
+def test_verify_claims_pending_user(mongo):
+    async def run():
+        await seed(mongo)
+        await signup_verify(SignupVerifyRequest(email=EMAIL, otp=OTP), http_request())
+
+        assert await mongo.users.count_documents({"email": EMAIL, "is_verified": True}) == 1
+        assert await mongo.pending_users.count_documents({}) == 0
+    asyncio.run(run())
+
+def test_wrong_otp_keeps_pending_user(mongo):
+    async def run():
+        await seed(mongo)
+        with pytest.raises(HTTPException) as raised:
+            await signup_verify(SignupVerifyRequest(email=EMAIL, otp="000000"), http_request())
+        assert raised.value.status_code == 400
+
+        assert await mongo.users.count_documents({}) == 0
+        assert await mongo.pending_users.count_documents({"email": EMAIL}) == 1
+    asyncio.run(run())
+
+def test_failed_insert_puts_pending_user_back(mongo, monkeypatch):
+    async def run():
+        await seed(mongo)
+        collection_type = type(mongo.users)
+        insert_one = collection_type.insert_one
+
+        async def failing(self, *args, **kwargs):
+            if self.name == "users":
+                raise ConnectionError("primary stepped down")
+            return await insert_one(self, *args, **kwargs)
+        monkeypatch.setattr(collection_type, "insert_one", failing)
+
+        with pytest.raises(ConnectionError):
+            await signup_verify(SignupVerifyRequest(email=EMAIL, otp=OTP), http_request())
+        assert await mongo.pending_users.count_documents({"email": EMAIL}) == 1
+    asyncio.run(run())
@@ -0,0 +1,32 @@
+import asyncio
+
+from benchmarks.stub_smtp_server import StubSMTPServer
+from config.settings import settings
+from services.email_service import SMTPSession, build_mime_message
+
+def test_idle_session_reconnects_when_noop_fails(monkeypatch, smtp_settings):
+    async def run():
+        stub = StubSMTPServer()
+        server = await stub.start(0)
+        smtp_settings(server.sockets[0].getsockname()[1])
+        session = SMTPSession()
+        checks = []
+        is_alive = session._is_alive
+        monkeypatch.setattr(session, "_is_alive", lambda: checks.append(is_alive()) or checks[-1])
+        message = build_mime_message("pilot@example.com", "Hello", "Hello", "<p>Hello</p>")
+        try:
+            await session.send(message)
+            # Idle long enough to be checked with NOOP, meanwhile the server hung up
+            stub.drop_connections()
+            monkeypatch.setattr(settings, "SMTP_IDLE_SECONDS", -1)
+            await session.send(message)
+        finally:
+            await session.close()
+            server.close()
+            await server.wait_closed()
+
+        assert checks == [False]
+        assert session.connects == 2
+        assert stub.connections == 2
+        assert len(stub.messages) == 2
+    asyncio.run(run())
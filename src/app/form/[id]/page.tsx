@@ -1,6 +1,6 @@
 'use client';
 
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
 import { useParams, useRouter } from 'next/navigation';
 import Nav from '@/components/Nav';
@@ -24,8 +24,13 @@ interface FormData {
   redirect_to?: string;
   // Optional message shown to the user after successful submission
   postFormDetails?: string;
+  // Team forms only, including the leader
+  max_team_size?: number;
 }
 
+// Used when the backend does not send max_team_size
+const DEFAULT_TEAM_SIZE = 4;
+
 interface FormResponses {
   [key: string]: string;
 }
@@ -56,9 +61,13 @@ const DynamicForm = () => {
   const [lastSaved, setLastSaved] = useState<Date | null>(null);
   const [isSavingDraft, setIsSavingDraft] = useState(false);
 
+  // Last draft state known to be on the server, autosave only sends the changes
+  const savedDraftRef = useRef<{ revision: number; responses: FormResponses }>({ revision: 0, responses: {} });
+
   // Team members state
   const [teamMembers, setTeamMembers] = useState<number[]>([]);
-  const MAX_TEAM_MEMBERS = 3; // 3 additional members + leader = 4 total
+  // Additional members besides the leader, the backend's columns go up to team_member_{MAX_TEAM_MEMBERS + 1}
+  const MAX_TEAM_MEMBERS = (formData?.max_team_size ?? DEFAULT_TEAM_SIZE) - 1;
 
   // Decorative airplane animation
   const [planes, setPlanes] = useState<{ id: number, x: number, y: number, delay: number, scale: number, rotate: number }[]>([]);
@@ -157,11 +166,16 @@ const DynamicForm = () => {
           if (draftResponse.ok) {
             const draftData = await draftResponse.json();
             if (draftData.has_draft) {
+              savedDraftRef.current = {
+                revision: draftData.draft.revision ?? 0,
+                responses: { ...draftData.draft.responses }
+              };
+
               // Load team members from draft if form is team type
               if (data.type === 'team') {
                 const membersWithData: number[] = [];
-                // Check for team members in responses (2, 3, 4)
-                for (let i = 2; i <= 4; i++) {
+                // Check for team members in responses (2 up to the max team size)
+                for (let i = 2; i <= (data.max_team_size ?? DEFAULT_TEAM_SIZE); i++) {
                   // Check if this team member has any data
                   const hasData = ['name', 'roll', 'phone'].some(
                     field => draftData.draft.responses[`team_member_${i}_${field}`]?.trim()
@@ -251,8 +265,8 @@ const DynamicForm = () => {
         // Filter out team members with no data
         const filteredResponses = { ...responses };
         if (formData?.type === 'team') {
-          // Check each potential team member (2, 3, 4)
-          for (let i = 2; i <= 4; i++) {
+          // Check each potential team member (2 up to the max team size)
+          for (let i = 2; i <= (formData.max_team_size ?? DEFAULT_TEAM_SIZE); i++) {
             const fields = ['name', 'roll', 'phone'];
             const hasAnyData = fields.some(
               field => responses[`team_member_${i}_${field}`]?.trim()
@@ -267,18 +281,46 @@ const DynamicForm = () => {
           }
         }
 
-        await fetch(API_URL + `/api/forms/${formId}/draft`, {
-          method: 'POST',
-          headers: {
-            'Content-Type': 'application/json',
-            'Authorization': `Bearer ${token}`
-          },
+        // Only send what changed since the last save
+        const saved = savedDraftRef.current;
+        const changed: FormResponses = {};
+        Object.entries(filteredResponses).forEach(([key, value]) => {
+          if (saved.responses[key] !== value) {
+            changed[key] = value;
+          }
+        });
+        const cleared = Object.keys(saved.responses).filter(key => !(key in filteredResponses));
+        if (Object.keys(changed).length === 0 && cleared.length === 0) return;
+
+        const headers = {
+          'Content-Type': 'application/json',
+          'Authorization': `Bearer ${token}`
+        };
+        let response = await fetch(API_URL + `/api/forms/${formId}/draft`, {
+          method: 'PATCH',
+          headers,
           body: JSON.stringify({
-            form_id: formId,
-            responses: filteredResponses
+            base_revision: saved.revision,
+            set: changed,
+            unset: cleared
           })
         });
 
+        if (response.status === 409) {
+          // The draft changed elsewhere (e.g. another tab), save it in full
+          response = await fetch(API_URL + `/api/forms/${formId}/draft`, {
+            method: 'POST',
+            headers,
+            body: JSON.stringify({
+              form_id: formId,
+              responses: filteredResponses
+            })
+          });
+        }
+        if (!response.ok) throw new Error(`Draft save failed with status ${response.status}`);
+
+        const result = await response.json();
+        savedDraftRef.current = { revision: result.revision, responses: filteredResponses };
         setLastSaved(new Date());
         console.log('Draft saved automatically');
       } catch (err) {
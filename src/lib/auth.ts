@@ -28,6 +28,9 @@ interface UserResponse {
 }
 
 class AuthService {
+	// Refresh in flight, shared by every caller that hits a 401 meanwhile
+	private refreshing: Promise<AuthResponse> | null = null;
+
 	private getHeaders(includeAuth = false): HeadersInit {
 		const headers: HeadersInit = {
 			"Content-Type": "application/json",
@@ -124,7 +127,16 @@ class AuthService {
 		return authData;
 	}
 
-	async refreshAccessToken(): Promise<AuthResponse> {
+	refreshAccessToken(): Promise<AuthResponse> {
+		if (!this.refreshing) {
+			this.refreshing = this.rotateTokens().finally(() => {
+				this.refreshing = null;
+			});
+		}
+		return this.refreshing;
+	}
+
+	private async rotateTokens(): Promise<AuthResponse> {
 		const refreshToken = this.getRefreshToken();
 		if (!refreshToken) {
 			throw new Error("No refresh token available");
@@ -174,6 +186,7 @@ class AuthService {
 			await fetch(`${API_URL}/api/auth/logout`, {
 				method: "POST",
 				headers: this.getHeaders(true),
+				body: JSON.stringify({ refresh_token: this.getRefreshToken() }),
 			});
 		} finally {
 			this.clearTokens();